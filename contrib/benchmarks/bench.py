@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+#
+# Runs jolly and trolly commands against fakeserver.py and reports, per
+# command, the wall time (best of --runs) and the number of requests
+# and response bytes it took.  Each command runs in a fresh interpreter
+# with its own HOME, so nothing but the (optional) issue cache carries
+# over between runs.
+#
+#   contrib/benchmarks/bench.py [--issues N] [--cards N] [--latency MS] [--runs N] [NAME ...]
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakeserver import BOARD, PROJECT, FakeServer
+
+
+# name: (entry point, arguments, issue cache state)
+#   'cold': cache emptied before every run; 'warm': cache filled by
+#   an untimed run first; None: whatever the previous runs left
+_commands = {
+    'jolly-ls': ('trolly.jira_cli', ['ls'], 'cold'),
+    'jolly-ls-warm': ('trolly.jira_cli', ['ls'], 'warm'),
+    'jolly-ls-mine': ('trolly.jira_cli', ['ls', '-m'], 'warm'),
+    'jolly-search': ('trolly.jira_cli', ['search', 'kernel'], 'warm'),
+    'jolly-search-remote': ('trolly.jira_cli', ['search', '-R', 'kernel'], 'warm'),
+    'jolly-cat': ('trolly.jira_cli', ['cat', f'{PROJECT}-1', f'{PROJECT}-2', f'{PROJECT}-3', f'{PROJECT}-5', f'{PROJECT}-6'], 'warm'),
+    'jolly-cat-verbose': ('trolly.jira_cli', ['cat', '-v', f'{PROJECT}-1'], 'warm'),
+    'trolly-ls': ('trolly.cli', ['ls'], None),
+    'trolly-search': ('trolly.cli', ['search', 'kernel'], None),
+    'trolly-cat': ('trolly.cli', ['cat', '1', '2', '3'], None),
+}
+
+
+def write_config(home, url, extra):
+    config = {'jira': {'url': url, 'token': 'benchmark', 'default_project': PROJECT, 'cache': True},
+              'trello': {'key': 'benchmark', 'token': 'benchmark', 'url': url + '/1',
+                         'default_board': 'bench', 'boards': [{'name': 'bench', 'id': BOARD}]}}
+    for key, val in extra.items():
+        section, _, name = key.rpartition('.')
+        target = config.setdefault(section, {}) if section else config
+        target[name] = val
+    with open(os.path.join(home, '.trolly.json'), 'w') as config_file:
+        json.dump(config, config_file)
+
+
+def run(top, home, module, argv):
+    env = dict(os.environ, HOME=home, PYTHONPATH=top, COLUMNS='120', JOLLY_DAEMON='0')
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-m', module] + argv, cwd=top, env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        sys.stderr.write(proc.stdout + proc.stderr)
+        raise RuntimeError(f'{module} {" ".join(argv)} exited with {proc.returncode}')
+    return elapsed
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark jolly/trolly against a fake server')
+    parser.add_argument('--issues', type=int, default=500, help='JIRA issues in the project')
+    parser.add_argument('--cards', type=int, default=200, help='Trello cards on the board')
+    parser.add_argument('--comments', type=int, default=3, help='Comments per issue/card')
+    parser.add_argument('--latency', type=float, default=0, help='Added to every request (ms)')
+    parser.add_argument('--runs', type=int, default=3, help='Best of this many runs')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Configuration to use, e.g. jira.search_index=true or http.pool_size=4')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('commands', nargs='*', help=f'Commands to run (default: all of {", ".join(_commands)})')
+    args = parser.parse_args()
+
+    names = args.commands or list(_commands)
+    for name in names:
+        if name not in _commands:
+            parser.error(f'No such command: {name}')
+    extra = dict(item.split('=', 1) for item in args.set)
+    extra = {key: _value(val) for key, val in extra.items()}
+
+    top = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    server = FakeServer(0, args.issues, args.cards, args.comments, args.latency / 1000).start()
+    home = tempfile.mkdtemp(prefix='trolly-bench-')
+    cache = os.path.join(home, '.cache')
+    results = []
+    try:
+        write_config(home, server.url, extra)
+        if not args.json:
+            print(f'{args.issues} issues, {args.cards} cards, {args.latency:g} ms latency, best of {args.runs}')
+            print(f'{"command":22} {"wall ms":>9} {"requests":>9} {"bytes":>11}')
+        for name in names:
+            module, argv, state = _commands[name]
+            if state == 'warm':
+                run(top, home, module, argv)
+            best = None
+            for _ in range(args.runs):
+                if state == 'cold':
+                    shutil.rmtree(cache, ignore_errors=True)
+                server.reset()
+                elapsed = run(top, home, module, argv)
+                if best is None or elapsed < best:
+                    best = elapsed
+                # Same work every run, so same traffic
+                requests, nbytes = server.requests, server.bytes
+            results.append({'command': name, 'wall_ms': round(best * 1000, 1), 'requests': requests, 'bytes': nbytes})
+            if not args.json:
+                print(f'{name:22} {best * 1000:9.1f} {requests:9} {nbytes:11}')
+    finally:
+        server.shutdown()
+        shutil.rmtree(home, ignore_errors=True)
+    if args.json:
+        print(json.dumps({'issues': args.issues, 'cards': args.cards, 'latency_ms': args.latency,
+                          'runs': args.runs, 'results': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+#
+# Microbenchmark for decor.pretty_date against plain dateutil, over a
+# set of JIRA/Trello style timestamps with the kind of repetition 'cat'
+# sees (created/updated pairs, bursts of comments).
+#
+#   contrib/benchmarks/dates.py [--dates N] [--distinct N] [--runs N]
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from dateutil.parser import parse  # NOQA: E402
+
+from trolly.decor import pretty_date  # NOQA: E402
+
+
+def dateutil_date(date_str):
+    # What pretty_date used to do
+    return parse(date_str).astimezone().strftime('%F %T %Z')
+
+
+def make_dates(count, distinct):
+    rand = random.Random(1)
+    pool = []
+    for idx in range(distinct):
+        stamp = f'2023-{rand.randint(1, 12):02}-{rand.randint(1, 28):02}T{rand.randint(0, 23):02}:' \
+                f'{rand.randint(0, 59):02}:{rand.randint(0, 59):02}.{rand.randint(0, 999):03}'
+        pool.append(stamp + ('Z' if idx % 2 else '+0000'))
+    return [rand.choice(pool) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pretty_date')
+    parser.add_argument('--dates', type=int, default=10000, help='Dates formatted per run')
+    parser.add_argument('--distinct', type=int, default=1000, help='How many of them are different')
+    parser.add_argument('--runs', type=int, default=5, help='Best of this many runs')
+    args = parser.parse_args()
+
+    dates = make_dates(args.dates, args.distinct)
+    for date_str in set(dates):
+        if pretty_date.__wrapped__(date_str) != dateutil_date(date_str):
+            print(f'Mismatch on {date_str}')
+            return 1
+
+    def cached():
+        pretty_date.cache_clear()
+        for date_str in dates:
+            pretty_date(date_str)
+
+    cases = [('dateutil', lambda: [dateutil_date(date_str) for date_str in dates]),
+             ('fast path', lambda: [pretty_date.__wrapped__(date_str) for date_str in dates]),
+             ('fast path + cache', cached)]
+    base = None
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=args.runs))
+        if base is None:
+            base = best
+        print(f'{name:20} {best * 1000:9.2f} ms  {base / best:6.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,461 @@
+#!/usr/bin/python3
+#
+# Local stand-in for JIRA (REST v2) and Trello, serving a synthetic
+# dataset: just enough of both APIs to drive JiraProject and
+# TrollyBoard unmodified.  Counts requests and response bytes, and can
+# add a fixed latency to every request.
+#
+# JIRA is served under /rest/api/2, Trello under /1; point jolly's
+# "url" and trolly's "url" (see contrib/trolly.json) at the server.
+#
+#   contrib/benchmarks/fakeserver.py [--port N] [--issues N] [--cards N] [--latency MS]
+
+import argparse
+import email.parser
+import json
+import re
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+PROJECT = 'PROJ'
+BOARD = 'board0000000000000000001'
+
+_statuses = [{'id': '1', 'name': 'New', 'statusCategory': {'colorName': 'blue-gray'}},
+             {'id': '3', 'name': 'In Progress', 'statusCategory': {'colorName': 'yellow'}},
+             {'id': '5', 'name': 'Review', 'statusCategory': {'colorName': 'yellow'}},
+             {'id': '6', 'name': 'Closed', 'statusCategory': {'colorName': 'green'}}]
+# Workflow: status id -> status ids it can go to
+_workflow = {'1': ['3', '6'], '3': ['5', '1', '6'], '5': ['3', '6'], '6': ['1']}
+
+_users = [{'name': f'user{idx}', 'key': f'user{idx}', 'emailAddress': f'user{idx}@example.com',
+           'displayName': f'User {idx}'} for idx in range(8)]
+ME = _users[0]
+
+_words = ('network storage kernel driver memory cache timeout regression crash build '
+          'upgrade install config docs performance latency login session token queue').split()
+
+_date = '2023-{0:02}-{1:02}T{2:02}:{3:02}:05.000+0000'
+
+
+def _text(idx, count):
+    return ' '.join(_words[(idx * 7 + n * 3) % len(_words)] for n in range(count))
+
+
+def _user(idx):
+    return _users[idx % len(_users)]
+
+
+class Dataset(object):
+    def __init__(self, base, issues=500, cards=200, comments=3):
+        self.base = base
+        self.lock = threading.Lock()
+        self.issues = {}
+        for idx in range(1, issues + 1):
+            issue = self._issue(idx, comments)
+            self.issues[issue['key']] = issue
+        self.lists = [{'id': f'list{idx:020}', 'name': name, 'closed': False}
+                      for idx, name in enumerate(('Backlog', 'Doing', 'Done'))]
+        self.cards = {}
+        for idx in range(1, cards + 1):
+            card = self._card(idx, comments)
+            self.cards[card['id']] = card
+        self.labels = [{'id': f'label{idx:019}', 'name': name, 'color': color}
+                       for idx, (name, color) in enumerate((('bug', 'red'), ('feature', 'green'), ('docs', 'blue')))]
+
+    def _issue(self, idx, comments):
+        status = _statuses[idx % len(_statuses)]
+        issue_id = str(10000 + idx)
+        fields = {'summary': f'{_text(idx, 5)} ({idx})',
+                  'description': _text(idx, 40) if idx % 3 else None,
+                  'status': status,
+                  'labels': [_words[idx % len(_words)]] if idx % 2 else [],
+                  'assignee': _user(idx % 5) if idx % 4 else None,
+                  'reporter': _user(idx + 1),
+                  'creator': _user(idx + 1),
+                  'issuetype': {'id': '3', 'name': 'Task'},
+                  'project': {'key': PROJECT, 'id': '1'},
+                  'priority': {'name': 'Major'},
+                  'created': _date.format(1 + idx % 12, 1 + idx % 28, idx % 24, idx % 60),
+                  'updated': _date.format(1 + (idx + 1) % 12, 1 + idx % 28, idx % 24, idx % 60),
+                  'comment': {'comments': [{'id': str(idx * 100 + n),
+                                            'body': _text(idx + n, 20),
+                                            'updated': _date.format(1 + (idx + n) % 12, 1 + n % 28, n % 24, idx % 60),
+                                            'updateAuthor': _user(idx + n)} for n in range(comments)],
+                              'total': comments},
+                  'issuelinks': [], 'subtasks': [],
+                  'votes': {'votes': 0}, 'workratio': -1}
+        return {'id': issue_id, 'key': f'{PROJECT}-{idx}', 'self': f'{self.base}/rest/api/2/issue/{issue_id}',
+                'fields': fields}
+
+    def _card(self, idx, comments):
+        card_id = f'card{idx:020}'
+        actions = [{'id': f'act{idx:010}{n:010}', 'type': 'commentCard', 'date': _date.format(1 + n % 12, 1 + idx % 28, 0, 0),
+                    'memberCreator': {'username': _user(idx + n)['name']}, 'data': {'text': _text(idx + n, 20)}}
+                   for n in range(comments)]
+        actions.append({'id': f'act{idx:010}{"c" * 10}', 'type': 'createCard', 'date': _date.format(1, 1, 0, 0),
+                        'memberCreator': {'username': _user(idx)['name']}, 'data': {}})
+        return {'id': card_id, 'idShort': idx, 'name': f'{_text(idx, 5)} ({idx})', 'desc': _text(idx, 30),
+                'idList': self.lists[idx % len(self.lists)]['id'], 'idBoard': BOARD, 'closed': False,
+                'idMembers': [f'member{idx % len(_users):020}'] if idx % 3 else [], 'labels': [],
+                'badges': {'attachments': 0}, 'url': f'{self.base}/c/{card_id}', '_actions': actions,
+                '_attachments': []}
+
+
+def _public(item):
+    return {key: val for key, val in item.items() if not key.startswith('_')}
+
+
+def _transitions(issue):
+    status = issue['fields']['status']
+    return [{'id': f'{status["id"]}-{to_id}', 'name': f'To {item["name"]}', 'to': item}
+            for to_id in _workflow[status['id']]
+            for item in _statuses if item['id'] == to_id]
+
+
+def _status_matches(status, value):
+    return value == status['id'] or value.strip('"\'').lower() == status['name'].lower()
+
+
+def jql_match(jql, issue):
+    # The handful of JQL shapes jolly sends; anything else matches
+    fields = issue['fields']
+    for match in re.finditer(r'(?i)\bstatus\s*(!=|=)\s*("[^"]*"|\w+)', jql):
+        if _status_matches(fields['status'], match.group(2)) != (match.group(1) == '='):
+            return False
+    for match in re.finditer(r'(?i)\bstatus\s+(not\s+)?in\s*\(([^)]*)\)', jql):
+        found = any(_status_matches(fields['status'], value.strip()) for value in match.group(2).split(','))
+        if found == bool(match.group(1)):
+            return False
+    match = re.search(r'(?i)\bkey\s+in\s*\(([^)]*)\)', jql)
+    if match and issue['key'] not in [key.strip().strip('"') for key in match.group(1).split(',')]:
+        return False
+    if re.search(r'(?i)assignee\s*=\s*currentUser\(\)', jql):
+        if not fields['assignee'] or fields['assignee']['name'] != ME['name']:
+            return False
+    if re.search(r'(?i)assignee\s+is\s+EMPTY', jql) and fields['assignee']:
+        return False
+    match = re.search(r'(?i)assignee\s*=\s*"([^"]*)"', jql)
+    if match and (not fields['assignee'] or match.group(1) not in (fields['assignee']['name'], fields['assignee']['emailAddress'])):
+        return False
+    match = re.search(r'(?i)\b(?:text|summary)\s*~\s*"([^"]*)"', jql)
+    if match:
+        text = ' '.join([fields['summary'], fields['description'] or ''] + fields['labels']).lower()
+        if not all(word in text for word in match.group(1).lower().split()):
+            return False
+    if re.search(r'(?i)\bupdated\s*>=\s*-\d+m', jql):
+        # Nothing changes behind our back
+        return False
+    return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out separately; don't let Nagle and delayed
+    # ACKs add 40ms to every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, obj, status=200):
+        body = json.dumps(obj).encode() if status != 204 else b''
+        self.server.count(len(body))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_raw(self, data):
+        self.server.count(len(data))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self):
+        self.reply({'errorMessages': [f'Not found: {self.path}'], 'errors': {}}, 404)
+
+    def body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        data = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(data)
+        if content_type.startswith('multipart/form-data'):
+            message = email.parser.BytesParser().parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + data)
+            return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                    for part in message.get_payload()}
+        return {key: val[0] for key, val in parse_qs(data.decode()).items()}
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        query = {key: ','.join(val) for key, val in parse_qs(url.query).items()}
+        data = self.body() if method in ('POST', 'PUT') else {}
+        if url.path.startswith('/rest/api/2/'):
+            return self.jira(method, url.path[len('/rest/api/2/'):], query, data)
+        if url.path.startswith('/1/'):
+            return self.trello(method, url.path[len('/1/'):], query, data)
+        return self.not_found()
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    # JIRA
+
+    def search(self, jql, start, max_results, fields):
+        data = self.server.data
+        # Like JIRA, refuse users which don't exist
+        for match in re.finditer(r'(?i)assignee\s*=\s*"([^"]*)"', jql):
+            if not any(match.group(1) in (user['name'], user['emailAddress']) for user in _users):
+                return self.reply({'errorMessages': [f"The value '{match.group(1)}' does not exist for the field 'assignee'."],
+                                   'errors': {}}, 400)
+        hits = [issue for issue in data.issues.values() if jql_match(jql, issue)]
+        hits.sort(key=lambda issue: int(issue['id']), reverse=True)
+        page = [_public(issue) for issue in hits[start:start + max_results]]
+        if fields and fields not in ('*all', ['*all']):
+            if isinstance(fields, str):
+                fields = fields.split(',')
+            page = [dict(issue, fields={key: val for key, val in issue['fields'].items() if key in fields})
+                    for issue in page]
+        self.reply({'startAt': start, 'maxResults': max_results, 'total': len(hits), 'issues': page})
+
+    def find_issue(self, alias):
+        data = self.server.data
+        if alias in data.issues:
+            return data.issues[alias]
+        for issue in data.issues.values():
+            if issue['id'] == alias:
+                return issue
+        return None
+
+    def jira(self, method, path, query, data):
+        base = self.server.data.base
+        if path == 'search':
+            if method == 'POST':
+                query = data
+            return self.search(query.get('jql', ''), int(query.get('startAt', 0)),
+                               min(int(query.get('maxResults', 50)), 100), query.get('fields'))
+        if path == 'serverInfo':
+            return self.reply({'baseUrl': base, 'version': '9.4.0', 'versionNumbers': [9, 4, 0], 'deploymentType': 'Server'})
+        if path == 'myself':
+            return self.reply(ME)
+        if path == 'user/search':
+            # Prefix of a user name, display name or email address
+            text = (query.get('username') or query.get('query') or '').lower()
+            return self.reply([dict(user, self=f'{base}/rest/api/2/user?username={user["name"]}') for user in _users
+                               if any(user[item].lower().startswith(text) for item in ('name', 'displayName', 'emailAddress'))])
+        if path == 'field':
+            return self.reply([{'id': key, 'name': key, 'custom': False, 'schema': {}, 'clauseNames': [key]}
+                               for key in ('summary', 'status', 'labels', 'assignee', 'description', 'comment', 'updated', 'issuetype')])
+        if path == 'issueLinkType':
+            return self.reply({'issueLinkTypes': [{'id': '1', 'name': 'Blocks', 'inward': 'is blocked by', 'outward': 'blocks'}]})
+        if path == f'project/{PROJECT}':
+            return self.reply({'id': '1', 'key': PROJECT, 'name': 'Project', 'self': f'{base}/rest/api/2/project/1',
+                               'issueTypes': [{'id': '3', 'name': 'Task', 'subtask': False, 'description': '', 'iconUrl': '',
+                                               'self': f'{base}/rest/api/2/issuetype/3'},
+                                              {'id': '5', 'name': 'Sub-task', 'subtask': True, 'description': '', 'iconUrl': '',
+                                               'self': f'{base}/rest/api/2/issuetype/5'}]})
+        if path == f'project/{PROJECT}/statuses':
+            return self.reply([{'id': '3', 'name': 'Task', 'statuses': _statuses},
+                               {'id': '5', 'name': 'Sub-task', 'statuses': _statuses}])
+        match = re.match(r'issue/createmeta/\w+/issuetypes/(\w+)$', path)
+        if match:
+            fields = [{'fieldId': 'summary', 'name': 'Summary', 'required': True, 'operations': ['set']},
+                      {'fieldId': 'description', 'name': 'Description', 'required': False, 'operations': ['set']},
+                      {'fieldId': 'labels', 'name': 'Labels', 'required': False, 'operations': ['add', 'set', 'remove']}]
+            fields.extend({'fieldId': f'customfield_{idx}', 'name': f'Custom {idx}', 'required': False, 'operations': ['set']}
+                          for idx in range(60))
+            start = int(query.get('startAt', 0))
+            count = int(query.get('maxResults', 50))
+            return self.reply({'startAt': start, 'maxResults': count, 'total': len(fields),
+                               'isLast': start + count >= len(fields), 'values': fields[start:start + count]})
+
+        match = re.match(r'issue/([\w-]+)(?:/(\w+))?$', path)
+        if not match:
+            return self.not_found()
+        issue = self.find_issue(match.group(1))
+        if issue is None:
+            return self.reply({'errorMessages': ['Issue Does Not Exist'], 'errors': {}}, 404)
+        sub = match.group(2)
+        if sub is None:
+            if 'transitions' in query.get('expand', '').split(','):
+                return self.reply(dict(_public(issue), transitions=_transitions(issue)))
+            return self.reply(_public(issue))
+        if sub == 'transitions':
+            if method == 'POST':
+                to_id = data['transition']['id'].split('-')[1]
+                with self.server.data.lock:
+                    issue['fields']['status'] = [item for item in _statuses if item['id'] == to_id][0]
+                return self.reply({}, 204)
+            return self.reply({'transitions': _transitions(issue)})
+        if sub == 'comment':
+            if method == 'POST':
+                with self.server.data.lock:
+                    comments = issue['fields']['comment']['comments']
+                    comment = {'id': str(int(issue['id']) * 100 + len(comments)), 'body': data.get('body', ''),
+                               'updated': _date.format(12, 28, 0, 0), 'updateAuthor': ME,
+                               'self': f'{base}/rest/api/2/issue/{issue["id"]}/comment/{len(comments)}'}
+                    comments.append(comment)
+                return self.reply(comment, 201)
+            return self.reply(issue['fields']['comment'])
+        if sub == 'remotelink':
+            return self.reply([])
+        return self.not_found()
+
+    # Trello
+
+    def trello(self, method, path, query, data):
+        store = self.server.data
+        if path.startswith('_data/'):
+            for card in store.cards.values():
+                for attachment in card['_attachments']:
+                    if attachment['id'] == path[len('_data/'):]:
+                        return self.reply_raw(attachment['_data'])
+            return self.not_found()
+        if path == f'boards/{BOARD}':
+            return self.reply({'id': BOARD, 'name': 'Board', 'url': f'{store.base}/b/{BOARD}'})
+        if path == f'boards/{BOARD}/lists':
+            return self.reply(store.lists)
+        if path == f'boards/{BOARD}/labels':
+            return self.reply(store.labels)
+        if path == f'boards/{BOARD}/members':
+            return self.reply([{'id': f'member{idx:020}', 'username': user['name'], 'fullName': user['displayName']}
+                               for idx, user in enumerate(_users)])
+        match = re.match(rf'boards/{BOARD}/cards(?:/(\w+))?$', path)
+        if match:
+            closed = match.group(1) == 'all'
+            return self.reply([_public(card) for card in store.cards.values() if closed or not card['closed']])
+        match = re.match(r'lists/(\w+)/cards$', path)
+        if match:
+            return self.reply([_public(card) for card in store.cards.values() if card['idList'] == match.group(1)])
+        if path == 'members/me':
+            return self.reply({'id': f'member{0:020}', 'username': ME['name'], 'fullName': ME['displayName']})
+        if path == 'search':
+            words = query.get('query', '').lower().split()
+            cards = [_public(card) for card in store.cards.values()
+                     if all(word in (card['name'] + ' ' + card['desc']).lower() for word in words)]
+            return self.reply({'cards': cards})
+        if path == 'cards' and method == 'POST':
+            with store.lock:
+                idx = max(card['idShort'] for card in store.cards.values()) + 1 if store.cards else 1
+                card = store._card(idx, 0)
+                card.update(name=data.get('name', ''), desc=data.get('desc') or '', idList=data.get('idList') or card['idList'])
+                store.cards[card['id']] = card
+            return self.reply(_public(card))
+
+        match = re.match(r'cards/(\w+)/attachments(?:/(\w+))?$', path)
+        if match and match.group(1) in store.cards:
+            attachments = store.cards[match.group(1)]['_attachments']
+            if match.group(2) is None:
+                if method == 'POST':
+                    with store.lock:
+                        attach_id = f'attach{len(attachments):018}{match.group(1)[-6:]}'
+                        name = data['name'].decode()
+                        attachments.append({'id': attach_id, 'name': name, 'filename': name, 'isUpload': True,
+                                            'bytes': len(data['file']), 'url': f'{store.base}/1/_data/{attach_id}',
+                                            '_data': data['file']})
+                    return self.reply(_public(attachments[-1]))
+                return self.reply([_public(item) for item in attachments])
+            for attachment in attachments:
+                if attachment['id'] == match.group(2):
+                    if method == 'DELETE':
+                        with store.lock:
+                            attachments.remove(attachment)
+                        return self.reply({})
+                    return self.reply(_public(attachment))
+            return self.not_found()
+
+        match = re.match(r'cards/(\w+)(?:/(\w+))?$', path)
+        if not match or match.group(1) not in store.cards:
+            return self.not_found()
+        card = store.cards[match.group(1)]
+        sub = match.group(2)
+        if sub is None:
+            if method == 'PUT':
+                with store.lock:
+                    for key in ('name', 'desc', 'idList'):
+                        if data.get(key) is not None:
+                            card[key] = data[key]
+                    if data.get('closed') is not None:
+                        card['closed'] = data['closed'] in ('1', 'true', True)
+            return self.reply(_public(card))
+        if sub in ('name', 'desc', 'idList', 'closed') and method == 'PUT':
+            with store.lock:
+                value = data.get('value')
+                card[sub] = value in ('1', 'true', True) if sub == 'closed' else value
+            return self.reply(_public(card))
+        if sub == 'actions':
+            return self.reply(card['_actions'])
+        return self.not_found()
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, issues=500, cards=200, comments=3, latency=0.0):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.data = Dataset(self.url, issues, cards, comments)
+        self.latency = latency
+        self._stats_lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, nbytes):
+        with self._stats_lock:
+            self.requests = self.requests + 1
+            self.bytes = self.bytes + nbytes
+
+    def reset(self):
+        with self._stats_lock:
+            self.requests = 0
+            self.bytes = 0
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake JIRA/Trello server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--issues', type=int, default=500, help='JIRA issues in the project')
+    parser.add_argument('--cards', type=int, default=200, help='Trello cards on the board')
+    parser.add_argument('--comments', type=int, default=3, help='Comments per issue/card')
+    parser.add_argument('--latency', type=float, default=0, help='Added to every request (ms)')
+    args = parser.parse_args()
+
+    server = FakeServer(args.port, args.issues, args.cards, args.comments, args.latency / 1000)
+    print(f'Serving JIRA project {PROJECT} and Trello board {BOARD} on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
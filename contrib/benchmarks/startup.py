@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+#
+# Start-up time budget for the jolly/trolly entry points, measured with
+# python -X importtime.  Fails (exit 1) if importing an entry point
+# takes longer than the budget, or pulls in a module which should only
+# be loaded by the commands which need it.
+#
+#   contrib/benchmarks/startup.py [--budget MS] [--runs N]
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+
+_entry_points = ['trolly.jira_cli', 'trolly.cli']
+
+# Only to be imported when actually used
+_heavy = ['jira', 'requests', 'aiohttp', 'rich', 'dateutil', 'trollo', 'editor', 'urllib3']
+
+_line_re = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def import_times(module, cwd):
+    # {module: cumulative microseconds} for one fresh interpreter
+    ret = {}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=cwd, capture_output=True, text=True, check=True)
+    for line in proc.stderr.splitlines():
+        match = _line_re.match(line)
+        if match:
+            ret[match.group(4)] = int(match.group(2))
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check jolly/trolly start-up time')
+    parser.add_argument('--budget', type=float, default=50.0, help='Maximum import time per entry point (ms)')
+    parser.add_argument('--runs', type=int, default=5, help='Best of this many runs')
+    args = parser.parse_args()
+
+    top = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    failed = False
+    for module in _entry_points:
+        best = None
+        loaded = set()
+        for _ in range(args.runs):
+            times = import_times(module, top)
+            loaded |= set(times)
+            if best is None or times[module] < best:
+                best = times[module]
+        heavy = sorted(name for name in loaded if name.split('.')[0] in _heavy)
+        heavy = sorted(set(name.split('.')[0] for name in heavy))
+
+        ok = best / 1000 <= args.budget and not heavy
+        print(f'{module:20} {best / 1000:8.1f} ms  (budget {args.budget:.0f} ms)  {"ok" if ok else "FAIL"}')
+        if heavy:
+            print(f'{"":20} imports at start-up: {", ".join(heavy)}')
+        failed = failed or not ok
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,6 +24,7 @@ setuptools.setup(
     name='trolly',
     version=__version__,
     install_requires=requires(),
+    extras_require={'async': ['aiohttp']},
     license='BSD',
     long_description=dedent("""\
         Python Trello CLI
@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+#
+# The local issue cache (trolly/cache.py): syncing, replacing and
+# forgetting issues, and expiry of metadata and missing keys.
+
+import unittest
+
+from trolly.cache import JiraCache, fts_query
+
+
+def _issue(num, summary='Issue', labels=None, description=None, project='PROJ'):
+    fields = {'summary': f'{summary} {num}', 'labels': labels or [], 'updated': '2023-01-01T00:00:00.000+0000'}
+    if description is not None:
+        fields['description'] = description
+    return {'key': f'{project}-{num}', 'id': str(num), 'fields': fields}
+
+
+def _keys(issues):
+    return [raw['key'] for raw in issues]
+
+
+class IssuesTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = JiraCache('https://jira.example.com', path=':memory:')
+        self.cache.store_issues('PROJ', [_issue(1, labels=['a']), _issue(2, labels=['a', 'b']), _issue(3)])
+
+    def tearDown(self):
+        self.cache.close()
+
+    def labelled(self, label):
+        return _keys(self.cache.query('PROJ', "issues.key IN (SELECT key FROM labels WHERE project = 'PROJ' AND label = ?)",
+                                      [label], 'issues.key'))
+
+    def test_newest_first(self):
+        self.assertEqual(_keys(self.cache.issues('PROJ')), ['PROJ-3', 'PROJ-2', 'PROJ-1'])
+        self.assertEqual(_keys(self.cache.issues('OTHER')), [])
+
+    def test_update(self):
+        self.cache.store_issues('PROJ', [_issue(2, summary='Changed', labels=['c'])])
+        self.assertEqual([raw['fields']['summary'] for raw in self.cache.issues('PROJ')],
+                         ['Issue 3', 'Changed 2', 'Issue 1'])
+        self.assertEqual(self.labelled('a'), ['PROJ-1'])
+        self.assertEqual(self.labelled('c'), ['PROJ-2'])
+
+    def test_replace(self):
+        self.cache.store_issues('OTHER', [_issue(9, project='OTHER')])
+        self.cache.store_issues('PROJ', [_issue(2), _issue(4)], replace=True)
+        self.assertEqual(_keys(self.cache.issues('PROJ')), ['PROJ-4', 'PROJ-2'])
+        self.assertEqual(self.labelled('a'), [])
+        # Other projects are left alone
+        self.assertEqual(_keys(self.cache.issues('OTHER')), ['OTHER-9'])
+
+    def test_retain(self):
+        self.cache.retain_issues('PROJ', ['PROJ-1', 'PROJ-3'])
+        self.assertEqual(_keys(self.cache.issues('PROJ')), ['PROJ-3', 'PROJ-1'])
+        self.assertEqual(self.labelled('a'), ['PROJ-1'])
+        self.assertEqual(self.labelled('b'), [])
+
+    def test_forget(self):
+        self.cache.forget_issue('PROJ-2')
+        self.assertEqual(_keys(self.cache.issues('PROJ')), ['PROJ-3', 'PROJ-1'])
+        self.assertEqual(self.labelled('b'), [])
+        self.cache.forget_issue('PROJ-2')
+
+    def test_clear(self):
+        self.cache.set_last_sync('PROJ', full=True)
+        self.cache.set_meta('PROJ', 'statuses', [])
+        self.cache.clear('PROJ')
+        self.assertEqual(_keys(self.cache.issues('PROJ')), [])
+        self.assertIsNone(self.cache.last_sync('PROJ'))
+        self.assertIsNone(self.cache.meta('PROJ', 'statuses'))
+        self.assertTrue(self.cache.need_full_sync('PROJ'))
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = JiraCache('https://jira.example.com', path=':memory:', full_sync_ttl=100)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_never(self):
+        self.assertIsNone(self.cache.last_sync('PROJ'))
+        self.assertTrue(self.cache.need_full_sync('PROJ'))
+
+    def test_full(self):
+        self.cache.set_last_sync('PROJ', 1000, full=True)
+        self.assertEqual(self.cache.last_sync('PROJ'), 1000)
+        self.assertFalse(self.cache.need_full_sync('PROJ', now=1050))
+        self.assertTrue(self.cache.need_full_sync('PROJ', now=1101))
+
+    def test_incremental(self):
+        # Catching up doesn't put off the next full sync
+        self.cache.set_last_sync('PROJ', 1000, full=True)
+        self.cache.set_last_sync('PROJ', 1090)
+        self.assertEqual(self.cache.last_sync('PROJ'), 1090)
+        self.assertTrue(self.cache.need_full_sync('PROJ', now=1101))
+        # ...and without one there's nothing to catch up from
+        self.cache.clear('PROJ')
+        self.cache.set_last_sync('PROJ', 1000)
+        self.assertTrue(self.cache.need_full_sync('PROJ', now=1000))
+
+
+class ExpiryTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = JiraCache('https://jira.example.com', path=':memory:', ttl=100, missing_ttl=100)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def age(self, table, column, seconds):
+        with self.cache._db:
+            self.cache._db.execute(f'UPDATE {table} SET {column} = {column} - ?', (seconds,))
+
+    def test_meta(self):
+        self.cache.set_meta('PROJ', 'statuses', [{'id': '1'}])
+        self.assertEqual(self.cache.meta('PROJ', 'statuses'), [{'id': '1'}])
+        self.age('meta', 'stored', 200)
+        self.assertIsNone(self.cache.meta('PROJ', 'statuses'))
+        # Still there if we can't get anything newer
+        self.assertEqual(self.cache.meta('PROJ', 'statuses', expired=True), [{'id': '1'}])
+        self.cache.forget_meta('PROJ')
+        self.assertIsNone(self.cache.meta('PROJ', 'statuses', expired=True))
+
+    def test_transitions(self):
+        self.cache.store_transitions('PROJ', 'Bug', '1', {'3': {'id': '11', 'name': 'Start'}})
+        self.cache.store_transitions('PROJ', 'Task', '1', {})
+        self.assertEqual(self.cache.transition_graph('PROJ', 'Bug'), {'1': {'3': {'id': '11', 'name': 'Start'}}})
+        self.cache.forget_transitions('PROJ', 'Bug', '1')
+        self.assertEqual(self.cache.transition_graph('PROJ', 'Bug'), {})
+        self.age('transitions', 'stored', 200)
+        self.assertEqual(self.cache.transition_graph('PROJ', 'Task'), {})
+
+    def test_missing(self):
+        self.assertFalse(self.cache.is_missing('PROJ-1'))
+        self.cache.set_missing('PROJ-1')
+        self.assertTrue(self.cache.is_missing('PROJ-1'))
+        self.cache.forget_missing('PROJ-1')
+        self.assertFalse(self.cache.is_missing('PROJ-1'))
+        self.cache.set_missing('PROJ-1')
+        self.age('missing', 'expires', 200)
+        self.assertFalse(self.cache.is_missing('PROJ-1'))
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = JiraCache('https://jira.example.com', path=':memory:', fts=True)
+        self.cache.store_issues('PROJ', [_issue(1, summary='Kernel panic', description='Crashes on boot'),
+                                         _issue(2, summary='Docs', description='Mentions the kernel'),
+                                         _issue(3, summary='Unrelated')])
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_query(self):
+        self.assertEqual(fts_query('kernel  panic'), '"kernel" "panic"')
+        self.assertEqual(fts_query('kern* "x'), '"kern"* """x"')
+        self.assertEqual(fts_query('*'), '')
+
+    def test_search(self):
+        # Summary matches rank above description ones
+        self.assertEqual(_keys(self.cache.search('PROJ', 'kernel')), ['PROJ-1', 'PROJ-2'])
+        self.assertEqual(_keys(self.cache.search('PROJ', 'kernel', limit=1)), ['PROJ-1'])
+        self.assertEqual(_keys(self.cache.search('PROJ', 'boo*')), ['PROJ-1'])
+        self.assertEqual(self.cache.search('PROJ', ''), [])
+        # The text itself isn't kept twice
+        self.assertNotIn('description', next(self.cache.issues('PROJ'))['fields'])
+
+    def test_forget(self):
+        self.cache.forget_issue('PROJ-1')
+        self.assertEqual(_keys(self.cache.search('PROJ', 'kernel')), ['PROJ-2'])
+        self.cache.store_issues('PROJ', [_issue(2, summary='Docs', description='Nothing')], replace=True)
+        self.assertEqual(self.cache.search('PROJ', 'kernel'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
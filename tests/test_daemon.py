@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+#
+# 'jolly daemon' (trolly/daemon.py): which commands it takes, running
+# them, and the socket protocol.
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+from trolly import daemon
+from trolly.jira_cli import create_parser
+
+
+def _ns(*argv):
+    return create_parser().parse_args(args=list(argv))
+
+
+class CanServeTest(unittest.TestCase):
+    def test_served(self):
+        for argv in (['ls'], ['cat', 'PROJ-1'], ['mv', 'PROJ-1', 'Done'], ['new', 'summary'], ['comment', 'PROJ-1', 'hi']):
+            with self.subTest(argv=argv):
+                self.assertTrue(daemon.can_serve(_ns(*argv)))
+
+    def test_local(self):
+        # Needs an editor, the user's terminal or this process
+        for argv in (['new'], ['comment', 'PROJ-1'], ['comment', '--edit', '5', 'PROJ-1', 'hi'], ['edit', 'PROJ-1'],
+                     ['ls', '--stream'], ['ls', '--format', 'json'], ['--trace', 'ls'], ['daemon']):
+            with self.subTest(argv=argv):
+                self.assertFalse(daemon.can_serve(_ns(*argv)))
+
+
+class RunTest(unittest.TestCase):
+    def tearDown(self):
+        daemon.set_terminal(None, None)
+
+    def run_with(self, dispatch):
+        return daemon._run(dispatch, {'argv': ['ls'], 'width': 100, 'tty': False})
+
+    def test_output(self):
+        def _dispatch(argv):
+            print('out', argv)
+            print('err', file=sys.stderr)
+            return 3
+
+        self.assertEqual(self.run_with(_dispatch), {'rc': 3, 'stdout': "out ['ls']\n", 'stderr': 'err\n'})
+
+    def test_terminal(self):
+        # Rendered for the client's terminal, not the daemon's
+        from trolly import decor
+
+        self.assertEqual(self.run_with(lambda argv: decor.terminal_width())['rc'], 100)
+
+    def test_declined(self):
+        self.assertEqual(self.run_with(lambda argv: None), {'rc': None})
+
+    def test_exit(self):
+        def _exit(code):
+            def _dispatch(argv):
+                sys.exit(code)
+            return _dispatch
+
+        self.assertEqual(self.run_with(_exit(None))['rc'], 0)
+        self.assertEqual(self.run_with(_exit(2))['rc'], 2)
+        reply = self.run_with(_exit('No such project'))
+        self.assertEqual((reply['rc'], reply['stderr']), (1, 'No such project\n'))
+
+    def test_exception(self):
+        def _dispatch(argv):
+            raise RuntimeError('boom')
+
+        reply = self.run_with(_dispatch)
+        self.assertEqual(reply['rc'], 1)
+        self.assertIn('RuntimeError: boom', reply['stderr'])
+
+
+class ServeTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.env = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.home})
+        self.env.start()
+        self.calls = []
+        self.server = threading.Thread(target=self.serve, daemon=True)
+        self.server.start()
+        for _ in range(100):
+            if os.path.exists(daemon.socket_path()):
+                break
+            time.sleep(0.01)
+
+    def tearDown(self):
+        daemon.stop()
+        self.server.join(5)
+        self.env.stop()
+        shutil.rmtree(self.home)
+        daemon.set_terminal(None, None)
+
+    def serve(self):
+        def _dispatch(argv):
+            self.calls.append(argv)
+            if argv[0] == 'edit':
+                return None
+            print(' '.join(argv))
+            return 0
+
+        with redirect_stdout(io.StringIO()):
+            self.rc = daemon.serve(_dispatch)
+
+    def forward(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(io.StringIO()):
+            rc = daemon.forward(list(argv))
+        return rc, out.getvalue()
+
+    def test_forward(self):
+        self.assertEqual(self.forward('ls', '-u', 'me'), (0, 'ls -u me\n'))
+        self.assertEqual(self.forward('cat', 'PROJ-1'), (0, 'cat PROJ-1\n'))
+        self.assertEqual(self.calls, [['ls', '-u', 'me'], ['cat', 'PROJ-1']])
+
+    def test_declined(self):
+        self.assertEqual(self.forward('edit', 'PROJ-1'), (None, ''))
+
+    def test_private(self):
+        self.assertEqual(os.stat(daemon.socket_path()).st_mode & 0o777, 0o600)
+
+    def test_one_at_a_time(self):
+        # Another daemon won't take over a live socket
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(daemon.serve(lambda argv: 0), 1)
+        self.assertEqual(self.forward('ls'), (0, 'ls\n'))
+
+    def test_stop(self):
+        self.assertTrue(daemon.stop())
+        self.server.join(5)
+        self.assertEqual(self.rc, 0)
+        self.assertFalse(os.path.exists(daemon.socket_path()))
+        # Nothing to forward to
+        self.assertEqual(self.forward('ls'), (None, ''))
+        self.assertFalse(daemon.stop())
+
+
+if __name__ == '__main__':
+    unittest.main()
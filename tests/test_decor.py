@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+#
+# Terminal output helpers (trolly/decor.py): dates and tables.
+
+import io
+import unittest
+
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from trolly.decor import Table, _parse_iso_date, color_string, pretty_date, text_width, vsep_print
+
+
+class DateTest(unittest.TestCase):
+    def setUp(self):
+        pretty_date.cache_clear()
+
+    def test_parse(self):
+        self.assertEqual(_parse_iso_date('2023-01-02T03:04:05.123+0000'),
+                         datetime(2023, 1, 2, 3, 4, 5, 123000, tzinfo=timezone.utc))
+        self.assertEqual(_parse_iso_date('2023-01-02T03:04:05.000Z'),
+                         datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(_parse_iso_date('2023-01-02T03:04:05-05:30'),
+                         datetime(2023, 1, 2, 3, 4, 5, tzinfo=timezone(-timedelta(hours=5, minutes=30))))
+        self.assertEqual(_parse_iso_date('2023-01-02T03:04:05.1234567'), datetime(2023, 1, 2, 3, 4, 5, 123456))
+        self.assertIsNone(_parse_iso_date('2023-02-30T00:00:00Z'))
+        self.assertIsNone(_parse_iso_date('Jan 2 2023'))
+
+    def test_pretty(self):
+        # Same as dateutil would give
+        from dateutil.parser import parse
+
+        for text in ('2023-01-02T03:04:05.000+0000', '2023-07-02T23:59:59.999Z', '2023-01-02T03:04:05+0530'):
+            with self.subTest(text=text):
+                self.assertEqual(pretty_date(text), parse(text).astimezone().strftime('%F %T %Z'))
+        # ...which anything else is left to
+        self.assertEqual(pretty_date('2 Jan 2023 03:04:05 +0000'),
+                         pretty_date('2023-01-02T03:04:05.000+0000'))
+
+    def test_cached(self):
+        pretty_date('2023-01-02T03:04:05.000+0000')
+        pretty_date('2023-01-02T03:04:05.000+0000')
+        pretty_date('2023-01-03T03:04:05.000+0000')
+        info = pretty_date.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+
+class TableTest(unittest.TestCase):
+    def render(self, table):
+        out = io.StringIO()
+        table.print(out)
+        return out.getvalue().splitlines()
+
+    def test_columns(self):
+        # Every column but the last is as wide as its widest cell
+        table = Table(width=80)
+        table.add('PROJ-1', 'New', 'First')
+        table.add('PROJ-100', 'In Progress', 'Second')
+        self.assertEqual(self.render(table), ['PROJ-1   ┃ New         ┃ First',
+                                              'PROJ-100 ┃ In Progress ┃ Second'])
+
+    def test_minimum(self):
+        table = Table([10], width=80)
+        table.add('a', 1)
+        self.assertEqual(self.render(table), ['a          ┃ 1'])
+
+    def test_truncate(self):
+        # 11 columns left for the summary
+        table = Table(width=20)
+        table.add('PROJ-1', 'a rather long summary')
+        self.assertEqual(self.render(table), ['PROJ-1 ┃ a rather ..'])
+
+    def test_wrap(self):
+        table = Table(width=21)
+        table.add('PROJ-1', 'alpha, beta, gamma, delta', linesplit=', ')
+        self.assertEqual(self.render(table), ['PROJ-1 ┃ alpha, beta',
+                                              '       ┃ gamma, delta'])
+        table = Table(width=16)
+        table.add('PROJ-1', 'abcdefghijklmnop', linesplit=' ')
+        self.assertEqual(self.render(table), ['PROJ-1 ┃ abcdefghij', '       ┃ klmnop'])
+
+    def test_color(self):
+        # Colour codes take no room
+        label = color_string('New', 'green')
+        self.assertEqual(text_width(label), 3)
+        table = Table(width=80)
+        table.add(label, 'x')
+        table.add('Closed', 'y')
+        self.assertEqual(self.render(table)[0], label + '    ┃ x')
+
+    def test_one_write(self):
+        writes = []
+
+        class _File(object):
+            def write(self, text):
+                writes.append(text)
+
+        table = Table(width=80)
+        for number in range(100):
+            table.add(f'PROJ-{number}', 'summary')
+        table.print(_File())
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(writes[0].count('\n'), 100)
+
+    def test_vsep_print(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            vsep_print(None, 'PROJ-1', 8, 'New', 4, 'summary')
+        self.assertTrue(out.getvalue().startswith('PROJ-1   ┃ New  ┃ summary'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,634 @@
+#!/usr/bin/python3
+#
+# JiraProject against an in-memory stand-in for the server: paging,
+# listing, looking up issues, createmeta, workflow planning and moves,
+# on both backends.
+
+import asyncio
+import copy
+import json
+import re
+import threading
+import time
+import unittest
+
+import requests
+
+from jira import JIRAError
+from jira.client import TokenAuth
+from jira.resources import Issue, IssueType
+
+from trolly.cache import JiraCache
+from trolly.jboard import IssueRecord, JiraProject, _list_fields, fetch_pages, iter_pages
+from trolly.transport import Transport, http_session
+
+try:
+    import aiohttp
+    from trolly.ajboard import AsyncJiraProject
+except ModuleNotFoundError:
+    aiohttp = None
+
+
+PROJECT = 'PROJ'
+BASE = 'https://jira.example.com/rest/api/2/'
+
+_statuses = [{'id': '1', 'name': 'New'},
+             {'id': '3', 'name': 'In Progress'},
+             {'id': '5', 'name': 'Review'},
+             {'id': '6', 'name': 'Closed'},
+             {'id': '7', 'name': 'Rejected'}]
+
+# Status id -> status ids it can go to.  Nothing goes to Rejected.
+_workflow = {'1': ['3', '6'], '3': ['5', '1', '6'], '5': ['3', '6'], '6': ['1'], '7': []}
+
+
+def _status(status_id):
+    return [status for status in _statuses if status['id'] == status_id][0]
+
+
+def _issue(number, status_id, issue_type='3'):
+    key = f'{PROJECT}-{number}'
+    return {'key': key, 'id': str(10000 + number), 'self': BASE + f'issue/{key}',
+            'fields': {'summary': f'issue {number}',
+                       'status': _status(status_id),
+                       'issuetype': {'id': issue_type, 'name': 'Task'},
+                       'assignee': None,
+                       'labels': [],
+                       'updated': '2023-01-01T00:00:00.000+0000'}}
+
+
+class _Results(list):
+    total = 0
+
+
+class _Jira(object):
+    # Just enough of jira.JIRA.  Searches look up keys, or find every
+    # open issue (a full sync); nothing has been updated lately.  They
+    # fail with 'error' if it's set.
+    deploymentType = 'Server'
+    _fields_cache_value = {'summary': 'summary'}
+    _options = {'server': 'https://jira.example.com'}
+
+    def __init__(self, server):
+        self.server = server
+        self.error = None
+        self.searches = []
+        self.fields = []
+        self._session = http_session(Transport())
+
+    def _get_url(self, path):
+        return BASE + path
+
+    def search_issues(self, query, **kwargs):
+        self.searches.append(query)
+        self.fields.append(kwargs.get('fields'))
+        if self.error is not None:
+            raise self.error
+        hits = []
+        match = re.match(r'key in \((.*)\)$', query)
+        if match:
+            hits = [self.server[key] for key in match.group(1).split(', ') if key in self.server]
+        elif query == f'PROJECT = {PROJECT} AND STATUS != Closed':
+            hits = [raw for raw in self.server.values() if raw['fields']['status']['name'] != 'Closed']
+        start = kwargs.get('startAt', 0)
+        ret = _Results(Issue(self._options, None, raw=copy.deepcopy(raw))
+                       for raw in hits[start:start + kwargs.get('maxResults', 50)])
+        ret.total = len(hits)
+        return ret
+
+
+class _Project(JiraProject):
+    # Requests are answered from 'issues' (which the server has) rather
+    # than sent anywhere; transitions in 'fail' are refused.
+    def __init__(self, issues, cache=None, fail=()):
+        self.server = {raw['key']: raw for raw in issues}
+        self.fail = set(fail)
+        self.requests = []
+        super().__init__(_Jira(self.server), PROJECT, closed_status='Closed', cache=cache)
+
+    def _fetch_statuses(self):
+        return [{'id': '3', 'name': 'Task', 'statuses': _statuses}]
+
+    def _request(self, method, url, data=None):
+        path, _, query = url[len(BASE):].partition('?')
+        self.requests.append((method, path))
+        parts = path.split('/')
+        raw = self.server.get(parts[1])
+        if raw is None:
+            raise JIRAError('Issue Does Not Exist', status_code=404, url=url)
+        status_id = raw['fields']['status']['id']
+        transitions = [{'id': f'{status_id}-{to_id}', 'to': _status(to_id)} for to_id in _workflow[status_id]]
+        if len(parts) == 2:
+            raw = dict(raw, fields=dict(raw['fields']))
+            if 'expand=transitions' in query:
+                raw['transitions'] = transitions
+            return raw
+        if method == 'GET':
+            return {'transitions': transitions}
+        transition = data['transition']['id']
+        if transition in self.fail:
+            raise JIRAError('Transition failed', status_code=400, url=url)
+        raw['fields']['status'] = _status(transition.split('-')[1])
+        return None
+
+    def posts(self):
+        return [path for method, path in self.requests if method == 'POST']
+
+
+def _cache(issues, fts=False):
+    cache = JiraCache('https://jira.example.com', path=':memory:', fts=fts)
+    cache.store_issues(PROJECT, issues)
+    return cache
+
+
+class PagesTest(unittest.TestCase):
+    def test_sequential(self):
+        self.assertEqual(list(iter_pages(lambda start: start, 50, 200, 50)), [50, 100, 150])
+        self.assertEqual(fetch_pages(lambda start: start, 50, 50, 50), [])
+
+    def test_concurrent(self):
+        # Later pages may arrive first; they're still yielded in order,
+        # with no more than 'concurrency' requests at once
+        lock = threading.Lock()
+        running = []
+        most = []
+
+        def _fetch(start):
+            with lock:
+                running.append(start)
+                most.append(len(running))
+            time.sleep(0.01 if start % 20 else 0.03)
+            with lock:
+                running.remove(start)
+            return start
+
+        self.assertEqual(fetch_pages(_fetch, 10, 200, 10, concurrency=4), list(range(10, 200, 10)))
+        self.assertLessEqual(max(most), 4)
+        self.assertGreater(max(most), 1)
+
+    def test_error(self):
+        def _fetch(start):
+            if start == 30:
+                raise JIRAError('Internal Server Error', status_code=500)
+            return start
+
+        pages = iter_pages(_fetch, 10, 100, 10, concurrency=3)
+        self.assertEqual([next(pages), next(pages)], [10, 20])
+        self.assertRaises(JIRAError, next, pages)
+
+    def test_search(self):
+        # The server caps page size; we step by what it gave us
+        project = _Project([_issue(number, '1') for number in range(1, 121)])
+        project.concurrency = 3
+        keys = [issue.key for issue in project.iter_search(f'PROJECT = {PROJECT} AND STATUS != Closed')]
+        self.assertEqual(keys, [f'PROJ-{number}' for number in range(1, 121)])
+        self.assertEqual(len(project.jira.searches), 3)
+
+
+class ListTest(unittest.TestCase):
+    def test_fields(self):
+        # Listing only asks for what it shows
+        project = _Project([_issue(1, '1'), _issue(2, '6')])
+        self.assertEqual(list(project.list()), ['PROJ-1'])
+        self.assertEqual(list(project.iter_list()), [('PROJ-1', project.list()['PROJ-1'])])
+        self.assertEqual(project.jira.fields, [_list_fields] * 3)
+
+    def test_record(self):
+        raw = _issue(1, '3')
+        raw['fields']['assignee'] = {'name': 'alice', 'key': 'JIRAUSER1', 'emailAddress': 'alice@example.com'}
+        raw['fields']['labels'] = ['x']
+        raw['fields']['status'] = dict(raw['fields']['status'], statusCategory={'colorName': 'yellow'})
+        record = IssueRecord(raw)
+        self.assertEqual(record.assignee, ('alice', 'JIRAUSER1', 'alice@example.com'))
+        simplified = record.simplified()
+        self.assertEqual(simplified['fields'], {'status': raw['fields']['status'], 'summary': 'issue 1',
+                                                'assignee': raw['fields']['assignee'],
+                                                'updated': '2023-01-01T00:00:00.000+0000'})
+        self.assertEqual(simplified['labels'], ['x'])
+
+    def test_user(self):
+        raw = _issue(1, '1')
+        raw['fields']['assignee'] = {'name': 'alice', 'key': 'JIRAUSER1', 'emailAddress': 'alice@example.com'}
+        project = _Project([raw, _issue(2, '1')])
+        record = IssueRecord(raw)
+        for userid in ('alice', 'JIRAUSER1', 'alice@example.com'):
+            self.assertIsNotNone(project._simplify_issue(record, userid))
+        self.assertIsNone(project._simplify_issue(record, 'bob'))
+        self.assertIsNone(project._simplify_issue(record, 'none'))
+        self.assertIsNotNone(project._simplify_issue(IssueRecord(_issue(2, '1')), 'none'))
+
+
+class IssuesTest(unittest.TestCase):
+    def test_batched(self):
+        project = _Project([_issue(number, '1') for number in range(1, 6)])
+        issues = project.issues(['1', 'proj-2', 'PROJ-9', '3', 'nonsense', '1'])
+        self.assertEqual([issue and issue.key for issue in issues], ['PROJ-1', 'PROJ-2', None, 'PROJ-3', None, 'PROJ-1'])
+        # One search, then a GET to find out PROJ-9 really doesn't exist
+        self.assertEqual(project.jira.searches, ['key in (PROJ-1, PROJ-2, PROJ-9, PROJ-3)'])
+        self.assertEqual(project.requests, [('GET', 'issue/PROJ-9')])
+
+        # Found and missing ones are both remembered
+        project.issues(['2', '9', '4'])
+        self.assertEqual(project.jira.searches[1:], ['key in (PROJ-4)'])
+        self.assertEqual(len(project.requests), 1)
+
+    def test_batch_size(self):
+        project = _Project([_issue(number, '1') for number in range(1, 251)])
+        issues = project.issues([str(number) for number in range(1, 251)])
+        self.assertEqual(len([issue for issue in issues if issue]), 250)
+        # (each batch is two pages)
+        queries = dict.fromkeys(project.jira.searches)
+        self.assertEqual([query.count(',') + 1 for query in queries], [100, 100, 50])
+        self.assertEqual(project.requests, [])
+
+
+class KeysTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache([])
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_normalised(self):
+        project = _Project([])
+        for alias, key in (('12', 'PROJ-12'), (' proj-12 ', 'PROJ-12'), ('other_2-3', 'OTHER_2-3'), (12, 'PROJ-12')):
+            self.assertEqual(project._issue_key(alias), key)
+        for alias in ('nonsense', 'PROJ-', '-12', 'PROJ 12', '12a'):
+            self.assertIsNone(project._issue_key(alias))
+
+    def test_not_a_key(self):
+        # Nothing to ask the server about
+        project = _Project([])
+        self.assertIsNone(project.issue('nonsense'))
+        self.assertEqual(project.requests, [])
+
+    def test_missing(self):
+        project = _Project([], self.cache)
+        self.assertIsNone(project.issue('9'))
+        self.assertIsNone(project.issue('PROJ-9'))
+        self.assertEqual(project.requests, [('GET', 'issue/PROJ-9')])
+        # ...for a while, and not only in this process
+        project = _Project([], self.cache)
+        self.assertIsNone(project.issue('9'))
+        self.assertEqual(project.requests, [])
+
+    def test_moved(self):
+        # PROJ-1 is now PROJ-2; the old key is forgotten
+        self.cache.store_issues(PROJECT, [_issue(1, '1')])
+        project = _Project([_issue(2, '1')], self.cache)
+        project.server['PROJ-1'] = project.server['PROJ-2']
+        self.assertEqual(project.issue('1').key, 'PROJ-2')
+        self.assertEqual([raw['key'] for raw in self.cache.issues(PROJECT)], [])
+        self.assertIsNone(project._indexed('PROJ-1'))
+        self.assertIsNotNone(project._indexed('PROJ-2'))
+
+
+class CreatemetaTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache([])
+        self.project = _Project([], self.cache)
+        self.project.concurrency = 3
+        jira = self.project.jira
+        self.project._issue_types = [IssueType(jira._options, jira._session,
+                                               raw={'id': '3', 'name': 'Task', 'self': BASE + 'issuetype/3',
+                                                    'description': '', 'subtask': False, 'iconUrl': ''})]
+        self.fields = [{'fieldId': f'customfield_{number}', 'name': f'Field {number}'} for number in range(120)]
+        self.fetches = []
+        jira._get_json = self.get_json
+
+    def tearDown(self):
+        self.cache.close()
+
+    def get_json(self, path, params=None):
+        self.fetches.append((path, params['startAt']))
+        start = params['startAt']
+        # The server gives us fewer than we asked for
+        values = self.fields[start:start + 40]
+        page = {'values': values, 'isLast': start + len(values) >= len(self.fields)}
+        if self.total:
+            page['total'] = len(self.fields)
+        return page
+
+    def test_paged(self):
+        self.total = True
+        metadata = self.project.issue_metadata('task')
+        self.assertEqual(list(metadata['fields']), [field['fieldId'] for field in self.fields])
+        self.assertEqual(sorted(start for path, start in self.fetches), [0, 40, 80])
+        self.assertEqual(self.fetches[0][0], f'issue/createmeta/{PROJECT}/issuetypes/3')
+
+    def test_walked(self):
+        self.total = False
+        metadata = self.project.issue_metadata('3')
+        self.assertEqual(len(metadata['fields']), 120)
+        self.assertEqual([start for path, start in self.fetches], [0, 40, 80])
+
+    def test_cached(self):
+        self.total = True
+        self.project.issue_metadata('Task')
+        project = _Project([], self.cache)
+        project._issue_types = self.project._issue_types
+        project.jira._get_json = self.get_json
+        self.assertEqual(len(project.issue_metadata('Task')['fields']), 120)
+        self.assertEqual(len(self.fetches), 3)
+        self.assertIsNone(project.issue_metadata('Epic'))
+
+
+class MoveTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = None
+
+    def tearDown(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def project(self, issues, others=(), fail=()):
+        # The issues to move, and others; all are on the server and in
+        # the cache
+        issues = list(issues) + list(others)
+        self.cache = _cache(issues)
+        return _Project(issues, self.cache, fail)
+
+    def test_known_path(self):
+        project = self.project([_issue(1, '1')])
+        self.assertEqual(project.move(['1'], 'In Progress'), ['1'])
+        self.assertEqual(project.server['PROJ-1']['fields']['status']['id'], '3')
+
+    def test_learns_from_other_issues(self):
+        # New -> In Progress -> Review: where In Progress leads is learned
+        # from PROJ-2, which is already there, without moving PROJ-1
+        project = self.project([_issue(1, '1')], [_issue(2, '3')])
+        self.assertEqual(project.move(['1'], 'Review'), ['1'])
+        self.assertEqual(project.requests, [('GET', 'issue/PROJ-1/transitions'),
+                                            ('GET', 'issue/PROJ-2'),
+                                            ('POST', 'issue/PROJ-1/transitions'),
+                                            ('POST', 'issue/PROJ-1/transitions')])
+        self.assertEqual(project.server['PROJ-1']['fields']['status']['id'], '5')
+        self.assertEqual(project.server['PROJ-2']['fields']['status']['id'], '3')
+
+    def test_no_known_way(self):
+        # Nothing shows where In Progress leads, so Review can't be
+        # planned for; the issue mustn't be moved at all.
+        project = self.project([_issue(1, '1')])
+        self.assertEqual(project.move(['1'], 'Review'), [])
+        self.assertEqual(project.posts(), [])
+        self.assertEqual(project.server['PROJ-1']['fields']['status']['id'], '1')
+
+    def test_unreachable(self):
+        project = self.project([_issue(1, '1')], [_issue(2, '3'), _issue(3, '5')])
+        self.assertEqual(project.move(['1'], 'Rejected'), [])
+        self.assertEqual(project.posts(), [])
+
+    def test_no_such_status(self):
+        project = self.project([_issue(1, '1')], [_issue(2, '3')])
+        self.assertEqual(project.move(['1'], 'Bogus'), [])
+        self.assertEqual(project.requests, [('GET', 'issue/PROJ-1/transitions')])
+
+    def test_stale_cache(self):
+        # The cache says PROJ-2 is In Progress, but it's been closed
+        project = self.project([_issue(1, '1')], [_issue(2, '3')])
+        project.server['PROJ-2'] = _issue(2, '6')
+        self.assertEqual(project.move(['1'], 'Review'), [])
+        self.assertEqual(project.posts(), [])
+        self.assertIn('6', project._workflow('3'))
+        self.assertNotIn('3', project._workflow('3'))
+
+    def test_other_issue_type(self):
+        project = self.project([_issue(1, '1')], [_issue(2, '3', issue_type='5')])
+        self.assertEqual(project.move(['1'], 'Review'), [])
+        self.assertEqual(project.posts(), [])
+
+    def test_plans_once_per_node(self):
+        project = self.project([_issue(1, '1'), _issue(2, '1')], [_issue(3, '3')])
+        self.assertEqual(project.move(['1', '2'], 'Review'), ['1', '2'])
+        gets = [path for method, path in project.requests if method == 'GET']
+        self.assertEqual(gets, ['issue/PROJ-1/transitions', 'issue/PROJ-3'])
+
+    def test_stuck_partway(self):
+        # In Progress -> Review is refused, even after replanning; the
+        # issue stays where it got to
+        project = self.project([_issue(1, '1')], [_issue(2, '3')], fail=['3-5'])
+        self.assertEqual(project.move(['1'], 'Review'), [])
+        self.assertEqual(project.server['PROJ-1']['fields']['status']['id'], '3')
+        self.assertEqual(project.issue('1').raw['fields']['status']['id'], '3')
+
+    def test_without_cache(self):
+        project = _Project([_issue(1, '1'), _issue(2, '3')])
+        project.issue('2')
+        self.assertEqual(project.move(['1'], 'Review'), ['1'])
+        project = _Project([_issue(1, '1')])
+        self.assertEqual(project.move(['1'], 'Review'), [])
+        self.assertEqual(project.posts(), [])
+
+    def test_missing(self):
+        project = self.project([_issue(1, '1')])
+        self.assertRaises(ValueError, project.move, ['1', '9'], 'In Progress')
+        self.assertEqual(project.posts(), [])
+
+
+class OfflineTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache([_issue(1, '1'), _issue(2, '6')], fts=True)
+        self.project = _Project([], self.cache)
+        self.jira = self.project.jira
+
+    def tearDown(self):
+        self.cache.close()
+
+    def search(self, text='issue'):
+        return [record.key for record in self.project._indexed_search(text)]
+
+    def test_recent(self):
+        self.cache.set_last_sync(PROJECT, full=True)
+        self.assertEqual(self.search(), ['PROJ-1'])
+        self.assertEqual(self.jira.searches, [])
+
+    def test_catch_up(self):
+        self.cache.set_last_sync(PROJECT, time.time() - 3600, full=True)
+        self.assertEqual(self.search(), ['PROJ-1'])
+        self.assertEqual(len(self.jira.searches), 1)
+        self.assertIn('updated >= -62m', self.jira.searches[0])
+
+    def test_offline(self):
+        self.cache.set_last_sync(PROJECT, time.time() - 3600, full=True)
+        for error in (requests.exceptions.ConnectionError(), requests.exceptions.Timeout(),
+                      JIRAError('Service Unavailable', status_code=503)):
+            with self.subTest(error=error):
+                self.jira.error = error
+                self.assertEqual(self.search(), ['PROJ-1'])
+
+    def test_refused(self):
+        # The server is there, and said no; that's not for hiding
+        self.cache.set_last_sync(PROJECT, time.time() - 3600, full=True)
+        self.jira.error = JIRAError('Unauthorized', status_code=401)
+        self.assertRaises(JIRAError, self.search)
+
+    def test_first_sync(self):
+        # Nothing to fall back on, so failures aren't hidden - nor is
+        # downloading the whole project rushed
+        self.jira.error = requests.exceptions.ConnectionError()
+        self.assertRaises(requests.exceptions.ConnectionError, self.search)
+        self.jira.error = None
+        adapter = self.jira._session.get_adapter(BASE)
+        timeouts = []
+        self.jira.search_issues = lambda *args, **kwargs: timeouts.append(adapter.timeout) or _Results()
+        self.assertEqual(self.search(), [])
+        self.assertEqual(timeouts, [None])
+
+    def test_meta(self):
+        fetches = []
+
+        def _fetch():
+            fetches.append(self.jira._session.get_adapter(BASE).retries)
+            raise self.jira.error
+
+        self.cache.set_meta(PROJECT, 'thing', 'old')
+        self.cache.ttl = -1
+        self.jira.error = JIRAError('Bad Gateway', status_code=502)
+        self.assertEqual(self.project._meta('thing', _fetch), 'old')
+        self.assertEqual(fetches, [0])
+        self.jira.error = JIRAError('Forbidden', status_code=403)
+        self.assertRaises(JIRAError, self.project._meta, 'thing', _fetch)
+        self.jira.error = requests.exceptions.ConnectionError()
+        self.assertRaises(requests.exceptions.ConnectionError, self.project._meta, 'other', _fetch)
+
+
+class MetadataTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache([])
+        self.project = _Project([], self.cache)
+        self.fetched = [{'id': '3', 'name': 'Task', 'statuses': _statuses}]
+        self.project._fetch_statuses = lambda: self.fetched
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_expire(self):
+        # A long-lived process (the daemon) holds statuses in memory only
+        # as long as the cache would keep them
+        self.assertIsNone(self.project._status_id('Blocked'))
+        self.fetched = [{'id': '3', 'name': 'Task', 'statuses': _statuses + [{'id': '8', 'name': 'Blocked'}]}]
+        self.project.expire_metadata()
+        self.assertIsNone(self.project._status_id('Blocked'))
+        self.cache.ttl = 0
+        self.project.expire_metadata()
+        self.assertEqual(self.project._status_id('Blocked'), '8')
+
+    def test_myself(self):
+        # Who 'me' is is cached per set of credentials
+        def _response(name):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({'name': name}).encode()
+            return response
+
+        session = self.project.jira._session
+        session.auth = TokenAuth('secret-a')
+        session.get = lambda url: _response('alice')
+        self.assertEqual(self.project.user['name'], 'alice')
+        self.assertNotIn('secret', self.project._myself_meta())
+
+        project = _Project([], self.cache)
+        session = project.jira._session
+        session.auth = TokenAuth('secret-b')
+        session.get = lambda url: _response('bob')
+        self.assertEqual(project.user['name'], 'bob')
+
+        project = _Project([], self.cache)
+        project.jira._session.auth = TokenAuth('secret-a')
+        self.assertEqual(project.user['name'], 'alice')
+
+    def test_refresh(self):
+        self.project._workflow('3')['1'] = {}
+        self.project.status_to_id('New')
+        self.fetched = [{'id': '3', 'name': 'Task', 'statuses': _statuses + [{'id': '8', 'name': 'Blocked'}]}]
+        self.project.refresh(True)
+        self.assertEqual(self.project._workflow('3'), {})
+        self.assertEqual(self.project.status_to_id('Blocked'), '8')
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache([])
+
+    def tearDown(self):
+        self.cache.close()
+
+    def cached(self):
+        return sorted(raw['key'] for raw in self.cache.issues(PROJECT))
+
+    def test_stream(self):
+        # With a cold cache, ls --stream/--format show the first page
+        # before the rest is downloaded, and the cache is complete after
+        self.cache.store_issues(PROJECT, [_issue(999, '1')])
+        project = _Project([_issue(number, '1') for number in range(1, 121)] + [_issue(121, '6')], self.cache)
+        issues = project.iter_list()
+        self.assertEqual(next(issues)[0], 'PROJ-1')
+        self.assertEqual(len(project.jira.searches), 1)
+        self.assertEqual(len(self.cached()), 51)
+        self.assertIsNone(self.cache.last_sync(PROJECT))
+        self.assertEqual(len(list(issues)), 119)
+        self.assertEqual(len(project.jira.searches), 3)
+        self.assertEqual(len(self.cached()), 120)
+        self.assertNotIn('PROJ-999', self.cached())
+        self.assertFalse(self.cache.need_full_sync(PROJECT))
+
+        # Once synced, it's answered from the cache
+        self.assertEqual(len(list(project.iter_list())), 120)
+        self.assertEqual(project.jira.searches[3:], ['PROJECT = PROJ AND updated >= -2m'])
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncTest(unittest.TestCase):
+    # AsyncJiraProject driving the same steps, against the same stand-in
+    def setUp(self):
+        self.cache = None
+
+    def tearDown(self):
+        if self.cache is not None:
+            self.cache.close()
+
+    def project(self, issues, others=()):
+        issues = list(issues) + list(others)
+        self.cache = _cache(issues)
+        project = _Project(issues, self.cache)
+        aio = AsyncJiraProject(project, 'token', Transport())
+
+        async def _request(method, url, params=None, data=None):
+            if url == BASE + 'search':
+                page = project.jira.search_issues(params['jql'], startAt=params['startAt'], maxResults=params['maxResults'])
+                return {'issues': [issue.raw for issue in page], 'total': page.total}
+            await asyncio.sleep(0)
+            return project._request(method, url, data)
+
+        aio._request = _request
+        return project, aio
+
+    def test_issues(self):
+        project, aio = self.project([_issue(number, '1') for number in range(1, 4)])
+        issues = asyncio.run(aio.issues(['1', '3', '9']))
+        self.assertEqual([issue and issue.key for issue in issues], ['PROJ-1', 'PROJ-3', None])
+        self.assertEqual(project.jira.searches, ['key in (PROJ-1, PROJ-3, PROJ-9)'])
+
+    def test_move(self):
+        # Planned once for the node both are on, reads shared
+        project, aio = self.project([_issue(1, '1'), _issue(2, '1')], [_issue(3, '3')])
+        self.assertEqual(sorted(asyncio.run(aio.move(['1', '2'], 'Review'))), ['1', '2'])
+        gets = [path for method, path in project.requests if method == 'GET']
+        self.assertEqual(gets, ['issue/PROJ-1/transitions', 'issue/PROJ-3'])
+        self.assertEqual(len(project.posts()), 4)
+        for key in ('PROJ-1', 'PROJ-2'):
+            self.assertEqual(project.server[key]['fields']['status']['id'], '5')
+
+    def test_no_known_way(self):
+        project, aio = self.project([_issue(1, '1')])
+        self.assertEqual(asyncio.run(aio.move(['1'], 'Review')), [])
+        self.assertEqual(project.posts(), [])
+
+    def test_missing(self):
+        project, aio = self.project([_issue(1, '1')])
+        self.assertRaises(ValueError, asyncio.run, aio.move(['1', '9'], 'In Progress'))
+        self.assertEqual(project.posts(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
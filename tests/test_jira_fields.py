@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+#
+# Field renderers, as compiled from the built-in and configured field
+# definitions (trolly/jira_fields.py).
+
+import unittest
+
+from trolly import jira_fields
+from trolly.jira_fields import apply_field_renderers, issue_field_rows, render_field_data
+
+
+_custom = [{'id': 'customfield_1', 'name': 'Team', 'display': 'value'},
+           {'id': 'customfield_2', 'name': 'Points'},
+           {'id': 'customfield_3', 'name': 'Double', 'code': 'field * 2'},
+           {'id': 'customfield_4', 'name': 'Bogus', 'display': 'no_such_renderer'},
+           {'id': 'customfield_5', 'name': 'Hidden', 'disabled': True},
+           {'id': 'customfield_6', 'name': 'Secret', 'verbose': True},
+           # Built-in and immutable, so only its position counts
+           {'id': 'issuetype', 'name': 'Kind', 'display': 'string'}]
+
+_issue = {'issuetype': {'name': 'Task'},
+          'priority': {'name': 'Major'},
+          'labels': ['a', 'b'],
+          'customfield_1': {'value': 'Kernel'},
+          'customfield_2': 3,
+          'customfield_3': 4,
+          'customfield_4': 'x',
+          'customfield_5': 'y',
+          'customfield_6': 'z'}
+
+
+class RenderTest(unittest.TestCase):
+    def tearDown(self):
+        apply_field_renderers()
+
+    def test_defaults(self):
+        apply_field_renderers()
+        self.assertEqual(render_field_data('priority', {'name': 'Major'}, {}), 'Major')
+        self.assertIsNone(render_field_data('priority', {'name': 'Undefined'}, {}))
+        self.assertEqual(render_field_data('labels', ['a', 'b'], {}), 'a, b')
+        # Not shown: empty, hidden, verbose only, or unknown
+        self.assertIsNone(render_field_data('labels', [], {}))
+        self.assertIsNone(render_field_data('updated', '2023-01-01T00:00:00.000+0000', {}))
+        self.assertIsNone(render_field_data('watches', {'watchCount': 1}, {}))
+        self.assertIsNone(render_field_data('customfield_1', {'value': 'Kernel'}, {}))
+        creator = {'displayName': 'Alice', 'emailAddress': 'alice@example.com'}
+        self.assertIsNone(render_field_data('creator', creator, {}))
+        self.assertEqual(render_field_data('creator', creator, {}, verbose=True), 'Alice - alice@example.com')
+
+    def test_custom(self):
+        apply_field_renderers(_custom)
+        self.assertEqual(render_field_data('customfield_1', {'value': 'Kernel'}, _issue), 'Kernel')
+        self.assertEqual(render_field_data('customfield_2', 3, _issue), '3')
+        self.assertEqual(render_field_data('customfield_4', 'x', _issue),
+                         '<invalid renderer: no_such_renderer for customfield_4>')
+        self.assertIsNone(render_field_data('customfield_5', 'y', _issue))
+        self.assertIsNone(render_field_data('customfield_6', 'z', _issue))
+        self.assertEqual(render_field_data('customfield_6', 'z', _issue, verbose=True), 'z')
+        self.assertEqual(render_field_data('issuetype', {'name': 'Task'}, _issue), 'Task')
+
+    def test_code(self):
+        # Code has to be allowed both when compiling and when rendering
+        apply_field_renderers(_custom)
+        self.assertEqual(render_field_data('customfield_3', 4, _issue, allow_code=True), '4')
+        apply_field_renderers(_custom, allow_code=True)
+        self.assertEqual(render_field_data('customfield_3', 4, _issue), '4')
+        self.assertEqual(render_field_data('customfield_3', 4, _issue, allow_code=True), 8)
+
+    def test_rows(self):
+        apply_field_renderers(_custom)
+        self.assertEqual(issue_field_rows(_issue),
+                         [('Priority', 'Major'), ('Labels', 'a, b'), ('Team', 'Kernel'), ('Points', '3'), ('Double', '4'),
+                          ('Bogus', '<invalid renderer: no_such_renderer for customfield_4>'), ('Issue Type', 'Task')])
+        self.assertIn(('Secret', 'z'), issue_field_rows(_issue, verbose=True))
+
+    def test_compiled_once(self):
+        # Rendering looks fields up; it doesn't compile them again
+        apply_field_renderers(_custom)
+        compiled = jira_fields._compiled
+        render_field_data('customfield_1', {'value': 'Kernel'}, _issue)
+        issue_field_rows(_issue)
+        self.assertIs(jira_fields._compiled, compiled)
+        self.assertEqual(list(compiled)[:2], ['parent', 'priority'])
+        self.assertEqual(list(compiled)[-1], 'issuetype')
+
+
+if __name__ == '__main__':
+    unittest.main()
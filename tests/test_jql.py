@@ -0,0 +1,274 @@
+#!/usr/bin/python3
+#
+# JQL parsing and compilation to SQL (trolly/jql.py), and the decision
+# whether a query can be answered from the local issue cache
+# (JiraProject._jql_covered / _jql_records).
+
+import unittest
+
+from trolly import jql
+from trolly.cache import JiraCache
+from trolly.jboard import JiraProject
+
+
+PROJECT = 'PROJ'
+
+_statuses = [{'id': '1', 'name': 'New'},
+             {'id': '3', 'name': 'In Progress'},
+             {'id': '6', 'name': 'Closed'}]
+
+_status_ids = {status['name']: status['id'] for status in _statuses}
+
+
+def _status_id(value):
+    for status in _statuses:
+        if value == status['id'] or value.lower() == status['name'].lower():
+            return status['id']
+    return None
+
+
+def _issue(number, status, summary, assignee=None, labels=(), updated=None):
+    user = None
+    if assignee:
+        user = {'name': assignee, 'key': assignee, 'emailAddress': f'{assignee}@example.com'}
+    return {'key': f'{PROJECT}-{number}', 'id': str(10000 + number),
+            'fields': {'summary': summary,
+                       'status': {'id': _status_ids[status], 'name': status},
+                       'assignee': user,
+                       'labels': list(labels),
+                       'updated': updated or f'2023-01-{number:02}T00:00:00.000+0000',
+                       'description': '',
+                       'comment': {'comments': []}}}
+
+
+_issues = [_issue(1, 'New', 'kernel crash on boot', 'alice', ['kernel']),
+           _issue(2, 'In Progress', 'network driver timeout', 'bob', ['network', 'driver']),
+           _issue(3, 'New', 'docs typo'),
+           _issue(4, 'Closed', 'kernel memory leak', 'alice', ['kernel']),
+           _issue(5, 'In Progress', 'kernel build fails', 'Carol', updated='2022-06-01T00:00:00.000+0000')]
+
+
+def _cache(fts=False):
+    cache = JiraCache('https://jira.example.com', path=':memory:', fts=fts)
+    cache.store_issues(PROJECT, _issues)
+    return cache
+
+
+class _Results(list):
+    total = 0
+
+
+class _Jira(object):
+    # Just enough of jira.JIRA for JiraProject to answer from the cache:
+    # server info and field names are known, and the catch-up sync
+    # finds nothing new.
+    deploymentType = 'Server'
+    _fields_cache_value = {'summary': 'summary'}
+    _session = None
+
+    def _get_url(self, path):
+        return f'https://jira.example.com/rest/api/2/{path}'
+
+    def search_issues(self, *args, **kwargs):
+        return _Results()
+
+
+def _project(fts=False):
+    cache = _cache(fts)
+    cache.set_meta(PROJECT, 'statuses', [{'id': '3', 'name': 'Task', 'statuses': _statuses}])
+    cache.set_last_sync(PROJECT, full=True)
+    project = JiraProject(_Jira(), PROJECT, cache=cache)
+    cache.set_meta('*', project._myself_meta(), {'name': 'alice'})
+    return project
+
+
+class ParseTest(unittest.TestCase):
+    def test_clauses(self):
+        tree, order = jql.parse('project = PROJ AND status != Closed')
+        self.assertEqual(tree, ('and', [('clause', 'project', '=', 'PROJ'),
+                                        ('clause', 'status', '!=', 'Closed')]))
+        self.assertEqual(order, [])
+
+    def test_lists_strings_and_case(self):
+        tree, _ = jql.parse('Status IN (New, "In Progress") and LABELS not in (\'a b\')')
+        self.assertEqual(tree, ('and', [('clause', 'status', 'in', ['New', 'In Progress']),
+                                        ('clause', 'labels', 'not in', ['a b'])]))
+
+    def test_empty_and_functions(self):
+        self.assertEqual(jql.parse('assignee is EMPTY')[0], ('clause', 'assignee', 'is', None))
+        self.assertEqual(jql.parse('assignee is not null')[0], ('clause', 'assignee', 'is not', None))
+        self.assertEqual(jql.parse('assignee = currentUser()')[0], ('clause', 'assignee', '=', ('func', 'currentuser')))
+
+    def test_precedence(self):
+        tree, _ = jql.parse('a = 1 OR b = 2 AND NOT (c = 3 OR d = 4)')
+        self.assertEqual(tree, ('or', [('clause', 'a', '=', '1'),
+                                       ('and', [('clause', 'b', '=', '2'),
+                                                ('not', ('or', [('clause', 'c', '=', '3'),
+                                                                ('clause', 'd', '=', '4')]))])]))
+
+    def test_order_by(self):
+        tree, order = jql.parse('project = PROJ ORDER BY updated DESC, key')
+        self.assertEqual(order, [('updated', 'desc'), ('key', 'asc')])
+        self.assertEqual(jql.parse('order by summary')[0], None)
+
+    def test_errors(self):
+        for text in ('status > 3', 'project =', 'project = PROJ AND', '(status = New', 'status = New)',
+                     'assignee is foo', 'status was New', 'fixVersion = earliestUnreleasedVersion(PROJ)'):
+            with self.subTest(text=text):
+                self.assertRaises(jql.JQLError, jql.parse, text)
+
+    def test_conjuncts(self):
+        self.assertEqual(jql.conjuncts(None), [])
+        self.assertEqual(len(jql.conjuncts(jql.parse('a = 1 AND b = 2 AND c = 3')[0])), 3)
+        self.assertEqual(len(jql.conjuncts(jql.parse('a = 1 OR b = 2')[0])), 1)
+
+
+class ToSQLTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = _cache(fts=True)
+        self.ctx = jql.SQLContext(PROJECT, _status_id, lambda: 'alice', fts=True)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def keys(self, text, ctx=None):
+        tree, order = jql.parse(text)
+        condition, params = jql.to_sql(ctx or self.ctx, tree)
+        return [raw['key'] for raw in self.cache.query(PROJECT, condition, params, jql.order_sql(order))]
+
+    def test_status(self):
+        self.assertEqual(self.keys('status = New'), ['PROJ-3', 'PROJ-1'])
+        self.assertEqual(self.keys('status in ("in progress", 1)'), ['PROJ-5', 'PROJ-3', 'PROJ-2', 'PROJ-1'])
+        self.assertEqual(self.keys('status != Closed AND status != 3'), ['PROJ-3', 'PROJ-1'])
+        # Like JIRA, statuses the project doesn't have are an error
+        self.assertRaises(jql.JQLError, self.keys, 'status = Bogus')
+        self.assertRaises(jql.JQLError, self.keys, 'status not in (New, Bogus)')
+
+    def test_project(self):
+        self.assertEqual(len(self.keys('project = proj')), 5)
+        self.assertEqual(self.keys('project = OTHER'), [])
+        self.assertEqual(len(self.keys('project != OTHER')), 5)
+
+    def test_assignee(self):
+        self.assertEqual(self.keys('assignee = currentUser()'), ['PROJ-4', 'PROJ-1'])
+        self.assertEqual(self.keys('assignee = carol'), ['PROJ-5'])
+        self.assertEqual(self.keys('assignee = "bob@example.com"'), ['PROJ-2'])
+        self.assertEqual(self.keys('assignee is EMPTY'), ['PROJ-3'])
+        # Like JIRA, != doesn't match unassigned issues
+        self.assertEqual(self.keys('assignee != alice'), ['PROJ-5', 'PROJ-2'])
+
+    def test_unknown_user(self):
+        ctx = jql.SQLContext(PROJECT, _status_id, lambda: 'alice', fts=True,
+                             known_user=lambda name: name.lower() in ('bob', 'carol'))
+        self.assertEqual(self.keys('assignee in (bob, carol)', ctx), ['PROJ-5', 'PROJ-2'])
+        self.assertEqual(self.keys('assignee = currentUser()', ctx), ['PROJ-4', 'PROJ-1'])
+        self.assertRaises(jql.JQLError, self.keys, 'assignee = mallory', ctx)
+        self.assertRaises(jql.JQLError, self.keys, 'assignee not in (bob, mallory)', ctx)
+
+    def test_labels(self):
+        self.assertEqual(self.keys('labels = kernel'), ['PROJ-4', 'PROJ-1'])
+        self.assertEqual(self.keys('labels in (driver, kernel)'), ['PROJ-4', 'PROJ-2', 'PROJ-1'])
+        self.assertEqual(self.keys('labels is EMPTY'), ['PROJ-5', 'PROJ-3'])
+        self.assertEqual(self.keys('labels != kernel'), ['PROJ-2'])
+
+    def test_key(self):
+        self.assertEqual(self.keys('key in (proj-2, PROJ-5, PROJ-99)'), ['PROJ-5', 'PROJ-2'])
+        self.assertEqual(len(self.keys('issuekey != PROJ-1')), 4)
+
+    def test_boolean(self):
+        self.assertEqual(self.keys('status = New OR labels = driver'), ['PROJ-3', 'PROJ-2', 'PROJ-1'])
+        self.assertEqual(self.keys('NOT (status = New OR status = Closed)'), ['PROJ-5', 'PROJ-2'])
+        self.assertEqual(len(self.keys('ORDER BY key')), 5)
+
+    def test_text(self):
+        self.assertEqual(sorted(self.keys('text ~ kernel')), ['PROJ-1', 'PROJ-4', 'PROJ-5'])
+        self.assertEqual(self.keys('summary ~ "driver timeout"'), ['PROJ-2'])
+        self.assertEqual(self.keys('text ~ kern* AND text !~ leak AND status != Closed'), ['PROJ-5', 'PROJ-1'])
+
+    def test_text_needs_index(self):
+        ctx = jql.SQLContext(PROJECT, _status_id, lambda: 'alice', fts=False)
+        self.assertRaises(jql.JQLError, self.keys, 'text ~ kernel', ctx)
+        self.assertRaises(jql.JQLError, self.keys, 'description ~ kernel')
+
+    def test_unsupported(self):
+        for text in ('fixVersion = 1.0', 'priority is EMPTY', 'assignee = membersOf(devs)', 'reporter = currentUser()',
+                     'status in (New, EMPTY)'):
+            with self.subTest(text=text):
+                self.assertRaises(jql.JQLError, self.keys, text)
+
+    def test_order(self):
+        self.assertEqual(jql.order_sql([]), 'CAST(issues.id AS INTEGER) DESC')
+        self.assertEqual(self.keys('status != Closed ORDER BY key ASC'), ['PROJ-1', 'PROJ-2', 'PROJ-3', 'PROJ-5'])
+        self.assertEqual(self.keys('status = "In Progress" ORDER BY updated'), ['PROJ-5', 'PROJ-2'])
+        self.assertEqual(self.keys('ORDER BY assignee DESC, key DESC')[:2], ['PROJ-5', 'PROJ-2'])
+        self.assertRaises(jql.JQLError, jql.order_sql, [('priority', 'asc')])
+
+
+class CoveredTest(unittest.TestCase):
+    def setUp(self):
+        self.project = _project()
+
+    def tearDown(self):
+        self.project._cache.close()
+
+    def covered(self, text):
+        return self.project._jql_covered(jql.parse(text)[0])
+
+    def test_covered(self):
+        for text in ('project = PROJ AND status != Closed',
+                     'status not in (Closed, New) AND project = proj AND assignee = currentUser()',
+                     'project in (PROJ) AND status = New AND (labels = a OR labels = b)',
+                     'project = PROJ AND status in ("In Progress", 1) ORDER BY updated'):
+            with self.subTest(text=text):
+                self.assertTrue(self.covered(text))
+
+    def test_not_covered(self):
+        for text in ('project = PROJ OR status != Closed',
+                     '(project = PROJ AND status != Closed) OR labels = a',
+                     'status != Closed',
+                     'project = PROJ',
+                     'project = OTHER AND status != Closed',
+                     'project in (PROJ, OTHER) AND status != Closed',
+                     'project = PROJ AND status = Closed',
+                     'project = PROJ AND status in (New, Closed)',
+                     'project = PROJ AND status != New',
+                     'NOT (project != PROJ OR status = Closed)',
+                     'ORDER BY key'):
+            with self.subTest(text=text):
+                self.assertFalse(self.covered(text))
+
+    def test_records(self):
+        records = self.project._jql_records('project = PROJ AND status != Closed AND assignee = currentUser()')
+        self.assertEqual([record.key for record in records], ['PROJ-1'])
+        records = self.project._jql_records('project = PROJ AND status != Closed AND assignee in (bob, CAROL)')
+        self.assertEqual([record.key for record in records], ['PROJ-5', 'PROJ-2'])
+
+    def test_records_fallback(self):
+        for text in ('project = PROJ OR status != Closed',
+                     'status != Closed',
+                     'project = PROJ AND status in (New, Closed)',
+                     'project = PROJ AND status != Closed AND fixVersion = 1.0',
+                     'project = PROJ AND status != Closed AND assignee in membersOf(devs)',
+                     'project = PROJ AND status != Closed AND text ~ kernel',
+                     'project = PROJ AND status != Closed ORDER BY priority',
+                     'project = PROJ AND status > 1',
+                     'project = PROJ AND status != Closed AND status != Bogus',
+                     'project = PROJ AND status in (New, Bogus)',
+                     'project = PROJ AND status != Closed AND assignee = mallory',
+                     'project = PROJ AND status != Closed AND assignee in (bob, mallory)'):
+            with self.subTest(text=text):
+                self.assertIsNone(self.project._jql_records(text))
+
+    def test_records_text(self):
+        project = _project(fts=True)
+        records = project._jql_records('project = PROJ AND status != Closed AND text ~ kernel')
+        self.assertEqual(sorted(record.key for record in records), ['PROJ-1', 'PROJ-5'])
+        project._cache.close()
+
+    def test_no_cache(self):
+        project = JiraProject(_Jira(), PROJECT, closed_status='Closed')
+        self.assertIsNone(project._jql_records('project = PROJ AND status != Closed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
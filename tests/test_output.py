@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+#
+# Machine-readable output (trolly/output.py).
+
+import io
+import json
+import unittest
+
+from trolly.output import RecordWriter
+
+
+_columns = ['key', 'status', 'labels', 'summary']
+_records = [{'key': 'PROJ-1', 'status': 'New', 'labels': ['a', 'b'], 'summary': 'Tab\there'},
+            {'key': 'PROJ-2', 'status': 'Closed', 'labels': [], 'summary': None}]
+
+
+def _write(fmt, records=_records):
+    out = io.StringIO()
+    with RecordWriter(fmt, _columns, out) as writer:
+        for record in records:
+            writer.write(record)
+    return out.getvalue()
+
+
+class RecordWriterTest(unittest.TestCase):
+    def test_json(self):
+        self.assertEqual(json.loads(_write('json')), _records)
+        self.assertEqual(json.loads(_write('json', [])), [])
+
+    def test_ndjson(self):
+        self.assertEqual([json.loads(line) for line in _write('ndjson').splitlines()], _records)
+        self.assertEqual(_write('ndjson', []), '')
+
+    def test_tsv(self):
+        self.assertEqual(_write('tsv').splitlines(), ['key\tstatus\tlabels\tsummary',
+                                                      'PROJ-1\tNew\ta,b\tTab\\there',
+                                                      'PROJ-2\tClosed\t\t'])
+        # Structured values which aren't lists of strings are JSON
+        out = io.StringIO()
+        with RecordWriter('tsv', ['key', 'assignee'], out) as writer:
+            writer.write({'key': 'PROJ-1', 'assignee': {'name': 'alice'}})
+        self.assertEqual(out.getvalue().splitlines()[1], 'PROJ-1\t{"name": "alice"}')
+        self.assertEqual(_write('tsv', []), 'key\tstatus\tlabels\tsummary\n')
+
+    def test_incremental(self):
+        # Each record is written as it comes, not held back until the end
+        out = io.StringIO()
+        writer = RecordWriter('ndjson', _columns, out)
+        writer.write(_records[0])
+        self.assertEqual(json.loads(out.getvalue()), _records[0])
+        writer.close()
+        self.assertEqual(writer.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+#
+# --profile (trolly/profiling.py): how time splits between rendering
+# and the network.
+
+import cProfile
+import pstats
+import time
+import unittest
+
+from types import SimpleNamespace
+
+from trolly import profiling
+
+
+class _Categories(object):
+    def __init__(self, **categories):
+        self.categories = categories
+
+    def __enter__(self):
+        self.saved = profiling._categories
+        profiling._categories = self.categories
+
+    def __exit__(self, *args):
+        profiling._categories = self.saved
+
+
+def send():
+    time.sleep(0.05)
+
+
+def print_issue():
+    # Rendering which has to fetch something first
+    send()
+    time.sleep(0.02)
+
+
+def command():
+    send()
+    print_issue()
+
+
+class SplitTest(unittest.TestCase):
+    def test_split(self):
+        prof = cProfile.Profile()
+        prof.runcall(command)
+        with _Categories(rendering=[('test_profiling.py', 'print_*')], network=[('test_profiling.py', 'send')]):
+            times = profiling.split(pstats.Stats(prof))
+        # The fetch under print_issue is network time, not rendering
+        self.assertAlmostEqual(times['network'], 0.1, delta=0.03)
+        self.assertAlmostEqual(times['rendering'], 0.02, delta=0.015)
+
+    def test_not_wanted(self):
+        ns = SimpleNamespace(profile=False, profile_file=None)
+        self.assertFalse(profiling.wanted(ns))
+        self.assertEqual(profiling.call(ns, lambda value: value * 2, 21), 42)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+#
+# Heavy dependencies are only imported by the commands which use them
+# (the time budget itself is checked by contrib/benchmarks/startup.py).
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+_top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_heavy = ['jira', 'requests', 'aiohttp', 'rich', 'dateutil', 'trollo', 'editor', 'urllib3']
+
+
+def _loaded(code):
+    proc = subprocess.run([sys.executable, '-c', code + '; import sys; print(" ".join(sys.modules))'],
+                          cwd=_top, capture_output=True, text=True, check=True)
+    return set(name.split('.')[0] for name in proc.stdout.split())
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_entry_points(self):
+        for module in ('trolly.jira_cli', 'trolly.cli'):
+            with self.subTest(module=module):
+                self.assertEqual(_loaded(f'import {module}') & set(_heavy), set())
+
+    def test_parser(self):
+        # --help, and deciding whether the daemon can take a command
+        code = 'from trolly.jira_cli import create_parser; create_parser().parse_args(args=["ls"])'
+        self.assertEqual(_loaded(code) & set(_heavy), set())
+
+    def test_editor(self):
+        # Loaded by the wrapper, on first use
+        loaded = _loaded('import os; os.environ["EDITOR"] = "true"; from trolly.decor import editor; editor("x")')
+        self.assertIn('editor', loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+#
+# HTTP request tracing (trolly/trace.py).
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from trolly import trace
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        trace.start()
+
+    def tearDown(self):
+        trace._calls = None
+
+    def test_inactive(self):
+        trace._calls = None
+        self.assertFalse(trace.active())
+        trace.record('GET', 'https://jira.example.com/rest/api/2/myself', 200, 0.1, 10, 0)
+        self.assertEqual(trace.calls(), [])
+
+    def test_record(self):
+        trace.record('get', 'https://jira.example.com/1/boards/x?fields=name&key=abc&token=def', 200, 0.0123, 42, 1)
+        call = trace.calls()[0]
+        self.assertEqual({name: call[name] for name in ('method', 'host', 'path', 'query', 'status', 'ms', 'bytes', 'retries')},
+                         {'method': 'GET', 'host': 'jira.example.com', 'path': '/1/boards/x', 'query': 'fields=name',
+                          'status': 200, 'ms': 12.3, 'bytes': 42, 'retries': 1})
+
+    def test_summary(self):
+        url = 'https://jira.example.com/rest/api/2/'
+        trace.record('GET', url + 'issue/PROJ-1', 200, 0.01, 100, 0)
+        trace.record('GET', url + 'issue/PROJ-1', 200, 0.03, 100, 0)
+        trace.record('GET', url + 'search?startAt=0', 200, 0.1, 1000, 0)
+        trace.record('GET', url + 'search?startAt=50', 503, 0.2, 10, 2)
+        trace.record('POST', url + 'issue', None, 0.001, 0, 0)
+        self.assertEqual(trace.summary(), [('GET', '/rest/api/2/search', 2, 0, 300.0, 200.0, 1010, 2),
+                                           ('GET', '/rest/api/2/issue/PROJ-1', 2, 1, 40.0, 30.0, 200, 0),
+                                           ('POST', '/rest/api/2/issue', 1, 0, 1.0, 1.0, 0, 0)])
+        out = io.StringIO()
+        trace.print_summary(out)
+        self.assertTrue(out.getvalue().startswith('HTTP requests: 5, 341.0 ms, 1210 bytes, 2 retries, 2 errors\n'))
+
+    def test_file(self):
+        trace.record('GET', 'https://jira.example.com/rest/api/2/myself', 200, 0.1, 10, 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.ndjson')
+            trace.report(False, path)
+            with open(path) as trace_file:
+                self.assertEqual([json.loads(line)['path'] for line in trace_file], ['/rest/api/2/myself'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+#
+# The shared HTTP transport's retry policy, and the async backend's use
+# of it.
+
+import asyncio
+import email.utils
+import socket
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from trolly.transport import TokenBucket, Transport, _retry_after, http_session, http_settings
+
+try:
+    import aiohttp
+    from trolly.ajboard import AsyncJiraProject
+except ModuleNotFoundError:
+    aiohttp = None
+
+
+def _transport(**settings):
+    config = {'http': dict({'retries': 2, 'backoff': 0, 'max_backoff': 0}, **settings)}
+    return Transport(http_settings(config))
+
+
+def _closed_port():
+    # Nothing listens here once it's closed
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Replies with server.replies in turn, then 200s
+    def log_message(self, *args):
+        pass
+
+    def reply(self):
+        self.server.requests.append(self.command)
+        status, headers = self.server.replies.pop(0) if self.server.replies else (200, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = reply
+    do_POST = reply
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(_retry_after('2'), 2)
+        self.assertEqual(_retry_after('0.5'), 0.5)
+        self.assertEqual(_retry_after('-3'), 0)
+
+    def test_date(self):
+        when = email.utils.formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(_retry_after(when), 60, delta=2)
+        when = email.utils.formatdate(time.time() - 60, usegmt=True)
+        self.assertEqual(_retry_after(when), 0)
+
+    def test_invalid(self):
+        self.assertIsNone(_retry_after(None))
+        self.assertIsNone(_retry_after(''))
+        self.assertIsNone(_retry_after('soon'))
+
+
+class RetryDelayTest(unittest.TestCase):
+    def test_status(self):
+        transport = _transport()
+        self.assertIsNone(transport.retry_delay('GET', 200, None, 0))
+        self.assertIsNone(transport.retry_delay('GET', 404, None, 0))
+        self.assertIsNone(transport.retry_delay('GET', 500, None, 0))
+        for status in (429, 502, 503, 504):
+            self.assertEqual(transport.retry_delay('GET', status, None, 0), 0)
+        # Rate limited or unavailable: the server didn't act on it
+        self.assertEqual(transport.retry_delay('POST', 429, None, 0), 0)
+        self.assertEqual(transport.retry_delay('POST', 503, None, 0), 0)
+        # ...but a gateway error may have come after it did
+        self.assertIsNone(transport.retry_delay('POST', 502, None, 0))
+        self.assertIsNone(transport.retry_delay('POST', 504, None, 0))
+
+    def test_attempts(self):
+        transport = _transport()
+        self.assertEqual(transport.retry_delay('GET', 503, None, 1), 0)
+        self.assertIsNone(transport.retry_delay('GET', 503, None, 2))
+
+    def test_backoff(self):
+        transport = _transport(backoff=1, max_backoff=4)
+        for attempt, most in ((0, 1), (1, 2), (2, 4), (3, 4)):
+            transport.retries = 10
+            delay = transport.retry_delay('GET', 503, None, attempt)
+            self.assertGreaterEqual(delay, most / 2)
+            self.assertLessEqual(delay, most)
+
+    def test_retry_after(self):
+        transport = _transport(backoff=1, max_backoff=1)
+        self.assertEqual(transport.retry_delay('GET', 429, '7', 0), 7)
+        # Never sooner than our own backoff
+        self.assertGreaterEqual(transport.retry_delay('GET', 429, '0', 0), 0.5)
+
+    def test_no_response(self):
+        transport = _transport()
+        self.assertEqual(transport.retry_delay('GET', None, None, 0), 0)
+        self.assertIsNone(transport.retry_delay('POST', None, None, 0))
+        # Never got to the server, so nothing was done
+        self.assertEqual(transport.retry_delay('POST', None, None, 0, connected=False), 0)
+        self.assertIsNone(transport.retry_delay('GET', None, None, 2, connected=False))
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_unlimited(self):
+        bucket = TokenBucket(0, 1)
+        self.assertEqual([bucket.reserve() for _ in range(100)], [0] * 100)
+
+    def test_burst(self):
+        bucket = TokenBucket(10, 3)
+        delays = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(delays[:3], [0, 0, 0])
+        # Then one every 1/rate seconds
+        self.assertAlmostEqual(delays[3], 0.1, delta=0.01)
+        self.assertAlmostEqual(delays[4], 0.2, delta=0.01)
+
+    def test_refill(self):
+        bucket = TokenBucket(10, 1)
+        bucket._last = bucket._last - 5
+        bucket._tokens = 0
+        # Never more than a burst's worth saved up
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertGreater(bucket.reserve(), 0)
+
+
+class SendTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.replies = []
+        self.server.requests = []
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retried(self):
+        self.server.replies = [(429, {'Retry-After': '0'}), (503, {})]
+        resp = http_session(_transport()).get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.server.requests, ['GET', 'GET', 'GET'])
+
+    def test_retry_after(self):
+        self.server.replies = [(429, {'Retry-After': '0.3'})]
+        start = time.monotonic()
+        resp = http_session(_transport()).post(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(self.server.requests, ['POST', 'POST'])
+
+    def test_not_retried(self):
+        self.server.replies = [(502, {})]
+        resp = http_session(_transport()).post(self.url)
+        self.assertEqual(resp.status_code, 502)
+        self.assertEqual(self.server.requests, ['POST'])
+
+    def test_gives_up(self):
+        self.server.replies = [(503, {})] * 5
+        resp = http_session(_transport()).get(self.url)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncRetryTest(unittest.TestCase):
+    def request(self, transport, method):
+        attempts = []
+        retry_delay = transport.retry_delay
+
+        def _retry_delay(*args, **kwargs):
+            attempts.append(args[3])
+            return retry_delay(*args, **kwargs)
+
+        transport.retry_delay = _retry_delay
+        project = AsyncJiraProject(None, 'token', transport)
+
+        async def _request():
+            try:
+                await project._request(method, f'http://127.0.0.1:{_closed_port()}/rest/api/2/myself')
+            finally:
+                await project.close()
+
+        self.assertRaises(aiohttp.ClientConnectionError, asyncio.run, _request())
+        return attempts
+
+    def test_connection_refused(self):
+        # Retried like the sync transport does, whatever the method
+        self.assertEqual(self.request(_transport(), 'GET'), [0, 1, 2])
+        self.assertEqual(self.request(_transport(), 'POST'), [0, 1, 2])
+
+    def test_quick(self):
+        transport = _transport()
+        with transport.quick(1):
+            self.assertEqual(self.request(transport, 'GET'), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
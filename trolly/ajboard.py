@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+#
+# asyncio implementation of the parts of JiraProject which fan out into
+# many requests.  All requests share one connection pool and are bounded
+# by a semaphore, so bulk operations run concurrently without threads.
+# Project state (issue index, cache, statuses, workflows) lives in the
+# JiraProject it's attached to.
+
+import asyncio
+import atexit
+import json
+import time
+
+from jira import JIRAError
+from jira.resources import RemoteLink
+
+from trolly import trace
+from trolly.jboard import JiraProject
+
+try:
+    import aiohttp
+except ModuleNotFoundError:
+    aiohttp = None
+
+
+class AsyncJiraProject(object):
+    def __init__(self, base, token, transport, concurrency=4):
+        if aiohttp is None:
+            raise ModuleNotFoundError('The async backend requires aiohttp')
+        self.base = base
+        self.concurrency = max(1, concurrency)
+        self._token = token
+        # Same pool sizing, retry policy and rate limit as the sync side
+        self._transport = transport
+        self._session = None
+        self._sem = None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _url(self, path):
+        return self.base.jira._get_url(path)
+
+    async def _request(self, method, url, params=None, data=None):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._transport.settings['pool_size'])
+            headers = {'Authorization': f'Bearer {self._token}',
+                       'Accept': 'application/json',
+                       'Content-Type': 'application/json',
+                       'X-Atlassian-Token': 'no-check'}
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers)
+            self._sem = asyncio.Semaphore(self.concurrency)
+
+        if data is not None:
+            data = json.dumps(data)
+        attempt = 0
+        async with self._sem:
+            start = time.monotonic()
+            while True:
+                await asyncio.sleep(self._transport.limiter.reserve())
+                kwargs = {}
+                if self._transport.timeout is not None:
+                    kwargs['timeout'] = aiohttp.ClientTimeout(total=self._transport.timeout)
+                try:
+                    async with self._session.request(method, url, params=params, data=data, **kwargs) as resp:
+                        body = await resp.read()
+                        text = body.decode(resp.get_encoding())
+                        delay = self._transport.retry_delay(method, resp.status, resp.headers.get('Retry-After'), attempt)
+                        if delay is None:
+                            trace.record(method, str(resp.url), resp.status, time.monotonic() - start, len(body), attempt)
+                            if resp.status >= 400:
+                                raise JIRAError(text, status_code=resp.status, url=url)
+                            break
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    connected = not isinstance(e, aiohttp.ClientConnectorError)
+                    delay = self._transport.retry_delay(method, None, None, attempt, connected)
+                    if delay is None:
+                        trace.record(method, url, None, time.monotonic() - start, 0, attempt)
+                        raise
+                await asyncio.sleep(delay)
+                attempt = attempt + 1
+        if not text:
+            return None
+        return json.loads(text)
+
+    async def _search_issues(self, search_query, fields=None, validate=True):
+        chunk_len = 50
+        if fields is None:
+            fields = '*all'
+        url = self._url('search')
+
+        async def _fetch(start):
+            params = {'jql': search_query,
+                      'startAt': start,
+                      'maxResults': chunk_len,
+                      'fields': fields if isinstance(fields, str) else ','.join(fields),
+                      'validateQuery': 'true' if validate else 'false'}
+            return await self._request('GET', url, params=params)
+
+        page = await _fetch(0)
+        raws = list(page['issues'])
+        step = len(raws)
+        if step:
+            pages = await asyncio.gather(*[_fetch(start) for start in range(step, page['total'], step)])
+            for page in pages:
+                raws.extend(page['issues'])
+
+        ret = [self.base._issue_from_raw(raw) for raw in raws]
+        self.base._index_issues(ret, partial=(fields != '*all'))
+        return ret
+
+    async def _run_steps(self, steps, memo=None):
+        # Makes the requests for one of JiraProject's *_steps() generators.
+        # GETs go through memo (url -> future) if given, so steps which
+        # run side by side and only read don't repeat each other's.
+        try:
+            request = next(steps)
+            while True:
+                method, url, data = request
+                try:
+                    if memo is not None and method == 'GET':
+                        if url not in memo:
+                            memo[url] = asyncio.ensure_future(self._request(method, url))
+                        response = await memo[url]
+                    else:
+                        response = await self._request(method, url, data=data)
+                except JIRAError as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(response)
+        except StopIteration as e:
+            return e.value
+
+    async def issue(self, issue_alias):
+        return await self._run_steps(self.base._issue_steps(issue_alias))
+
+    async def issues(self, issue_aliases):
+        keys, queries = self.base._issue_keys(issue_aliases)
+        await asyncio.gather(*[self._search_issues(query, validate=False) for query in queries])
+
+        # Anything the searches didn't turn up (e.g. moved issues) is
+        # looked up individually
+        return await asyncio.gather(*[self.issue(key) for key in keys])
+
+    async def transitions(self, issue):
+        return await self._run_steps(self.base._transitions_steps(issue))
+
+    async def move(self, issue_aliases, status):
+        if not isinstance(issue_aliases, list):
+            issue_aliases = [issue_aliases]
+
+        fails = []
+        moves = []
+        issues = []
+        for idx, issue in zip(issue_aliases, await self.issues(issue_aliases)):
+            if not issue:
+                fails.append(idx)
+                continue
+            if idx in moves:
+                continue
+            moves.append(idx)
+            issues.append(issue)
+        if fails:
+            raise ValueError('No such issue(s): ' + str(fails))
+
+        # Plan once per workflow node, not once per issue sitting on it.
+        # Nothing is moved while planning, so the reads can be shared.
+        nodes = {}
+        for issue in issues:
+            nodes.setdefault(self.base._node(issue), issue)
+        memo = {}
+        plans = await asyncio.gather(*[self._run_steps(self.base._plan_steps(issue, status), memo)
+                                       for issue in nodes.values()])
+        plans = dict(zip(nodes, plans))
+
+        # Hops for one issue are necessarily sequential
+        movable = [(idx, issue) for idx, issue in zip(moves, issues) if plans[self.base._node(issue)] is not None]
+        results = await asyncio.gather(*[self._run_steps(self.base._transition_steps(issue, status)) for _, issue in movable])
+        return [idx for (idx, _), moved in zip(movable, results) if moved]
+
+    async def comment(self, issue_alias, text):
+        issue = await self.issue(issue_alias)
+        if not issue:
+            return None
+        return await self._request('POST', issue.raw['self'] + '/comment', data={'body': text})
+
+    async def remote_links(self, issue_alias):
+        issue = await self.issue(issue_alias)
+        raws = await self._request('GET', self._url(f'issue/{issue.raw["id"]}/remotelink'))
+        return [RemoteLink(self.base.jira._options, self.base.jira._session, raw=raw) for raw in raws]
+
+
+class SyncJiraProject(JiraProject):
+    # Drives AsyncJiraProject from the (synchronous) CLI handlers; anything
+    # not overridden here is plain JiraProject.
+    if aiohttp is not None:
+        _offline_errors = JiraProject._offline_errors + (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+    def __init__(self, jira, project, token, transport, **kwargs):
+        super().__init__(jira, project, **kwargs)
+        self.aio = AsyncJiraProject(self, token, transport, self.concurrency)
+        self._loop = asyncio.new_event_loop()
+        atexit.register(self.shutdown)
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def shutdown(self):
+        if self._loop.is_closed():
+            return
+        self._run(self.aio.close())
+        self._loop.close()
+
+    def _search_issues(self, search_query, fields=None, validate=True):
+        return self._run(self.aio._search_issues(search_query, fields, validate))
+
+    def _run_steps(self, steps):
+        return self._run(self.aio._run_steps(steps))
+
+    def issues(self, issue_aliases):
+        return self._run(self.aio.issues(issue_aliases))
+
+    def move(self, issue_aliases, status):
+        return self._run(self.aio.move(issue_aliases, status))
+
+    def comment(self, issue_alias, text):
+        return self._run(self.aio.comment(issue_alias, text))
+
+    def remote_links(self, issue_alias):
+        return self._run(self.aio.remote_links(issue_alias))
@@ -0,0 +1,302 @@
+#!/usr/bin/python3
+#
+# Local on-disk cache of JIRA data, so we don't have to re-download an
+# entire project on every invocation.  One SQLite database per JIRA
+# server, stored under ~/.cache/trolly (or $XDG_CACHE_HOME/trolly).
+
+import json
+import os
+import re
+import sqlite3
+import time
+
+
+_schema = [
+    '''CREATE TABLE IF NOT EXISTS issues (
+           project TEXT NOT NULL,
+           key TEXT NOT NULL,
+           id TEXT NOT NULL,
+           updated TEXT,
+           data TEXT NOT NULL,
+           PRIMARY KEY (project, key))''',
+    '''CREATE TABLE IF NOT EXISTS sync (
+           project TEXT PRIMARY KEY,
+           last_sync REAL NOT NULL)''',
+    # Last time the whole project was fetched, rather than what changed
+    '''CREATE TABLE IF NOT EXISTS full_sync (
+           project TEXT PRIMARY KEY,
+           last_sync REAL NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS transitions (
+           project TEXT NOT NULL,
+           issuetype TEXT NOT NULL,
+           status TEXT NOT NULL,
+           stored REAL NOT NULL,
+           data TEXT NOT NULL,
+           PRIMARY KEY (project, issuetype, status))''',
+    '''CREATE TABLE IF NOT EXISTS meta (
+           project TEXT NOT NULL,
+           name TEXT NOT NULL,
+           stored REAL NOT NULL,
+           data TEXT NOT NULL,
+           PRIMARY KEY (project, name))''',
+    '''CREATE TABLE IF NOT EXISTS missing (
+           key TEXT PRIMARY KEY,
+           expires REAL NOT NULL)''',
+    # For answering JQL locally (see jql.py)
+    '''CREATE INDEX IF NOT EXISTS issues_status
+           ON issues (project, json_extract(data, '$.fields.status.id'))''',
+    '''CREATE INDEX IF NOT EXISTS issues_assignee
+           ON issues (project, lower(json_extract(data, '$.fields.assignee.name')))''',
+]
+
+_labels_schema = [
+    '''CREATE TABLE labels (
+           project TEXT NOT NULL,
+           key TEXT NOT NULL,
+           label TEXT NOT NULL,
+           PRIMARY KEY (project, key, label))''',
+    '''CREATE INDEX labels_label ON labels (project, label)''',
+]
+
+# Optional full-text index of cached issues; rowid is the issue id
+_fts_schema = '''CREATE VIRTUAL TABLE issue_text USING fts5(
+                   project UNINDEXED,
+                   key UNINDEXED,
+                   summary,
+                   description,
+                   labels,
+                   comments,
+                   tokenize = 'porter unicode61')'''
+
+# Fields which only go in the text index, not the issues table
+text_fields = ['description', 'comment']
+
+# Default lifetime (seconds) of cached workflow and project metadata
+DEFAULT_TTL = 86400
+
+# How often (seconds) to fetch the whole project again; incremental
+# syncs never hear about issues which were deleted or moved elsewhere
+DEFAULT_FULL_SYNC_TTL = 86400
+
+# Issue keys which didn't exist are only remembered briefly, since
+# they may be created at any time.
+MISSING_TTL = 300
+
+
+def cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(base, 'trolly')
+
+
+def _cache_name(url):
+    # https://issues.mycompany.com/ -> issues.mycompany.com
+    name = re.sub(r'^[a-z]+://', '', url.lower()).strip('/')
+    return re.sub(r'[^a-z0-9.-]', '_', name)
+
+
+def fts_query(text):
+    # Plain words (all of which must match), not FTS5 query syntax;
+    # a trailing * still does a prefix search.
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def _issue_text(raw):
+    fields = raw['fields']
+    comments = (fields.get('comment') or {}).get('comments', [])
+    return (fields.get('summary') or '',
+            fields.get('description') or '',
+            ' '.join(fields.get('labels') or []),
+            '\n'.join(comment.get('body') or '' for comment in comments))
+
+
+class JiraCache(object):
+    def __init__(self, url, path=None, ttl=DEFAULT_TTL, missing_ttl=MISSING_TTL, fts=False,
+                 full_sync_ttl=DEFAULT_FULL_SYNC_TTL):
+        self.ttl = ttl
+        self.full_sync_ttl = full_sync_ttl
+        self.missing_ttl = missing_ttl
+        self.fts = fts
+        if path is None:
+            path = os.path.join(cache_dir(), f'jira-{_cache_name(url)}.sqlite')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        with self._db:
+            for stmt in _schema:
+                self._db.execute(stmt)
+            if not self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'labels'").fetchone():
+                # Older cache; labels of issues we have aren't known
+                for stmt in _labels_schema:
+                    self._db.execute(stmt)
+                self._db.execute('DELETE FROM sync')
+            has_fts = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'issue_text'").fetchone()
+            if fts and not has_fts:
+                # Issues already cached have no text; start over
+                self._db.execute(_fts_schema)
+                self._db.execute('DELETE FROM sync')
+            elif has_fts and not fts:
+                # It would go stale; rebuilt if turned on again
+                self._db.execute('DROP TABLE issue_text')
+
+    def close(self):
+        self._db.close()
+
+    def last_sync(self, project):
+        row = self._db.execute('SELECT last_sync FROM sync WHERE project = ?', (project,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_last_sync(self, project, timestamp=None, full=False):
+        if timestamp is None:
+            timestamp = time.time()
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO sync (project, last_sync) VALUES (?, ?)',
+                             (project, timestamp))
+            if full:
+                self._db.execute('INSERT OR REPLACE INTO full_sync (project, last_sync) VALUES (?, ?)',
+                                 (project, timestamp))
+
+    def need_full_sync(self, project, now=None):
+        if now is None:
+            now = time.time()
+        if self.last_sync(project) is None:
+            return True
+        row = self._db.execute('SELECT last_sync FROM full_sync WHERE project = ?', (project,)).fetchone()
+        return row is None or row[0] < now - self.full_sync_ttl
+
+    def issues(self, project):
+        # Newest first, like JIRA's default ordering
+        rows = self._db.execute('SELECT data FROM issues WHERE project = ? ORDER BY CAST(id AS INTEGER) DESC',
+                                (project,))
+        for row in rows:
+            yield json.loads(row[0])
+
+    def store_issues(self, project, issues, replace=False):
+        # replace: these are all of the project's issues; drop the rest
+        rows = []
+        text = []
+        labels = []
+        for raw in issues:
+            labels.extend((project, raw['key'], label) for label in raw['fields'].get('labels') or [])
+            if self.fts:
+                text.append((int(raw['id']), project, raw['key']) + _issue_text(raw))
+                raw = dict(raw, fields={name: value for name, value in raw['fields'].items() if name not in text_fields})
+            rows.append((project, raw['key'], raw['id'], raw['fields'].get('updated'), json.dumps(raw)))
+        with self._db:
+            if replace:
+                self._forget_issues('project = ?', (project,))
+            self._db.executemany('INSERT OR REPLACE INTO issues (project, key, id, updated, data) VALUES (?, ?, ?, ?, ?)',
+                                 rows)
+            self._db.executemany('DELETE FROM labels WHERE project = ? AND key = ?', [row[:2] for row in rows])
+            self._db.executemany('INSERT OR REPLACE INTO labels (project, key, label) VALUES (?, ?, ?)', labels)
+            if text:
+                self._db.executemany('INSERT OR REPLACE INTO issue_text (rowid, project, key, summary, description, labels, comments) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                     text)
+
+    def _forget_issues(self, condition, params):
+        self._db.execute(f'DELETE FROM issues WHERE {condition}', params)
+        self._db.execute(f'DELETE FROM labels WHERE {condition}', params)
+        if self.fts:
+            self._db.execute(f'DELETE FROM issue_text WHERE {condition}', params)
+
+    def retain_issues(self, project, keys):
+        # After storing all of a project's issues a page at a time, drop
+        # any others we had
+        keys = set(keys)
+        gone = [row[0] for row in self._db.execute('SELECT key FROM issues WHERE project = ?', (project,))
+                if row[0] not in keys]
+        with self._db:
+            for key in gone:
+                self._forget_issues('project = ? AND key = ?', (project, key))
+
+    def forget_issue(self, key):
+        # Deleted, or moved (to another key or project)
+        with self._db:
+            self._forget_issues('key = ?', (key,))
+
+    def query(self, project, condition, params, order):
+        # condition and order come from jql.to_sql() and jql.order_sql()
+        sql = f'SELECT issues.data FROM issues WHERE issues.project = ? AND {condition} ORDER BY {order}'
+        for row in self._db.execute(sql, [project] + list(params)):
+            yield json.loads(row[0])
+
+    def search(self, project, text, limit=None):
+        # Best matches first
+        query = fts_query(text)
+        if not query:
+            return []
+        sql = ('''SELECT issues.data FROM issue_text
+                   JOIN issues ON issues.project = issue_text.project AND issues.key = issue_text.key
+                   WHERE issue_text MATCH ? AND issue_text.project = ?
+                   ORDER BY bm25(issue_text, 0, 0, 10.0, 1.0, 5.0, 1.0)''')
+        params = (query, project)
+        if limit:
+            sql = sql + ' LIMIT ?'
+            params = params + (limit,)
+        return [json.loads(row[0]) for row in self._db.execute(sql, params)]
+
+    # Project metadata (statuses, issue types, etc.) which rarely changes
+    def meta(self, project, name, expired=False):
+        # expired: however old it is (e.g. when the server is unreachable)
+        oldest = 0 if expired else time.time() - self.ttl
+        row = self._db.execute('SELECT data FROM meta WHERE project = ? AND name = ? AND stored >= ?',
+                               (project, name, oldest)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def set_meta(self, project, name, value):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO meta (project, name, stored, data) VALUES (?, ?, ?, ?)',
+                             (project, name, time.time(), json.dumps(value)))
+
+    def forget_meta(self, project):
+        with self._db:
+            self._db.execute('DELETE FROM meta WHERE project = ?', (project,))
+
+    # Workflow graph: for a given issue type and source status, where can
+    # we go from here?  {to_status_id: {'id': transition_id, 'name': name}}
+    def transition_graph(self, project, issuetype):
+        expiry = time.time() - self.ttl
+        rows = self._db.execute('SELECT status, data FROM transitions WHERE project = ? AND issuetype = ? AND stored >= ?',
+                                (project, issuetype, expiry))
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    def store_transitions(self, project, issuetype, status, transitions):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO transitions (project, issuetype, status, stored, data) VALUES (?, ?, ?, ?, ?)',
+                             (project, issuetype, status, time.time(), json.dumps(transitions)))
+
+    def forget_transitions(self, project, issuetype, status):
+        with self._db:
+            self._db.execute('DELETE FROM transitions WHERE project = ? AND issuetype = ? AND status = ?',
+                             (project, issuetype, status))
+
+    def is_missing(self, key):
+        row = self._db.execute('SELECT expires FROM missing WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def set_missing(self, key):
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO missing (key, expires) VALUES (?, ?)',
+                             (key, time.time() + self.missing_ttl))
+
+    def forget_missing(self, key):
+        with self._db:
+            self._db.execute('DELETE FROM missing WHERE key = ?', (key,))
+
+    def clear(self, project):
+        with self._db:
+            self._forget_issues('project = ?', (project,))
+            self._db.execute('DELETE FROM sync WHERE project = ?', (project,))
+            self._db.execute('DELETE FROM full_sync WHERE project = ?', (project,))
+            self._db.execute('DELETE FROM transitions WHERE project = ?', (project,))
+            self._db.execute('DELETE FROM meta WHERE project = ?', (project,))
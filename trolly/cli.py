@@ -5,13 +5,9 @@ import re
 import sys
 # import yaml
 
-import editor
-
-from trollo import TrelloApi
-
+from trolly import output, profiling, trace
 from trolly.args import ComplicatedArgs
-from trolly.board import TrollyBoard
-from trolly.decor import color_string, hbar_under, pretty_date, md_print
+from trolly.decor import editor, color_string, hbar_under, pretty_date, md_print
 from trolly.config import get_config
 
 
@@ -52,6 +48,11 @@ def trello_init(config):
         print("  https://trello.com/app-key")
         exit(1)
 
+    from trollo import TrelloApi
+    from trolly.transport import Transport, http_session, http_settings, use_trello_session
+
+    url = config['trello'].get('url') if config is not None else None
+    use_trello_session(http_session(Transport(http_settings(config))), url)
     trello = TrelloApi(TRELLO_KEY)
     if not TRELLO_TOKEN:
         print("Visit this URL to get your token:")
@@ -124,10 +125,51 @@ def print_cards_simple(cards, args=None):
             print(cards[card]['name'])
 
 
+# Columns for --format
+_list_columns = ['card', 'id', 'list', 'name', 'labels']
+_card_columns = ['card', 'id', 'name', 'list', 'url', 'labels', 'members', 'desc', 'comments']
+
+
+def card_list_records(cards, args=None):
+    for card in cards:
+        val = cards[card]
+        if args and args.list and val['list'] not in args.list:
+            continue
+        yield {'card': card,
+               'id': val['id'],
+               'list': val['list'],
+               'name': val['name'],
+               'labels': [label['name'] for label in val.get('labels', [])]}
+
+
+def card_record(board, card):
+    members = []
+    if card.get('idMembers'):
+        members = [member['username'] for member in board.members() if member['id'] in card['idMembers']]
+    return {'card': card['idShort'],
+            'id': card['id'],
+            'name': card['name'],
+            'list': board.config()['list_map'].get(card['idList']),
+            'url': card['url'],
+            'labels': [label['name'] for label in card.get('labels', [])],
+            'members': members,
+            'desc': card['desc'],
+            'comments': [{'id': act['id'],
+                          'author': act['memberCreator']['username'],
+                          'date': act['date'],
+                          'text': act['data']['text']}
+                         for act in card.get('history', []) if act['type'] == 'commentCard']}
+
+
 def search_cards(args):
     ret = args.board.search(' '.join(args.text))
     if not ret:
+        if args.format != 'text':
+            output.write_records(args.format, _list_columns, [])
         return (127, False)
+    if args.format != 'text':
+        output.write_records(args.format, _list_columns, card_list_records(ret))
+        return (0, False)
     print_cards_simple(ret)
     return (0, False)
 
@@ -140,6 +182,9 @@ def list_cards(args):
         userid = None
 
     cards = args.board.list(userid=userid)
+    if args.format != 'text':
+        output.write_records(args.format, _list_columns, card_list_records(cards, args))
+        return (0, True)
     print_cards_simple(cards, args)
     return (0, True)
 
@@ -384,6 +429,9 @@ def cat(args):
             return (127, False)
         cards.append(card)
 
+    if args.format != 'text':
+        output.write_records(args.format, _card_columns, (card_record(args.board, card) for card in cards))
+        return (0, False)
     for card in cards:
         print_card(args.board, card, args.verbose)
     return (0, False)
@@ -590,6 +638,8 @@ def get_board(board_name=None):
                     pass
                 break
 
+    from trolly.board import TrollyBoard
+
     board = trello_init(config)
     return TrollyBoard(board, board_id, readonly=readonly)
 
@@ -598,17 +648,22 @@ def create_parser():
     parser = ComplicatedArgs()
 
     parser.add_argument('-b', '--board', help='Use this Trello board (from config file)', default=None)
+    trace.add_arguments(parser)
+    profiling.add_arguments(parser)
 
     cmd = parser.command('ls', help='List card(s)', handler=list_cards)
     cmd.add_argument('-m', '--mine', action='store_true', help='Display only cards assigned to me.')
     cmd.add_argument('-l', '--labels', action='store_true', help='Display card labels.')
+    output.add_argument(cmd)
     cmd.add_argument('list', nargs='*', help='Restrict to cards in these list(s)')
 
     cmd = parser.command('search', help='List card(s) with matching text', handler=search_cards)
+    output.add_argument(cmd)
     cmd.add_argument('text', nargs='*', help='Search text')
 
     cmd = parser.command('cat', help='Print card(s)', handler=cat)
     cmd.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    output.add_argument(cmd)
     cmd.add_argument('card_id', nargs='+', help='Target card(s)')
 
     cmd = parser.command('view', help='Display card in browser', handler=view_card)
@@ -682,6 +737,7 @@ def create_parser():
 def main():
     parser = create_parser()
     ns = parser.parse_args()
+    trace.setup(ns)
 
     try:
         board = get_board(ns.board)
@@ -690,7 +746,7 @@ def main():
 
     # Pass this down in namespace to callbacks
     parser.add_arg('board', board)
-    rc = parser.finalize(ns)
+    rc = profiling.call(ns, parser.finalize, ns)
     if rc:
         ret = rc[0]
         save = rc[1]
@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+#
+# 'jolly daemon' keeps a warm JiraProject (connection pool, metadata,
+# issue cache) around and runs commands for jolly over a Unix socket,
+# so each invocation doesn't pay for imports, TLS handshakes and
+# project setup.  Only non-interactive commands are handled; anything
+# else (or everything, if no daemon is running) runs locally as usual.
+#
+# Protocol: one JSON object per line each way.
+#   client: {"argv": [...], "width": 120, "tty": true}  or  {"stop": true}
+#   daemon: {"rc": 0, "stdout": "...", "stderr": "..."}  (rc null: run it yourself)
+
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+
+from trolly.cache import cache_dir
+from trolly.decor import set_terminal
+
+
+# Commands which never need the user's terminal or editor; the ones in
+# _need_text only when text is given on the command line.
+_commands = ('whoami', 'ls', 'search', 'cat', 'll', 'lt', 'link-types', 'assign', 'unassign', 'mv',
+             'link', 'attach', 'unlink', 'field', 'fields', 'close', 'new', 'subtask', 'comment')
+_need_text = ('new', 'subtask', 'comment')
+
+
+def socket_path():
+    return os.path.join(cache_dir(), 'jolly.sock')
+
+
+def can_serve(ns):
+    if getattr(ns, 'command', None) not in _commands:
+        return False
+    # Has to be measured here
+    if any(getattr(ns, name, None) for name in ('trace', 'trace_file', 'profile', 'profile_file')):
+        return False
+    # Replies come back whole, which would undo streaming output
+    if getattr(ns, 'stream', False) or getattr(ns, 'format', 'text') not in (None, 'text'):
+        return False
+    if ns.command in _need_text:
+        return bool(ns.text) and not getattr(ns, 'edit', None)
+    return True
+
+
+def _request(message):
+    path = socket_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(message).encode() + b'\n')
+            with sock.makefile('rb') as reply:
+                return json.loads(reply.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def forward(argv):
+    # Run a command in the daemon; returns its exit code, or None if it
+    # should be run here instead.
+    try:
+        width = os.get_terminal_size()[0]
+    except OSError:
+        width = None
+    reply = _request({'argv': argv, 'width': width, 'tty': sys.stdout.isatty()})
+    if not reply or reply.get('rc') is None:
+        return None
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    return reply['rc']
+
+
+def stop():
+    return _request({'stop': True}) is not None
+
+
+def _run(dispatch, message):
+    # dispatch(argv) -> exit code, or None if it can't be run here
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    set_terminal(message.get('width') or 80, message.get('tty', False))
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            rc = dispatch(message['argv'])
+        except SystemExit as e:
+            rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, (int, type(None))):
+                print(e.code, file=sys.stderr)
+        except Exception:
+            traceback.print_exc()
+            rc = 1
+    if rc is None:
+        return {'rc': None}
+    return {'rc': rc, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+def serve(dispatch):
+    path = socket_path()
+    if _request({'argv': []}) is not None:
+        print(f'Already running on {path}')
+        return 1
+    if os.path.exists(path):
+        os.unlink(path)
+
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Nobody else gets to run commands as us
+    umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    os.chmod(path, 0o600)
+    sock.listen(8)
+    print(f'Listening on {path}')
+    sys.stdout.flush()
+
+    try:
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                try:
+                    with conn.makefile('rb') as request:
+                        message = json.loads(request.readline())
+                except (OSError, ValueError):
+                    continue
+                if message.get('stop'):
+                    conn.sendall(b'{}\n')
+                    break
+                if not message.get('argv'):
+                    reply = {'rc': None}
+                else:
+                    reply = _run(dispatch, message)
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b'\n')
+                except OSError:
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        os.unlink(path)
+    return 0
@@ -4,22 +4,21 @@
 #   http://github.com/release-depot/toolchest
 
 import re
-import os
+import shutil
+import sys
 
-from dateutil.parser import parse
-from pprint import PrettyPrinter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
-try:
-    from rich.console import Console
-    from rich.markdown import Markdown
-
-    console = Console()
-    _markdown = True
-except ModuleNotFoundError:
-    _markdown = False
-    pass
+# rich (for markdown) is loaded on first use, and only if installed;
+# None until then.
+console = None
+_markdown = None
 
 display_color = True
+_termsize = None
+_force_terminal = None
+_ansi_re = re.compile('\x1b\\[[0-9;]*m')
 HILIGHT = '[1m'
 NORMAL = '[0m'
 
@@ -66,16 +65,95 @@ def jira2md(jira_text):
     return re.sub(r'({code(:java)?}|{noformat})', '```', jira_text)
 
 
+def _load_rich():
+    global console
+    global _markdown
+
+    if _markdown is None:
+        try:
+            from rich.console import Console
+
+            console = Console(width=_termsize, force_terminal=_force_terminal)
+            _markdown = True
+        except ModuleNotFoundError:
+            _markdown = False
+    return _markdown
+
+
+def editor(*args, **kwargs):
+    # Imported here rather than at load time, like rich, so that --help,
+    # the daemon client etc. start quickly
+    import editor as _editor
+
+    return _editor(*args, **kwargs)
+
+
 def md_print(markdown_text):
-    if _markdown:
+    if _load_rich():
+        from rich.markdown import Markdown
+
         fixed_text = jira2md(markdown_text)
         console.print(Markdown(fixed_text))
     else:
         print(markdown_text)
 
 
+def set_terminal(width=None, tty=True):
+    # Render for someone else's terminal (see daemon.py) rather than
+    # whatever stdout happens to be.
+    global _termsize
+    global _force_terminal
+    global _markdown
+
+    _termsize = width
+    _force_terminal = tty
+    if _markdown:
+        # Made again (with the above) when next needed
+        _markdown = None
+
+
+def terminal_width():
+    # Measured once; COLUMNS, or 80 if stdout isn't a terminal
+    global _termsize
+
+    if not _termsize:
+        _termsize = shutil.get_terminal_size((80, 24)).columns
+    return _termsize
+
+
+# What JIRA ('2023-01-02T03:04:05.000+0000') and Trello
+# ('2023-01-02T03:04:05.000Z') send; anything else goes to dateutil
+_iso_date_re = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?'
+                          r'(?:(Z)|([+-])(\d\d):?(\d\d))?$')
+
+
+def _parse_iso_date(date_str):
+    match = _iso_date_re.match(date_str)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, frac, utc, sign, tzhour, tzmin = match.groups()
+    tzinfo = None
+    if utc:
+        tzinfo = timezone.utc
+    elif sign:
+        offset = timedelta(hours=int(tzhour), minutes=int(tzmin))
+        tzinfo = timezone(-offset if sign == '-' else offset)
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                        int(frac.ljust(6, '0')) if frac else 0, tzinfo=tzinfo)
+    except ValueError:
+        return None
+
+
+# The same few dates (created, updated, comments by the same people)
+# come up over and over
+@lru_cache(maxsize=4096)
 def pretty_date(date_str):
-    date_obj = parse(date_str)
+    date_obj = _parse_iso_date(date_str)
+    if date_obj is None:
+        from dateutil.parser import parse
+
+        date_obj = parse(date_str)
     return date_obj.astimezone().strftime('%F %T %Z')
 
 
@@ -112,11 +190,10 @@ def nym(s):
     return z
 
 
-_pretty_print = PrettyPrinter(indent=4)
-
-
 def pretty_print(obj):
-    _pretty_print.pprint(obj)
+    from pprint import PrettyPrinter
+
+    PrettyPrinter(indent=4).pprint(obj)
 
 
 # Print stuff in a format like so:
@@ -126,98 +203,92 @@ def pretty_print(obj):
 # linesplit: None = trail off with '..', or separator
 #            character (space, comma, etc.)
 #
-# vsep_print(arg1, width1, arg2, width2, ... argN)
+# Table collects the rows, working out the column widths as they're
+# added, then writes them all at once.  Every column but the last is
+# padded to its widest cell; the last gets whatever is left of the
+# screen.
 #
 vseparator = '┃'
 
+# Narrowest the last column gets, however little room is left for it
+_min_room = 10
 
-def vsep_print(linesplit=None, *vals):
 
-    global _termsize
-    global vseparator
+def text_width(text):
+    # Length on screen, i.e. not counting colour codes
+    return len(_ansi_re.sub('', text))
 
-    sep = f' {vseparator} '
 
-    fields = []
-    widths = []
-    consumed = 0
+def pad(text, width):
+    return text + ' ' * (width - text_width(text))
 
-    screen_width = os.get_terminal_size()[0]
-    args = list(vals)
 
+def _wrap(text, linesplit, room):
+    if text_width(text) <= room:
+        return [text]
+    # Cutting through a colour code would leave it open
+    text = _ansi_re.sub('', text)
+    if not linesplit:
+        return [text[:room - 2] + '..']
+
+    lines = []
+    line = None
+    for chunk in text.split(linesplit):
+        if line is not None and len(line) + len(linesplit) + len(chunk) <= room:
+            line = line + linesplit + chunk
+            continue
+        if line is not None:
+            lines.append(line)
+        # Anything longer than a whole line gets cut up
+        while len(chunk) > room:
+            lines.append(chunk[:room])
+            chunk = chunk[room:]
+        line = chunk
+    lines.append(line)
+    return lines
+
+
+class Table(object):
+    def __init__(self, widths=None, width=None):
+        # widths: minimum column widths; width: of the screen (default:
+        # the terminal's)
+        self.widths = list(widths or [])
+        self.width = width
+        self.rows = []
+
+    def add(self, *cells, linesplit=None):
+        cells = [cell if isinstance(cell, str) else str(cell) for cell in cells]
+        for idx, cell in enumerate(cells[:-1]):
+            if idx == len(self.widths):
+                self.widths.append(0)
+            self.widths[idx] = max(self.widths[idx], text_width(cell))
+        self.rows.append((cells, linesplit))
+
+    def lines(self):
+        sep = f' {vseparator} '
+        screen_width = self.width or terminal_width()
+        for cells, linesplit in self.rows:
+            head = ''.join(pad(cell, width) + sep for cell, width in zip(cells[:-1], self.widths))
+            used = sum(self.widths[:len(cells) - 1]) + (len(cells) - 1) * len(sep)
+            wrapped = _wrap(cells[-1], linesplit, max(screen_width - used, _min_room))
+            yield head + wrapped[0]
+            if len(wrapped) > 1:
+                indent = ' ' * (used - len(sep)) + sep
+                for line in wrapped[1:]:
+                    yield indent + line
+
+    def print(self, file=None):
+        if file is None:
+            file = sys.stdout
+        file.write(''.join(line + '\n' for line in self.lines()))
+
+
+# vsep_print(linesplit, arg1, width1, arg2, width2, ... argN)
+def vsep_print(linesplit=None, *vals):
+    args = list(vals)
     if not args:
         return None
 
-    while len(args) >= 2:
-        val = args.pop(0)
-        if not isinstance(val, str):
-            val = str(val)
-        fields.append(val)
-        widths.append(int(args.pop(0)))
-    fields.append(args.pop(0))
-
-    #       field widths+ separators
-    width = sum(widths) + (len(fields) - 1) * len(sep)
-    for idx in range(0, len(widths)):
-        print(fields[idx].ljust(widths[idx]) + sep, end='')
-        consumed += widths[idx] + len(sep)
-
-    last = fields.pop()
-    if not isinstance(last, str):
-        last = str(last)
-
-    if len(last) <= (screen_width - width):
-        print(last)
-        return
-
-    # Longer than remaining horizontal screen
-    if not linesplit:
-        print(last[:(screen_width - width - 2)] + '..')
-        return
-
-    max_chunk_len = screen_width - width
-    chunks = last.split(linesplit)
-    # Start on first line
-    newline = False
-    lsize = width - len(sep)
-    consumed = 0
-    while len(chunks):
-        chunk = chunks.pop(0)
-        while len(chunk):
-            if newline is True:
-                consumed = 0
-                print(' ' * lsize + sep, end='')
-            # Assume we'll get to the next line
-            newline = True
-            if len(chunk) > max_chunk_len:
-                # If we've started a line, start a very long
-                # max-chunk-len on new line
-                if consumed > 0:
-                    print()
-                    newline = True
-                    continue
-                print(chunk[:max_chunk_len])
-                newline = True
-                chunk = chunk[max_chunk_len:]
-                continue
-            if len(chunk) > (max_chunk_len - consumed):
-                # Start this chunk on new line
-                print()
-                newline = True
-                continue
-            # OK, we have space - print it
-            print(chunk, end='')
-            consumed += (len(chunk) + 1)
-            if consumed < (max_chunk_len - 1):
-                print(linesplit, end='')
-                newline = False
-            else:
-                print()
-                newline = True
-            # Next chunk
-            break
-    # If we terminate on the edge of the screen, we already
-    # print newline above, so just a check to avoid an erroneous
-    # newline in output
-    if consumed < max_chunk_len:
-        print()
+    table = Table([int(width) for width in args[1:-1:2]])
+    table.add(*args[0::2], linesplit=linesplit)
+    table.print()
@@ -1,30 +1,218 @@
 #!/usr/bin/python3
 
+import contextlib
 import copy
+import hashlib
 import os
+import re
+import sys
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
 from jira import JIRAError
 from jira.utils import json_loads
-from jira.resources import Issue
+from jira.resources import Issue, IssueType
 
+from trolly import jql
+from trolly.cache import DEFAULT_TTL, text_fields
 from trolly.decor import nym
 from trolly.jira_input import transmogrify_input
 
 
+# Fields needed by _simplify_issue_list() and the list printers; list,
+# search and search_issues ask JIRA for only these.
+_list_fields = ['summary', 'status', 'assignee', 'labels', 'updated']
+
+# The cache also keeps issue types, so that moves can find issues which
+# show where a status leads in their workflow
+_sync_fields = _list_fields + ['issuetype']
+
+# How many keys to look up per 'key in (...)' search
+_batch_len = 100
+
+_issue_key_re = re.compile(r'^[A-Z][A-Z0-9_]*-\d+$')
+
+# Cache key for metadata which belongs to the server, not a project
+_server_meta = '*'
+
+# Before answering from the local index: how recent (seconds) a sync
+# makes catching up unnecessary, and how long to wait on the server
+_catch_up_age = 60
+_catch_up_timeout = 5
+
+
+def _status_matches(status_id, name, status):
+    return name == status or nym(name) == status or str(status_id) == str(status)
+
+
+def iter_pages(fetch, start, total, step, concurrency=1):
+    # Retrieve the remaining pages of a paginated result, given the
+    # position after the first page and the reported total.  Pages are
+    # yielded in server order as soon as they (and those before them)
+    # arrive, with at most 'concurrency' requests in flight.
+    offsets = range(start, total, step)
+    if concurrency <= 1 or len(offsets) <= 1:
+        for offset in offsets:
+            yield fetch(offset)
+        return
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(offsets))) as pool:
+        pending = deque()
+        for offset in offsets:
+            pending.append(pool.submit(fetch, offset))
+            if len(pending) >= concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def fetch_pages(fetch, start, total, step, concurrency=1):
+    return list(iter_pages(fetch, start, total, step, concurrency))
+
+
+class IssueRecord(object):
+    # What the issue index keeps for issues we've only listed: just the
+    # fields in _list_fields, rather than an Issue with all its JSON.
+    # Strings which repeat across issues (statuses, users) are interned.
+    __slots__ = ('key', 'id', 'status_id', 'status', 'color', 'summary', 'assignee', 'labels', 'updated')
+
+    def __init__(self, raw):
+        fields = raw['fields']
+        status = fields['status']
+        assignee = fields.get('assignee')
+        self.key = raw['key']
+        self.id = raw['id']
+        self.status_id = sys.intern(status['id'])
+        self.status = sys.intern(status['name'])
+        self.color = status.get('statusCategory', {}).get('colorName')
+        self.summary = fields.get('summary')
+        # (name, key, email address) - whichever the user gives us
+        if assignee:
+            self.assignee = tuple(sys.intern(assignee.get(item) or '') for item in ('name', 'key', 'emailAddress'))
+        else:
+            self.assignee = None
+        self.labels = tuple(sys.intern(label) for label in fields['labels']) if 'labels' in fields else None
+        self.updated = fields.get('updated')
+
+    def simplified(self):
+        # Same shape as raw issue JSON, for the list printers
+        status = {'id': self.status_id, 'name': self.status}
+        if self.color:
+            status['statusCategory'] = {'colorName': self.color}
+        assignee = None
+        if self.assignee:
+            assignee = dict(zip(('name', 'key', 'emailAddress'), self.assignee))
+        val = {'id': self.id, 'key': self.key,
+               'fields': {'status': status, 'summary': self.summary, 'assignee': assignee, 'updated': self.updated}}
+        if self.labels is not None:
+            val['labels'] = list(self.labels)
+        return val
+
+
 class JiraProject(object):
-    def __init__(self, jira, project, closed_status=None, readonly=False, allow_code=False):
+    # Failures which mean we can't reach the server, where a stale local
+    # answer beats none; so do JIRAErrors which _offline() says are the
+    # server being unwell
+    _offline_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+    def __init__(self, jira, project, closed_status=None, readonly=False, allow_code=False, cache=None, concurrency=4):
         self.jira = jira
+        self.concurrency = concurrency
         self._ro = readonly
         self._config = None
+        self._cache = cache
         self._closed_status = closed_status
-        self._project = self.jira.project(project)
+        self._project = None
         self._user = None
+        self._missing_issues = set()
+        self._workflows = {}
         self._issue_types = None
+        self._metadata_time = time.monotonic()
         self.custom_fields = None
         self.project_name = project
         self.allow_code = allow_code
         self.refresh()
+        self._server_info()
+
+    def _meta(self, name, fetch, project=None):
+        # Metadata rarely changes, so keep it on disk (for a while) and
+        # only fetch it when it's actually needed.
+        if project is None:
+            project = self.project_name
+        if self._cache is not None:
+            value = self._cache.meta(project, name)
+            if value is not None:
+                return value
+        # If we've an old copy to fall back on, don't try too hard
+        stale = None
+        if self._cache is not None:
+            stale = self._cache.meta(project, name, expired=True)
+        try:
+            with self._quickly() if stale is not None else contextlib.nullcontext():
+                value = fetch()
+        except self._offline_errors + (JIRAError,) as e:
+            if stale is None or not self._offline(e):
+                raise
+            return stale
+        if self._cache is not None:
+            self._cache.set_meta(project, name, value)
+        return value
+
+    def _offline(self, error):
+        # Not when the server refused us (bad query, credentials, ...)
+        if isinstance(error, JIRAError):
+            return (error.status_code or 0) >= 500
+        return True
+
+    def _server_info(self):
+        # Normally done by JIRA() itself; it decides which APIs we get.
+        # DANGER DANGER - private stuff
+        if self.jira.deploymentType is not None:
+            return
+        info = self._meta('serverInfo', self.jira.server_info, _server_meta)
+        self.jira._version = tuple(info['versionNumbers'])
+        self.jira.deploymentType = info.get('deploymentType')
+
+    def _field_names(self):
+        # jira translates field names in searches through a map of every
+        # field on the server, which it would otherwise fetch every run.
+        # DANGER DANGER - private stuff
+        if self.jira._fields_cache_value:
+            return
+
+        def _fetch():
+            self.jira._update_fields_cache()
+            return self.jira._fields_cache_value
+
+        self.jira._fields_cache_value = self._meta('fieldNames', _fetch, _server_meta)
+
+    @property
+    def project(self):
+        if self._project is None:
+            self._project = self.jira.project(self.project_name)
+        return self._project
+
+    @property
+    def user(self):
+        if self._user is None:
+            # Get current user info and record it
+            url = self.jira._get_url('myself')
+            self._user = self._meta(self._myself_meta(), lambda: json_loads(self.jira._session.get(url)), _server_meta)
+        return self._user
+
+    def _myself_meta(self):
+        # Who we are depends on the credentials, not just the server, so
+        # the cache key includes a digest of them (never them as such)
+        # DANGER DANGER - private stuff
+        auth = getattr(self.jira._session, 'auth', None)
+        secret = getattr(auth, '_token', None) or repr(auth)
+        return 'myself/' + hashlib.sha256(secret.encode()).hexdigest()[:16]
 
+    @property
+    def closed_status(self):
         if self._closed_status is None:
             # guess at common closed states
             for status in ['CLOSED', 'DONE', 'RESOLVED']:
@@ -34,29 +222,58 @@ class JiraProject(object):
                     break
                 except KeyError:
                     pass
+        return self._closed_status
 
-    @property
-    def user(self):
-        if self._user is None:
-            # Get current user info and record it
-            url = self._project._get_url('myself')
-            self._user = json_loads(self.jira._session.get(url))
-        return self._user
-
-    def refresh(self):
+    def refresh(self, force=False):
         if not self._config:
             self._config = {'states': {},
                             'issue_map': {},
                             'issue_rev_map': {}}
 
-        self.refresh_lists()
+        # Statuses etc. are loaded on demand; forcing a refresh just means
+        # forgetting what we had.
+        if force:
+            if self._cache is not None:
+                # Issues too: the next sync fetches the whole project
+                self._cache.clear(self.project_name)
+                self._cache.forget_meta(_server_meta)
+            self.forget_issues()
+            self.forget_metadata()
         # self.index_issues()
 
-    def refresh_lists(self):
+    def forget_metadata(self):
+        # Drop metadata held in memory (statuses, issue types, workflows,
+        # ...), so it's read afresh - from the cache, if that's still
+        # fresh.
+        self._config['states'] = {}
+        self._issue_types = None
+        self._user = None
+        self._project = None
+        self._workflows = {}
+        # DANGER DANGER - private stuff
+        self.jira._fields_cache_value = {}
+        self._metadata_time = time.monotonic()
+
+    def expire_metadata(self):
+        # For long-lived processes: forget metadata once it's been held
+        # as long as the cache would have kept it
+        ttl = self._cache.ttl if self._cache is not None else DEFAULT_TTL
+        if time.monotonic() - self._metadata_time >= ttl:
+            self.forget_metadata()
+
+    @property
+    def _states(self):
+        if not self._config['states']:
+            self.refresh_lists()
+        return self._config['states']
+
+    def _fetch_statuses(self):
         # DANGER DANGER - using private stuff because upstream doesn't have it
-        spath = os.path.join(self._project._resource, 'statuses')
-        url = self._project._get_url(spath.format(str(self._project)))
-        status_info = json_loads(self.jira._session.get(url))
+        url = self.jira._get_url(f'project/{self.project_name}/statuses')
+        return json_loads(self.jira._session.get(url))
+
+    def refresh_lists(self):
+        status_info = self._meta('statuses', self._fetch_statuses)
         status_ids = []
         statuses = []
 
@@ -148,10 +365,10 @@ class JiraProject(object):
     def status_to_id(self, status):
         status = nym(status)
 
-        if status not in self._config['states']:
+        if status not in self._states:
             raise KeyError('No such list: ' + status)
-        if status in self._config['states']:
-            return self._config['states'][status]['id']
+        if status in self._states:
+            return self._states[status]['id']
         return status  # must be the ID
 
     def attach(self, issue_alias, url, description):
@@ -159,135 +376,628 @@ class JiraProject(object):
         issue = self.issue(issue_alias)
         return self.jira.add_simple_link(issue, item)
 
-    def _index_issue(self, issue):
-        if issue.raw['key'] not in self._config['issue_map']:
-            self._config['issue_map'][issue.raw['key']] = issue
-
-    def _index_issues(self, issues):
+    # partial: issue was retrieved with only a subset of its fields; only
+    # an IssueRecord is kept, and issue() fetches the whole thing.
+    def _index_issue(self, issue, partial=False):
+        key = issue.key if isinstance(issue, IssueRecord) else issue.raw['key']
+        if partial:
+            if key not in self._config['issue_map']:
+                if not isinstance(issue, IssueRecord):
+                    issue = IssueRecord(issue.raw)
+                self._config['issue_map'][key] = issue
+            return
+        self._config['issue_map'][key] = issue
+
+    def forget_issues(self):
+        # Drop issues held in memory (but not metadata), so they're read
+        # afresh; for long-lived processes.
+        self._config['issue_map'] = {}
+        self._missing_issues = set()
+
+    def _index_issues(self, issues, partial=False):
         if 'issue_map' not in self._config:
             self._config['issue_map'] = {}
 
         for issue in issues:
-            self._index_issue(issue)
+            self._index_issue(issue, partial)
 
-    def _search_issues(self, search_query):
-        index = 0
-        chunk_len = 50      # So we can detect end
-        ret = []
-        while True:
-            issues = self.jira.search_issues(search_query, startAt=index, maxResults=chunk_len)
-            if not len(issues):
-                break
-            self._index_issues(issues)
-            ret.extend(issues)
-            index = index + len(issues)
-            if len(issues) < chunk_len:
-                break
+    def _indexed(self, key):
+        # Full Issue for this key, if we have one
+        issue = self._config['issue_map'].get(key)
+        if isinstance(issue, Issue):
+            return issue
+        return None
+
+    def _search_issues(self, search_query, fields=None, validate=True):
+        ret = list(self.iter_search(search_query, fields, validate))
+        self._index_issues(ret, partial=(fields is not None and fields != '*all'))
         return ret
 
-    def index_issues(self, status=None):
+    def iter_search(self, search_query, fields=None, validate=True):
+        # Yields issues as each page arrives, so the first results can be
+        # shown right away and memory use stays bounded; _search_issues()
+        # collects (and indexes) them.
+        for page in self._iter_pages(search_query, fields, validate):
+            yield from page
+
+    def _iter_pages(self, search_query, fields=None, validate=True):
+        chunk_len = 50
+        if fields is None:
+            fields = '*all'
+
+        self._field_names()
+
+        def _fetch(start):
+            return self.jira.search_issues(search_query, startAt=start, maxResults=chunk_len, fields=fields,
+                                           validate_query=validate)
+
+        # The first page tells us how many there are; the server may also
+        # have capped our page size, so step by whatever it gave us.
+        issues = _fetch(0)
+        yield issues
+        if len(issues):
+            yield from iter_pages(_fetch, len(issues), issues.total, len(issues), self.concurrency)
+
+    def _issue_from_raw(self, raw):
+        return Issue(self.jira._options, self.jira._session, raw=raw)
+
+    def _sync_query(self, now, full=False):
+        # Pull in everything touched since the last sync.  Relative dates
+        # keep us independent of the server's (and the user's) timezone;
+        # JQL only has minute granularity, so add some slack.
+        last_sync = self._cache.last_sync(self.project_name)
+        if last_sync is None or full:
+            return f'PROJECT = {self.project_name} AND STATUS != {self.closed_status}'
+        minutes = int((now - last_sync) // 60) + 2
+        return f'PROJECT = {self.project_name} AND updated >= -{minutes}m'
+
+    def _store_synced(self, issues, now, full=False):
+        # A full sync replaces what we had, dropping issues which have
+        # since been deleted or moved out of the project
+        self._cache.store_issues(self.project_name, [issue.raw for issue in issues], replace=full)
+        self._cache.set_last_sync(self.project_name, now, full=full)
+
+    def _sync_fields(self):
+        if self._cache.fts:
+            return _sync_fields + text_fields
+        return _sync_fields
+
+    def _sync_issues(self):
+        now = time.time()
+        full = self._cache.need_full_sync(self.project_name, now)
+        self._store_synced(self._search_issues(self._sync_query(now, full), self._sync_fields()), now, full)
+
+    def _iter_sync_issues(self):
+        # Like _sync_issues(), but yields each issue as soon as its page
+        # is stored, so a cold cache needn't hold up the first results.
+        # A full sync drops the issues it didn't see once it's done.
+        now = time.time()
+        full = self._cache.need_full_sync(self.project_name, now)
+        keys = []
+        for page in self._iter_pages(self._sync_query(now, full), self._sync_fields()):
+            raws = [issue.raw for issue in page]
+            self._cache.store_issues(self.project_name, raws)
+            keys.extend(raw['key'] for raw in raws)
+            yield from raws
+        if full:
+            self._cache.retain_issues(self.project_name, keys)
+        self._cache.set_last_sync(self.project_name, now, full=full)
+
+    def _iter_cached_issues(self, status=None):
+        return self._iter_open_issues(self._cache.issues(self.project_name), status)
+
+    def _iter_open_issues(self, raws, status=None):
+        # IssueRecords for those in the given status, or not closed
         if status:
             status_id = self.status_to_id(status)
-            open_issues = self._search_issues(f'PROJECT = {self.project_name} AND STATUS = {status_id}')
         else:
-            open_issues = self._search_issues(f'PROJECT = {self.project_name} AND STATUS != {self._closed_status}')
-        self._index_issues(open_issues)
-        return open_issues
+            closed_id = self.status_to_id(self.closed_status)
+
+        for raw in raws:
+            issue_status = raw['fields']['status']['id']
+            if status and issue_status != status_id:
+                continue
+            if not status and issue_status == closed_id:
+                continue
+            yield IssueRecord(raw)
+
+    def _cached_issues(self, status=None):
+        return list(self._iter_cached_issues(status))
+
+    def _list_query(self, status=None, userid=None):
+        query = [f'PROJECT = {self.project_name}']
+        if status:
+            query.append(f'STATUS = {self.status_to_id(status)}')
+        else:
+            query.append(f'STATUS != {self.closed_status}')
+        if userid == 'me':
+            query.append('assignee = currentUser()')
+        elif userid == 'none':  # Special keyword for unassigned
+            query.append('assignee is EMPTY')
+        elif userid is not None:
+            # JIRA refuses users it doesn't know; anyone we can't pin
+            # down is left to _simplify_issue() to match instead
+            name = self._resolve_assignee(userid)
+            if name is not None:
+                query.append(f'assignee = "{name}"')
+        return ' AND '.join(query)
+
+    def _resolve_assignee(self, userid):
+        # The user name for a name, key, email address or the part of
+        # one before the '@' (as _simplify_issue() accepts); None unless
+        # exactly one user matches.
+        try:
+            users = self.search_users(userid)
+        except JIRAError:
+            return None
+        names = set()
+        for user in users:
+            email = user.raw.get('emailAddress') or ''
+            if userid in (user.raw.get('name'), user.raw.get('key'), email) or email.startswith(userid + '@'):
+                names.add(user.raw.get('name'))
+        if len(names) != 1:
+            return None
+        return names.pop()
+
+    def index_issues(self, status=None):
+        if self._cache is not None:
+            self._sync_issues()
+            open_issues = self._cached_issues(status)
+            self._index_issues(open_issues, partial=True)
+            return open_issues
+        return self._search_issues(self._list_query(status), _list_fields)
+
+    def _simplify_issue(self, record, userid=None):
+        if userid is not None:
+            if userid != 'none':  # Special keyword for unassigned
+                if not record.assignee:
+                    return None
+                # Accept name, key, or email address transparently
+                if userid not in record.assignee:
+                    # last ditch effort: search email address field
+                    if '@' in userid:
+                        return None
+                    if not record.assignee[2].startswith(userid + '@'):
+                        return None
+            else:
+                if record.assignee:
+                    return None
+        return record.simplified()
 
     def _simplify_issue_list(self, issues, userid=None):
         ret = {}
+        for key, val in self._iter_simplified(issues, userid):
+            ret[key] = val
+        return ret
 
+    def _iter_simplified(self, issues, userid=None):
         for issue in issues:
-            issue_info = issue.raw['fields']
-            if userid is not None:
-                if userid != 'none':  # Special keyword for unassigned
-                    if 'assignee' not in issue_info or not issue_info['assignee']:
-                        continue
-                    # Accept name, key, or email address transparently
-                    user = [issue_info['assignee']['name'],
-                            issue_info['assignee']['key'],
-                            issue_info['assignee']['emailAddress']]
-                    if userid not in user:
-                        # last ditch effort: search email address field
-                        if '@' in userid:
-                            continue
-                        if not issue_info['assignee']['emailAddress'].startswith(userid + '@'):
-                            continue
-                else:
-                    if 'assignee' in issue_info and issue_info['assignee']:
-                        continue
-
-            val = {}
-            val['id'] = issue.raw['id']
-            val['key'] = issue.raw['key']
-            val['fields'] = {}
-            val['fields']['status'] = issue_info['status']
-            val['fields']['summary'] = issue_info['summary']
-            if 'labels' in issue_info:
-                val['labels'] = issue_info['labels']
-
-            ret[issue.raw['key']] = val
-        return ret
+            if not isinstance(issue, IssueRecord):
+                issue = IssueRecord(issue.raw)
+            val = self._simplify_issue(issue, userid)
+            if val is not None:
+                yield issue.key, val
 
-    def search(self, text):
+    def search(self, text, remote=False):
         if not text:
             return None
-        ret = self._search_issues(f'PROJECT = {self.project_name} AND STATUS != {self._closed_status} AND (text ~ "{text}")')
+        if self._local_search(remote):
+            return self._simplify_issue_list(self._indexed_search(text))
+        ret = self._search_issues(self._search_text_query(text), _list_fields)
         return self._simplify_issue_list(ret)
 
+    def _local_search(self, remote=False):
+        return not remote and self._cache is not None and self._cache.fts
+
+    def _quickly(self):
+        # Don't retry or wait long on the server for the duration
+        adapter = self.jira._session.get_adapter(self.jira._options['server'])
+        if hasattr(adapter, 'quick'):
+            return adapter.quick(_catch_up_timeout)
+        return contextlib.nullcontext()
+
+    def _indexed_search(self, text):
+        # Answer a text search from the local index, ranked.  Catch up
+        # first if we haven't lately, but a stale answer beats none (or
+        # a long wait) when offline.  With no index yet, there's nothing
+        # to fall back on.
+        closed_id = self.status_to_id(self.closed_status)
+        last_sync = self._cache.last_sync(self.project_name)
+        if last_sync is None:
+            self._sync_issues()
+        elif time.time() - last_sync >= _catch_up_age:
+            try:
+                with self._quickly():
+                    self._sync_issues()
+            except self._offline_errors + (JIRAError,) as e:
+                if not self._offline(e):
+                    raise
+        for raw in self._cache.search(self.project_name, text):
+            if raw['fields']['status']['id'] != closed_id:
+                yield IssueRecord(raw)
+
+    def _search_text_query(self, text):
+        return f'PROJECT = {self.project_name} AND STATUS != {self.closed_status} AND (text ~ "{text}")'
+
+    # Streaming versions of search(), search_issues() and list(); these
+    # yield (key, simplified issue) pairs as results come in.
+    def iter_text_search(self, text, remote=False):
+        if not text:
+            return iter(())
+        if self._local_search(remote):
+            return self._iter_simplified(self._indexed_search(text))
+        return self._iter_simplified(self.iter_search(self._search_text_query(text), _list_fields))
+
+    def iter_search_issues(self, text, remote=False):
+        if not text:
+            return iter(())
+        records = None
+        if not remote:
+            records = self._jql_records(text)
+        if records is not None:
+            return self._iter_simplified(records)
+        return self._iter_simplified(self.iter_search(text, _list_fields))
+
+    def iter_list(self, status=None, userid=None):
+        if self._cache is not None:
+            if userid == 'me':
+                userid = self.user['name']
+            if self._cache.need_full_sync(self.project_name):
+                # Show them as they're downloaded
+                return self._iter_simplified(self._iter_open_issues(self._iter_sync_issues(), status), userid)
+            self._sync_issues()
+            return self._iter_simplified(self._iter_cached_issues(status), userid)
+        issues = self.iter_search(self._list_query(status, userid), _list_fields)
+        return self._iter_simplified(issues, None if userid == 'me' else userid)
+
     def list(self, status=None, userid=None):
-        if userid == 'me':
-            userid = self.user['name']
-        issues = self.index_issues(status)
-        return self._simplify_issue_list(issues, userid)
+        # With a warm cache, filtering locally is cheaper than any query
+        if self._cache is not None:
+            if userid == 'me':
+                userid = self.user['name']
+            issues = self.index_issues(status)
+            return self._simplify_issue_list(issues, userid)
+        issues = self._search_issues(self._list_query(status, userid), _list_fields)
+        return self._simplify_issue_list(issues, None if userid == 'me' else userid)
+
+    # issue(), transitions() and _transition() are written as generators
+    # so that both backends share them: each yields (method, url, data)
+    # for every request it needs and is sent the decoded response (or
+    # thrown the JIRAError).  _run_steps() makes the requests here;
+    # AsyncJiraProject has its own.
+    def _request(self, method, url, data=None):
+        if data is None:
+            return json_loads(self.jira._session.request(method, url))
+        return json_loads(self.jira._session.request(method, url, data=data))
+
+    def _run_steps(self, steps):
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    response = self._request(*request)
+                except JIRAError as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(response)
+        except StopIteration as e:
+            return e.value
 
-    def issue(self, issue_alias, verbose=False):
-        if isinstance(issue_alias, Issue):
+    def _issue_steps(self, issue_alias):
+        if issue_alias is None or isinstance(issue_alias, Issue):
             return issue_alias
-        issue_aliases = [issue_alias]
-        if issue_alias.upper() != issue_alias:
-            issue_aliases.append(issue_alias.upper())
-        if '-' not in issue_alias:
-            issue_aliases.append(self.project_name.upper() + f'-{issue_alias}')
-        for alias in issue_aliases:
-            if alias in self._config['issue_map']:
-                return self._config['issue_map'][alias]
-            try:
-                issue = self.jira.issue(alias)
-                if not issue:
-                    continue
-                self._index_issue(issue)
-                return issue
-            except JIRAError:
-                pass
-        return None
+        if isinstance(issue_alias, IssueRecord):
+            issue_alias = issue_alias.key
+        key = self._issue_key(issue_alias)
+        if key is None:
+            return None
+        issue = self._indexed(key)
+        if issue is not None:
+            return issue
+        if self._is_missing(key):
+            return None
+        try:
+            raw = yield ('GET', self.jira._get_url(f'issue/{key}'), None)
+        except JIRAError as e:
+            if e.status_code == 404:
+                self._set_missing(key)
+            return None
+        issue = self._issue_from_raw(raw)
+        if issue.raw['key'] != key:
+            # Moved; it's no longer here under the old key
+            self._forget_issue(key)
+        self._index_issue(issue)
+        return issue
 
-    def search_issues(self, text):
+    def issue(self, issue_alias, verbose=False):
+        return self._run_steps(self._issue_steps(issue_alias))
+
+    def _issue_key(self, issue_alias):
+        # Turn 'proj-12', '12' etc. into a canonical 'PROJ-12' without
+        # asking the server; None if it can't possibly be an issue key.
+        key = str(issue_alias).strip().upper()
+        if key.isdigit():
+            key = self.project_name.upper() + f'-{key}'
+        if not _issue_key_re.match(key):
+            return None
+        return key
+
+    def _is_missing(self, key):
+        if key in self._missing_issues:
+            return True
+        return self._cache is not None and self._cache.is_missing(key)
+
+    def _set_missing(self, key):
+        self._missing_issues.add(key)
+        self._forget_issue(key)
+        if self._cache is not None:
+            self._cache.set_missing(key)
+
+    def _forget_issue(self, key):
+        self._config['issue_map'].pop(key, None)
+        if self._cache is not None:
+            self._cache.forget_issue(key)
+
+    def _issue_keys(self, issue_aliases):
+        # Canonical keys (Issues are passed through) for issues(), and
+        # the 'key in (...)' searches which fetch those we don't have
+        keys = [alias if isinstance(alias, Issue) else self._issue_key(getattr(alias, 'key', alias)) for alias in issue_aliases]
+        wanted = [key for key in dict.fromkeys(keys)
+                  if isinstance(key, str) and not self._indexed(key) and not self._is_missing(key)]
+        queries = [f'key in ({", ".join(wanted[start:start + _batch_len])})' for start in range(0, len(wanted), _batch_len)]
+        return keys, queries
+
+    def issues(self, issue_aliases):
+        # Resolve many issues at once: everything not already indexed is
+        # fetched with one 'key in (...)' search per batch instead of up
+        # to three GETs per issue.  Returns issues in the order given,
+        # with None for any we couldn't find.
+        keys, queries = self._issue_keys(issue_aliases)
+        for query in queries:
+            # Don't fail the whole batch because one key doesn't exist
+            self._search_issues(query, validate=False)
+
+        # Moved issues come back under a different key; issue() sorts
+        # those out and remembers ones which don't exist
+        return [self.issue(key) for key in keys]
+
+    def search_issues(self, text, remote=False):
         if not text:
             return None
-        ret = self._search_issues(text)
+        ret = None
+        if not remote:
+            ret = self._jql_records(text)
+        if ret is None:
+            ret = self._search_issues(text, _list_fields)
         return self._simplify_issue_list(ret)
 
-    def transitions(self, issue):
-        if isinstance(issue, str):
-            issue = self.issue(issue)
+    def _status_id(self, status):
+        # Like status_to_id(), but accepts IDs and returns None for
+        # statuses this project doesn't have
+        for state in self._states.values():
+            if str(status) == state['id'] or nym(status) == nym(state['name']):
+                return state['id']
+        return None
+
+    def _known_user(self, name):
+        # The current user, or someone with issues in the cache; anyone
+        # else might not exist, and only the server can say
+        if name.lower() == self.user['name'].lower():
+            return True
+        condition, params = jql.assignee_sql([name])
+        return next(self._cache.query(self.project_name, condition, params, jql.order_sql([])), None) is not None
+
+    def _jql_covered(self, tree):
+        # The cache holds every issue in the project which isn't closed,
+        # (and some which are), so only queries restricted to those can be
+        # answered from it.
+        closed_id = self.status_to_id(self.closed_status)
+        project = False
+        status = False
+        for clause in jql.conjuncts(tree):
+            if clause[0] != 'clause':
+                continue
+            field, op, value = clause[1:]
+            values = value if isinstance(value, list) else [value]
+            if not all(isinstance(item, str) for item in values):
+                continue
+            if field == 'project' and op in ('=', 'in'):
+                project = all(item.upper() == self.project_name.upper() for item in values)
+            elif field == 'status':
+                ids = [self._status_id(item) for item in values]
+                if op in ('=', 'in') and closed_id not in ids:
+                    status = True
+                elif op in ('!=', 'not in') and closed_id in ids:
+                    status = True
+        return project and status
+
+    def _jql_records(self, text):
+        # Answer a JQL query from the cache, if it's simple enough and
+        # within what the cache holds; None otherwise.
+        if self._cache is None:
+            return None
+        # Until it's synced, the query alone is less to download than
+        # the whole project
+        if self._cache.need_full_sync(self.project_name):
+            return None
+        try:
+            tree, order = jql.parse(text)
+            if not self._jql_covered(tree):
+                return None
+            ctx = jql.SQLContext(self.project_name, self._status_id, lambda: self.user['name'], self._cache.fts,
+                                 self._known_user)
+            condition, params = jql.to_sql(ctx, tree)
+            order = jql.order_sql(order)
+        except jql.JQLError:
+            return None
+        self._sync_issues()
+        return (IssueRecord(raw) for raw in self._cache.query(self.project_name, condition, params, order))
+
+    def _workflow(self, issue_type):
+        # {status_id: {to_status_id: {'id': transition_id, 'name': name}}}
+        if issue_type not in self._workflows:
+            if self._cache is not None:
+                self._workflows[issue_type] = self._cache.transition_graph(self.project_name, issue_type)
+            else:
+                self._workflows[issue_type] = {}
+        return self._workflows[issue_type]
+
+    def _forget_transitions(self, issue_type, status_id):
+        self._workflow(issue_type).pop(status_id, None)
+        if self._cache is not None:
+            self._cache.forget_transitions(self.project_name, issue_type, status_id)
+
+    def _learn_transitions(self, issue, transitions):
+        # Transitions depend only on the issue type and current status,
+        # so they're cached per workflow node rather than per issue.
         # {'state': 'id', 'state2': 'id2' }
+        issue_type = issue.raw['fields']['issuetype']['id']
+        status_id = issue.raw['fields']['status']['id']
         possible = {}
-        url = os.path.join(issue.raw['self'], 'transitions')
-        transitions = json_loads(self.jira._session.get(url))
         for transition in transitions['transitions']:
             possible[transition['to']['id']] = {'id': transition['id'], 'name': transition['to']['name']}
+        self._workflow(issue_type)[status_id] = possible
+        if self._cache is not None:
+            self._cache.store_transitions(self.project_name, issue_type, status_id, possible)
+
+    def _node(self, issue):
+        # Where an issue is in its workflow
+        return issue.raw['fields']['issuetype']['id'], issue.raw['fields']['status']['id']
+
+    def _known_transitions(self, issue):
+        workflow = self._workflow(issue.raw['fields']['issuetype']['id'])
+        return workflow.get(issue.raw['fields']['status']['id'])
+
+    def _transitions_steps(self, issue):
+        if isinstance(issue, str):
+            issue = yield from self._issue_steps(issue)
+        if self._known_transitions(issue) is None:
+            self._learn_transitions(issue, (yield ('GET', os.path.join(issue.raw['self'], 'transitions'), None)))
+
+        possible = self._known_transitions(issue)
         if not possible:
             return None
-        return possible
+        return copy.copy(possible)
+
+    def transitions(self, issue):
+        return self._run_steps(self._transitions_steps(issue))
+
+    def _plan_transitions(self, issue, status):
+        # Shortest path through the known workflow graph from the issue's
+        # current status to the target: a list of (to_status_id, transition)
+        # hops, empty if already there, or None if we know of no way there.
+        # The issue's own transitions need to be known already.  Also
+        # returns the statuses we can get to but haven't seen the
+        # transitions of, since the way may lie through them.
+        workflow = self._workflow(issue.raw['fields']['issuetype']['id'])
+        current = issue.raw['fields']['status']
+        if _status_matches(current['id'], current['name'], status):
+            return [], []
+
+        paths = {current['id']: []}
+        queue = deque([current['id']])
+        unknown = []
+        while queue:
+            state_id = queue.popleft()
+            for to_id, info in workflow.get(state_id, {}).items():
+                if to_id in paths:
+                    continue
+                paths[to_id] = paths[state_id] + [(to_id, info)]
+                if _status_matches(to_id, info['name'], status):
+                    return paths[to_id], []
+                if to_id in workflow:
+                    queue.append(to_id)
+                else:
+                    unknown.append(to_id)
+        return None, unknown
 
     def _find_transition(self, issue, status):
-        transitions = self.transitions(issue)
-        for state_id in transitions:
-            if transitions[state_id]['name'] == status or nym(transitions[state_id]['name']) == status or str(state_id) == str(status):
-                return transitions[state_id]['id']
+        self.transitions(issue)
+        path, _ = self._plan_transitions(issue, status)
+        if not path:
+            return None
+        return path[0][1]['id']
+
+    def _node_issue(self, issue_type, status_id):
+        # Key of some issue of this type in this status (as far as we
+        # know), whose transitions show where that status leads
+        for key, issue in self._config['issue_map'].items():
+            if (isinstance(issue, Issue) and issue.raw['fields']['issuetype']['id'] == issue_type
+                    and issue.raw['fields']['status']['id'] == status_id):
+                return key
+        if self._cache is None:
+            return None
+        condition = ("json_extract(issues.data, '$.fields.issuetype.id') = ? AND "
+                     "json_extract(issues.data, '$.fields.status.id') = ?")
+        for raw in self._cache.query(self.project_name, condition, (issue_type, status_id), jql.order_sql([])):
+            return raw['key']
         return None
 
+    def _plan_steps(self, issue, status):
+        # Work out the whole way to the target before moving anything.
+        # Where the known workflow runs out, learn the statuses at its
+        # edge from other issues of the same type which are in them -
+        # only ever reading.  None if there's no way we can find.
+        yield from self._transitions_steps(issue)
+        issue_type = issue.raw['fields']['issuetype']['id']
+        if self._status_id(status) is None:
+            path, _ = self._plan_transitions(issue, status)
+            return path
+        tried = set()
+        while True:
+            path, unknown = self._plan_transitions(issue, status)
+            if path is not None:
+                return path
+            learned = False
+            for status_id in unknown:
+                if status_id in tried:
+                    continue
+                tried.add(status_id)
+                key = self._node_issue(issue_type, status_id)
+                if key is None:
+                    continue
+                # The status we had for it may be out of date, so this
+                # is learned for wherever it really is
+                try:
+                    raw = yield ('GET', self.jira._get_url(f'issue/{key}') + '?fields=status,issuetype&expand=transitions', None)
+                except JIRAError:
+                    continue
+                self._learn_transitions(self._issue_from_raw(raw), raw)
+                learned = True
+            if not learned:
+                return None
+
+    def _transition_steps(self, issue, status):
+        # Only sets off once the whole way there is known, so an issue
+        # isn't walked through statuses on the way to one it can't reach.
+        # True once it's there; False if there's no way, or if a hop
+        # failed twice, in which case it stays wherever it got to.
+        retried = False
+        while True:
+            path = yield from self._plan_steps(issue, status)
+            if path is None:
+                return False
+            try:
+                for to_id, transition in path:
+                    # POST /rest/api/2/issue/{issueIdOrKey}/transitions
+                    yield ('POST', os.path.join(issue.raw['self'], 'transitions'), {'transition': {'id': transition['id']}})
+                    issue.raw['fields']['status'] = {'id': to_id, 'name': transition['name']}
+                return True
+            except JIRAError:
+                # The workflow changed under us, or the transition is
+                # conditional; forget what we knew and plan again once.
+                if retried:
+                    return False
+                retried = True
+            self._forget_transitions(issue.raw['fields']['issuetype']['id'],
+                                     issue.raw['fields']['status']['id'])
+            raw = yield ('GET', self.jira._get_url(f'issue/{issue.raw["key"]}') + '?fields=status,issuetype', None)
+            issue.raw['fields']['status'] = raw['fields']['status']
+            issue.raw['fields']['issuetype'] = raw['fields']['issuetype']
+
+    def _transition(self, issue, status):
+        return self._run_steps(self._transition_steps(issue, status))
+
     def move(self, issue_aliases, status):
         if not isinstance(issue_aliases, list):
             issue_aliases = [issue_aliases]
@@ -295,8 +1005,7 @@ class JiraProject(object):
         fails = []
         moves = []
         issues = []
-        for idx in issue_aliases:
-            issue = self.issue(idx)
+        for idx, issue in zip(issue_aliases, self.issues(issue_aliases)):
             if not issue:
                 fails.append(idx)
                 continue
@@ -308,21 +1017,20 @@ class JiraProject(object):
 
         # Jira doesn't have a status you can update; you have to retrieve possible
         # transitions and satisfy those requirements. Each issue has its own transition map
-        # according to the issue type.
-        # Future improvements:
-        # * cache transitions (one set per issue type)
-        # * list
+        # according to the issue type.  We remember these per issue type and
+        # status, and walk several transitions if the target isn't one hop away.
         if fails:
             raise ValueError('No such issue(s): ' + str(fails))
-        for issue in issues:
-            transition = self._find_transition(issue, status)
-            if not transition:
-                continue
-
-            # POST /rest/api/2/issue/{issueIdOrKey}/transitions
-            url = os.path.join(issue.raw['self'], 'transitions')
-            self.jira._session.post(url, data={'transition': {'id': transition}})
-        return moves
+        moved = []
+        plans = {}
+        for idx, issue in zip(moves, issues):
+            # Issues of the same type in the same status go the same way
+            node = self._node(issue)
+            if node not in plans:
+                plans[node] = self._run_steps(self._plan_steps(issue, status))
+            if plans[node] is not None and self._transition(issue, status):
+                moved.append(idx)
+        return moved
 
     def link_types(self):
         return self.jira.issue_link_types()
@@ -365,7 +1073,7 @@ class JiraProject(object):
         return count
 
     def states(self):
-        return copy.copy(self._config['states'])
+        return copy.copy(self._states)
 
     def create(self, **args):
         # Structures for certain things need to be adjusted, because JIRA.
@@ -383,6 +1091,9 @@ class JiraProject(object):
 
         ret = self.jira.create_issue(**new_args)
         self._index_issue(ret)
+        self._missing_issues.discard(ret.raw['key'])
+        if self._cache is not None:
+            self._cache.forget_missing(ret.raw['key'])
         return ret
 
     def new(self, name, description=None, issue_type=None, parent=None):
@@ -419,10 +1130,37 @@ class JiraProject(object):
     @property
     def issue_types(self):
         if not self._issue_types:
-            self._issue_types = self._project.issueTypes
+            raw_types = self._meta('issueTypes', lambda: [itype.raw for itype in self.project.issueTypes])
+            self._issue_types = [IssueType(self.jira._options, self.jira._session, raw=raw) for raw in raw_types]
         return self._issue_types
 
-    # Returns a dict that JIRA should just give us.
+    def _fetch_createmeta(self, issue_type_id):
+        chunk_len = 50
+        path = f'issue/createmeta/{self.project_name}/issuetypes/{issue_type_id}'
+
+        def _fetch(start):
+            return self.jira._get_json(path, params={'startAt': start, 'maxResults': chunk_len})
+
+        page = _fetch(0)
+        fields = list(page['values'])
+        if page['isLast'] or not fields:
+            return fields
+        if 'total' in page:
+            step = len(page['values'])
+            for page in fetch_pages(_fetch, step, page['total'], step, self.concurrency):
+                fields.extend(page['values'])
+            return fields
+
+        # No total to go by; walk it
+        start = 0
+        while not page['isLast']:
+            start = start + len(page['values'])
+            page = _fetch(start)
+            fields.extend(page['values'])
+        return fields
+
+    # Returns a dict that JIRA should just give us.  Field data is kept
+    # in the cache, since it's needed for every create.
     def issue_metadata(self, issue_type_or_id):
         itype = None
         for issuetype in self.issue_types:
@@ -432,17 +1170,7 @@ class JiraProject(object):
             return None
 
         issue_type_id = itype.id
-        fields = []
-        start = 0
-        chunk_len = 50
-        while True:
-            data = {'startAt': start, 'maxResults': chunk_len}
-            new_fields = self.jira._get_json(f'issue/createmeta/{self.project_name}/issuetypes/{issue_type_id}', params=data)
-            fields.extend(new_fields['values'])
-            if new_fields['isLast']:
-                break
-            start = start + chunk_len
-
+        fields = self._meta(f'createmeta/{issue_type_id}', lambda: self._fetch_createmeta(issue_type_id))
         field_dict = {val['fieldId']: val for val in fields}
         metadata = {'self': itype.self, 'name': itype.name, 'id': itype.id, 'description': itype.description, 'subtask': itype.subtask, 'iconUrl': itype.iconUrl, 'fields': field_dict}
         return metadata
@@ -4,17 +4,13 @@ import copy
 import os
 import sys
 
-import editor
-
-from jira import JIRA
-from jira.exceptions import JIRAError
-
+from trolly import daemon, output, profiling, trace
 from trolly.args import ComplicatedArgs, GenericArgs
-from trolly.jboard import JiraProject
-from trolly.decor import md_print, pretty_date, color_string, hbar_under, hbar_over, nym, vsep_print, vseparator
+from trolly.cache import JiraCache
+from trolly.decor import editor, md_print, pretty_date, color_string, hbar_under, hbar_over, nym, Table
 from trolly.decor import pretty_print  # NOQA
 from trolly.config import get_config
-from trolly.jira_fields import apply_field_renderers, render_issue_fields, max_field_width
+from trolly.jira_fields import apply_field_renderers, render_issue_fields
 
 
 def move(args):
@@ -22,9 +18,26 @@ def move(args):
         args.project.assign(args.src, args.user)
     if args.mine:
         args.project.assign(args.src, 'me')
-    if args.project.move(args.src, args.target):
-        print('Moved', args.src, 'to', args.target)
+    # Where they were, so we can tell if one only got partway
+    before = {}
+    for idx, issue in zip(args.src, args.project.issues(args.src)):
+        if issue:
+            before[idx] = issue.raw['fields']['status']['name']
+    moved = args.project.move(args.src, args.target)
+    if moved:
+        print('Moved', moved, 'to', args.target)
+    stuck = [idx for idx in args.src if idx not in moved]
+    if not stuck:
         return (0, False)
+    untouched = []
+    for idx in stuck:
+        status = args.project.issue(idx).raw['fields']['status']['name']
+        if status != before[idx]:
+            print(f'Could not move {idx} to {args.target}; it was left in {status}')
+        else:
+            untouched.append(idx)
+    if untouched:
+        print('No way to move', untouched, 'to', args.target)
     return (1, False)
 
 
@@ -45,8 +58,6 @@ def print_issues_simple(issues, args=None):
         states[cstatus].append(issue)
 
     for key in states:
-        if args and args.status and nym(key) != nym(args.status):
-            continue
         hbar_under(key)
         for issue in states[key]:
             print('  ', issue, end=' ')
@@ -56,20 +67,79 @@ def print_issues_simple(issues, args=None):
         print()
 
 
+def print_issues_stream(issues, args=None):
+    # Print (key, issue) pairs as they arrive.  There's no grouping by
+    # status, since that would mean waiting for all of them.
+    count = 0
+    for key, issue in issues:
+        status = issue['fields']['status']
+        print('  ', key, color_string(status['name'], status.get('statusCategory', {}).get('colorName')), end=' ')
+        if args and args.labels:
+            print_labels(issue, prefix='')
+        print(issue['fields']['summary'], flush=True)
+        count = count + 1
+    return count
+
+
+# Columns for --format
+_list_columns = ['key', 'status', 'assignee', 'summary', 'labels', 'updated']
+_issue_columns = ['key', 'id', 'type', 'status', 'priority', 'assignee', 'reporter', 'created', 'updated',
+                  'labels', 'summary', 'url', 'description', 'comments']
+
+
+def _user_name(user):
+    if not user:
+        return None
+    return user.get('name') or user.get('emailAddress')
+
+
+def issue_list_records(issues):
+    # (key, simplified issue) pairs -> --format records
+    for key, issue in issues:
+        fields = issue['fields']
+        yield {'key': key,
+               'status': fields['status']['name'],
+               'assignee': _user_name(fields.get('assignee')),
+               'summary': fields['summary'],
+               'labels': issue.get('labels', []),
+               'updated': fields.get('updated')}
+
+
+def issue_record(issue_obj, no_comments=False):
+    issue = issue_obj.raw['fields']
+    ret = {'key': issue_obj.raw['key'],
+           'id': issue_obj.raw['id'],
+           'type': issue['issuetype']['name'],
+           'status': issue['status']['name'],
+           'priority': (issue.get('priority') or {}).get('name'),
+           'assignee': _user_name(issue.get('assignee')),
+           'reporter': _user_name(issue.get('reporter')),
+           'created': issue.get('created'),
+           'updated': issue.get('updated'),
+           'labels': issue.get('labels', []),
+           'summary': issue['summary'],
+           'url': issue_obj.permalink(),
+           'description': issue.get('description')}
+    if not no_comments:
+        ret['comments'] = [{'id': cmt['id'],
+                            'author': _user_name(cmt.get('updateAuthor')),
+                            'updated': cmt['updated'],
+                            'body': cmt['body']} for cmt in issue['comment']['comments']]
+    return ret
+
+
 def print_users(users):
-    nsize = len('Name')
-    ksize = len('User Name')
+    table = Table([len('Name'), len('User Name')])
     msize = len('Email Address')
 
     for user in users:
-        nsize = max(nsize, len(user.displayName))
-        ksize = max(ksize, len(user.name))
+        table.add(user.displayName, user.name, user.emailAddress)
         msize = max(msize, len(user.emailAddress))
 
+    nsize, ksize = table.widths
     header = 'Name'.ljust(nsize) + '   ' + 'User Name'.ljust(ksize) + '   ' + 'Email Address'.ljust(msize)
     hbar_under(header)
-    for user in users:
-        vsep_print(None, user.displayName, nsize, user.name, ksize, user.emailAddress)
+    table.print()
 
 
 def search_jira(args):
@@ -90,14 +160,30 @@ def search_jira(args):
             print(f'No search configured: {named}')
             return (1, False)
         search_query = searches[named]
-        ret = args.project.search_issues(search_query)
+        jql = True
     else:
         search_query = ' '.join(args.text)
-        if args.raw:
-            ret = args.project.search_issues(search_query)
+        jql = args.raw
+
+    if args.stream or args.format != 'text':
+        if jql:
+            results = args.project.iter_search_issues(search_query, remote=args.remote)
         else:
-            ret = args.project.search(search_query)
+            results = args.project.iter_text_search(search_query, remote=args.remote)
+        if args.format != 'text':
+            if not output.write_records(args.format, _list_columns, issue_list_records(results)):
+                return (127, False)
+            return (0, False)
+        count = print_issues_stream(results)
+        if not count:
+            return (127, False)
+        hbar_over(str(count) + ' result(s)')
+        return (0, False)
 
+    if jql:
+        ret = args.project.search_issues(search_query, remote=args.remote)
+    else:
+        ret = args.project.search(search_query, remote=args.remote)
     if not ret:
         return (127, False)
     print_issues_simple(ret)
@@ -116,7 +202,28 @@ def list_issues(args):
     else:
         userid = None
 
-    issues = args.project.list(userid=userid)
+    from jira.exceptions import JIRAError
+
+    # Checked up front; a KeyError from further in would be a bug
+    if args.status:
+        try:
+            args.project.status_to_id(args.status)
+        except KeyError as e:
+            print(e.args[0])
+            return (1, False)
+
+    try:
+        if args.format != 'text':
+            output.write_records(args.format, _list_columns,
+                                 issue_list_records(args.project.iter_list(status=args.status, userid=userid)))
+            return (0, True)
+        if args.stream:
+            print_issues_stream(args.project.iter_list(status=args.status, userid=userid), args)
+            return (0, True)
+        issues = args.project.list(status=args.status, userid=userid)
+    except JIRAError as e:
+        print(e.text)
+        return (1, False)
     print_issues_simple(issues, args)
     return (0, True)
 
@@ -176,12 +283,7 @@ def issue_fields(args):
         display = True
 
     if display:
-        nlen = 0
-        for field in fields:
-            if field.startswith('customfield_'):
-                nlen = max(nlen, len(nym(fields[field]['name'])))
-            else:
-                nlen = max(nlen, len(nym(field)))
+        table = Table()
         for field in fields:
             if field.startswith('customfield_'):
                 fname = nym(fields[field]['name'])
@@ -200,7 +302,8 @@ def issue_fields(args):
                     else:
                         values.append(val['id'])
                 fvalue = ', '.join(values)
-            vsep_print(' ', fname, nlen, fvalue)
+            table.add(fname, fvalue, linesplit=' ')
+        table.print()
         return (0, False)
 
     field = None
@@ -317,6 +420,8 @@ def create_issue(args):
         print('Incorrect number of arguments (not divisible by 2)')
         return (1, False)
 
+    from jira.exceptions import JIRAError
+
     try:
         metadata = args.project.issue_metadata(args.type)
     except JIRAError as e:
@@ -482,7 +587,7 @@ def comment(args):
 
 
 def refresh(args):
-    args.project.refresh()
+    args.project.refresh(True)
     args.project.index_issues()
     return (0, True)
 
@@ -515,23 +620,7 @@ def print_labels(issue, prefix='Labels: '):
 
 def print_issue_links(issue):
     hbar_under('Issue Links')
-    # pass 1: Get the lengths so we can draw separators
-    sep = f' {vseparator} '
-    lsize = 0
-    rsize = 0
-    for link in issue['issuelinks']:
-        if 'outwardIssue' in link:
-            text = link['type']['outward'] + ' ' + link['outwardIssue']['key']
-            status = link['outwardIssue']['fields']['status']['name']
-        elif 'inwardIssue' in link:
-            text = link['type']['inward'] + ' ' + link['inwardIssue']['key']
-            status = link['inwardIssue']['fields']['status']['name']
-
-        if len(text) > lsize:
-            lsize = len(text)
-        if len(status) > rsize:
-            rsize = len(status)
-    # pass 2: print the stuff
+    table = Table()
     for link in issue['issuelinks']:
         if 'outwardIssue' in link:
             text = link['type']['outward'] + ' ' + link['outwardIssue']['key']
@@ -541,31 +630,18 @@ def print_issue_links(issue):
             text = link['type']['inward'] + ' ' + link['inwardIssue']['key']
             status = link['inwardIssue']['fields']['status']
             desc = link['inwardIssue']['fields']['summary']
-        # color_string throws off length calculations
-        vsep_print(' ', text.ljust(lsize) + sep + color_string(status['name'].ljust(rsize), status['statusCategory']['colorName']), lsize + rsize + 3, desc)
+        table.add(text, color_string(status['name'], status['statusCategory']['colorName']), desc, linesplit=' ')
+    table.print()
     print()
 
 
 def print_remote_links(links):
     hbar_under('External Links')
 
-    # pass 1: Get the lengths so we can draw separators
-    lsize = 0
-    rsize = 0
-    for link in links:
-        text = link.raw['object']['title']
-        lid = str(link.raw['id'])
-        if len(lid) > lsize:
-            lsize = len(lid)
-        if len(text) > rsize:
-            rsize = len(text)
-    # pass 2: print the stuff
+    table = Table()
     for link in links:
-        # color_string throws off length calculations
-        text = link.raw['object']['title']
-        lid = str(link.raw['id'])
-        url = link.raw['object']['url']
-        vsep_print(' ', lid.ljust(lsize), lsize, text.ljust(rsize), rsize, url)
+        table.add(link.raw['id'], link.raw['object']['title'], link.raw['object']['url'], linesplit=' ')
+    table.print()
     print()
 
 
@@ -574,27 +650,13 @@ def _print_issue_list(header, issues):
     if not issues:
         return
     hbar_under(header)
-    # pass 1: Get the lengths so we can draw separators
-    sep = f' {vseparator} '
-    lsize = 0
-    rsize = 0
+    table = Table()
     for task in issues:
         if isinstance(task, str):
             task = issues[task]
-        task_key = task['key']
-        status = task['fields']['status']['name']
-        if len(task_key) > lsize:
-            lsize = len(task_key)
-        if len(status) > rsize:
-            rsize = len(status)
-    # pass 2: print the stuff
-    for task in issues:
-        if isinstance(task, str):
-            task = issues[task]
-        task_key = task['key']
         status = task['fields']['status']
-        # color_string throws off length calculations
-        vsep_print(' ', task_key.ljust(lsize) + sep + color_string(status['name'].ljust(rsize), status['statusCategory']['colorName']), lsize + rsize + 3, task['fields']['summary'])
+        table.add(task['key'], color_string(status['name'], status['statusCategory']['colorName']), task['fields']['summary'], linesplit=' ')
+    table.print()
     print()
 
 
@@ -604,20 +666,21 @@ def print_subtasks(issue):
 
 def print_issue(project, issue_obj, verbose=False, no_comments=False):
     issue = issue_obj.raw['fields']
-    lsize = max(len(issue_obj.raw['key']), max_field_width(issue, verbose, project.allow_code))
+    table = Table()
 
-    vsep_print(' ', issue_obj.raw['key'], lsize, issue['summary'])
-    render_issue_fields(issue, verbose, project.allow_code, lsize)
+    table.add(issue_obj.raw['key'], issue['summary'], linesplit=' ')
+    render_issue_fields(issue, verbose, project.allow_code, table)
 
     if verbose:
-        vsep_print(' ', 'ID', lsize, issue_obj.raw['id'])
-        vsep_print(None, 'URL', lsize, issue_obj.permalink())
+        table.add('ID', issue_obj.raw['id'], linesplit=' ')
+        table.add('URL', issue_obj.permalink())
         trans = project.transitions(issue_obj.raw['key'])
         if trans:
-            vsep_print(' ', 'Next States', lsize, [tr['name'] for tr in trans.values()])
+            table.add('Next States', [tr['name'] for tr in trans.values()], linesplit=' ')
         else:
-            vsep_print(None, 'Next States', lsize, 'No valid transitions; cannot alter status')
+            table.add('Next States', 'No valid transitions; cannot alter status')
 
+    table.print()
     print()
     if issue['description']:
         md_print(issue['description'])
@@ -649,14 +712,15 @@ def print_issue(project, issue_obj, verbose=False, no_comments=False):
 
 
 def cat(args):
-    issues = []
-    for issue_idx in args.issue_id:
-        issue = args.project.issue(issue_idx, True)
+    issues = args.project.issues(args.issue_id)
+    for issue_idx, issue in zip(args.issue_id, issues):
         if not issue:
             print('No such issue:', issue_idx)
             return (127, False)
-        issues.append(issue)
 
+    if args.format != 'text':
+        output.write_records(args.format, _issue_columns, (issue_record(issue, args.no_comments) for issue in issues))
+        return (0, False)
     for issue in issues:
         print_issue(args.project, issue, args.verbose, args.no_comments)
     return (0, False)
@@ -719,7 +783,7 @@ def user_info(args):
     return (0, False)
 
 
-def get_project(project=None):
+def get_project(project=None, refresh=False):
     config = get_config()
     allow_code = False
 
@@ -747,13 +811,44 @@ def get_project(project=None):
         # Not sure why I used an array here
         project = jconfig['default_project']
 
-    jira = JIRA(jconfig['url'], token_auth=jconfig['token'])
-    proj = JiraProject(jira, project, readonly=False, allow_code=allow_code)
+    # Local issue cache; on unless explicitly disabled
+    cache = None
+    if 'cache' not in jconfig or jconfig['cache'] is not False:
+        # Full-text search of cached issues, instead of asking JIRA
+        cache = JiraCache(jconfig['url'], fts=jconfig.get('search_index') is True)
+        if 'cache_ttl' in jconfig:
+            cache.ttl = int(jconfig['cache_ttl'])
+        if 'full_sync_ttl' in jconfig:
+            cache.full_sync_ttl = int(jconfig['full_sync_ttl'])
+
+    # Number of pages of search results to fetch in parallel
+    concurrency = 4
+    if 'concurrency' in jconfig:
+        concurrency = int(jconfig['concurrency'])
+
+    from jira import JIRA
+    from trolly.transport import Transport, http_settings, install
+
+    # Server info is cached along with the rest of the project metadata.
+    # Retries are done by our transport, not by jira's session.
+    transport = Transport(http_settings(config, concurrency))
+    jira = JIRA(jconfig['url'], token_auth=jconfig['token'], get_server_info=False, max_retries=0)
+    install(jira._session, transport)
+    if jconfig.get('backend') == 'async':
+        from trolly.ajboard import SyncJiraProject
+
+        proj = SyncJiraProject(jira, project, jconfig['token'], transport, readonly=False, allow_code=allow_code, cache=cache, concurrency=concurrency)
+    else:
+        from trolly.jboard import JiraProject
+
+        proj = JiraProject(jira, project, readonly=False, allow_code=allow_code, cache=cache, concurrency=concurrency)
+    if refresh:
+        proj.refresh(True)
     if 'searches' in jconfig:
         proj.set_user_data('searches', jconfig['searches'])
     if 'custom_fields' in jconfig:
         proj.custom_fields = copy.deepcopy(jconfig['custom_fields'])
-        apply_field_renderers(proj.custom_fields)
+    apply_field_renderers(proj.custom_fields, allow_code)
 
     return proj
 
@@ -762,6 +857,9 @@ def create_parser():
     parser = ComplicatedArgs()
 
     parser.add_argument('-p', '--project', help='Use this JIRA project instead of default', default=None, type=str.upper)
+    parser.add_argument('--refresh', action='store_true', help='Refresh cached project metadata (statuses, issue types, etc.) and issues')
+    trace.add_arguments(parser)
+    profiling.add_arguments(parser)
 
     cmd = parser.command('whoami', help='Display current user information', handler=user_info)
 
@@ -770,17 +868,23 @@ def create_parser():
     cmd.add_argument('-U', '--unassigned', action='store_true', help='Display only issues with no assignee.')
     cmd.add_argument('-u', '--user', help='Display only issues assigned to the specific user.')
     cmd.add_argument('-l', '--labels', action='store_true', help='Display issue labels.')
+    cmd.add_argument('-S', '--stream', action='store_true', help='Print issues as they arrive, ungrouped')
+    output.add_argument(cmd)
     cmd.add_argument('status', nargs='?', default=None, help='Restrict to issues in this state')
 
     cmd = parser.command('search', help='Search issue(s)/user(s) with matching text', handler=search_jira)
     cmd.add_argument('-u', '--user', help='Search for user(s) (max)')
     cmd.add_argument('-n', '--named-search', help='Perform preconfigured named search for issues')
     cmd.add_argument('-r', '--raw', action='store_true', help='Perform raw JQL query')
+    cmd.add_argument('-S', '--stream', action='store_true', help='Print results as they arrive, ungrouped')
+    cmd.add_argument('-R', '--remote', action='store_true', help='Always search on the server, never in the local cache')
+    output.add_argument(cmd)
     cmd.add_argument('text', nargs='*', help='Search text')
 
     cmd = parser.command('cat', help='Print issue(s)', handler=cat)
     cmd.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
     cmd.add_argument('-N', '--no-comments', action='store_true', default=False, help='Skip comments')
+    output.add_argument(cmd)
     cmd.add_argument('issue_id', nargs='+', help='Target issue(s)', type=str.upper)
 
     cmd = parser.command('view', help='Display issue in browser', handler=view_issue)
@@ -856,21 +960,65 @@ def create_parser():
     cmd = parser.command('close', help='Move issue(s) to closed/done/resolved', handler=close_issues)
     cmd.add_argument('target', nargs='+', help='Target issue(s)')
 
+    cmd = parser.command('daemon', help='Serve jolly commands from a background process (to speed them up)', handler=run_daemon)
+    cmd.add_argument('--stop', action='store_true', help='Stop the running daemon')
+
     return parser
 
 
+def run_daemon(args):
+    if args.stop:
+        if not daemon.stop():
+            print('Not running')
+            return (1, False)
+        return (0, False)
+
+    projects = {args.project.project_name: args.project}
+    default = args.project.project_name
+
+    def dispatch(argv):
+        parser = create_parser()
+        ns = parser.parse_args(args=argv)
+        if not daemon.can_serve(ns):
+            return None
+        name = ns.project or default
+        if name not in projects:
+            projects[name] = get_project(name)
+        project = projects[name]
+        if ns.refresh:
+            project.refresh(True)
+        # Metadata stays warm for as long as the cache would keep it, but
+        # issues may have changed since last time
+        project.expire_metadata()
+        project.forget_issues()
+        parser.add_arg('project', project)
+        rc = parser.finalize(ns)
+        if rc:
+            return rc[0]
+        return 0
+
+    return (daemon.serve(dispatch), False)
+
+
 def main():
+    # Let a running daemon do it, if it can
+    if os.environ.get('JOLLY_DAEMON', '1') != '0':
+        rc = daemon.forward(sys.argv[1:])
+        if rc is not None:
+            sys.exit(rc)
+
     parser = create_parser()
     ns = parser.parse_args()
+    trace.setup(ns)
 
     try:
-        project = get_project(ns.project)
+        project = get_project(ns.project, ns.refresh)
     except KeyError:
         sys.exit(1)
 
     # Pass this down in namespace to callbacks
     parser.add_arg('project', project)
-    rc = parser.finalize(ns)
+    rc = profiling.call(ns, parser.finalize, ns)
     if rc:
         ret = rc[0]
         save = rc[1]  # NOQA
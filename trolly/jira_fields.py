@@ -1,8 +1,9 @@
 #!/usr/bin/python3
 
 import re  # NOQA
+import sys
 from collections import OrderedDict
-from trolly.decor import pretty_date, color_string, vsep_print
+from trolly.decor import pretty_date, color_string, Table
 
 
 #
@@ -312,6 +313,14 @@ _ignore_fields = [
 
 _fields = None
 
+# _fields compiled, in the order they're displayed in:
+#   {field id: (field id, label, verbose only, renderer, code renderer or None)}
+# Renderers take (field, fields).  The code renderer runs the field's
+# precompiled 'code' snippet; it's only there if code was allowed when
+# the renderers were applied, and used instead of the other only if
+# code is allowed when rendering.
+_compiled = None
+
 
 def eval_custom_field(__code__, field, fields):
     # Proof of concept.
@@ -324,19 +333,85 @@ def eval_custom_field(__code__, field, fields):
 
     # field:    is your variable name for your dict
     # fields:   dict of fields indexed by id
-    # __code__: is inline in your config and can reference field
+    # __code__: is inline in your config and can reference field;
+    #           either the snippet or compile_custom_field()'s result
     if field is None or not field:
         return None
-    if '__code__' in __code__:
-        raise ValueError('Reserved keyword in code snippet')
+    if isinstance(__code__, str):
+        if '__code__' in __code__:
+            raise ValueError('Reserved keyword in code snippet')
+        __code__ = compile(__code__, '<code>', 'eval')
     try:
-        return eval(str(__code__))
+        return eval(__code__, globals(), {'field': field, 'fields': fields})
     except Exception as e:
         return str(e)
 
 
-# kinda slow but...
-def apply_field_renderers(custom_field_defs=None):
+def compile_custom_field(field_key, snippet):
+    # Code object for a snippet, so it's parsed once rather than for
+    # every issue; None (having said why) if it's unusable.
+    snippet = str(snippet)
+    try:
+        if '__code__' in snippet:
+            raise ValueError('Reserved keyword in code snippet')
+        return compile(snippet, f'<code for {field_key}>', 'eval')
+    except (SyntaxError, ValueError) as e:
+        print(f'Ignoring code for field {field_key}: {e}', file=sys.stderr)
+        return None
+
+
+def _constant(text):
+    def render(field, fields):
+        return text
+    return render
+
+
+def _as_string(field, fields):
+    return str(field)
+
+
+def _compile_field(field_key, field_config, allow_code):
+    # -> entry for _compiled, or None if the field is never shown
+    if field_config.get('disabled') is True:
+        return None
+
+    code = None
+    # display supersedes code
+    if 'display' in field_config:
+        r_info = field_config['display']
+        if isinstance(r_info, bool):
+            if not r_info:
+                return None
+            render = _as_string
+        elif isinstance(r_info, str):
+            if r_info not in _field_renderers:
+                render = _constant(f'<invalid renderer: {r_info} for {field_key}>')
+            else:
+                render = _field_renderers[r_info]
+        else:
+            render = r_info
+    else:
+        render = _as_string
+        if 'code' in field_config and allow_code:
+            snippet = compile_custom_field(field_key, field_config['code'])
+            if snippet is not None:
+                def code(field, fields):
+                    return eval_custom_field(snippet, field, fields)
+
+    return (field_key, field_config['name'], field_config.get('verbose') is True, render, code)
+
+
+def _compile_fields(allow_code):
+    global _compiled
+
+    _compiled = OrderedDict()
+    for field_key, field_config in _fields.items():
+        entry = _compile_field(field_key, field_config, allow_code)
+        if entry is not None:
+            _compiled[field_key] = entry
+
+
+def apply_field_renderers(custom_field_defs=None, allow_code=False):
     global _fields
     base_fields = OrderedDict()
     custom_fields = OrderedDict()
@@ -348,6 +423,7 @@ def apply_field_renderers(custom_field_defs=None):
                 continue
             ret[field['id']] = field
         _fields = ret
+        _compile_fields(allow_code)
         return
 
     # First go through base fields
@@ -377,67 +453,57 @@ def apply_field_renderers(custom_field_defs=None):
         ret[key] = custom_fields[key]
 
     _fields = ret
+    _compile_fields(allow_code)
+
+
+def _render(entry, field, fields, allow_code):
+    if entry[4] is not None and allow_code:
+        return entry[4](field, fields)
+    return entry[3](field, fields)
 
 
 def render_field_data(field_key, field, fields, verbose=False, allow_code=False):
-    if field_key not in _fields:
-        return None
+    if _compiled is None:
+        apply_field_renderers()
     if not field:
         return None
-    field_config = _fields[field_key]
-
-    if 'verbose' in field_config:
-        if field_config['verbose'] is True and not verbose:
-            return None
-    if 'disabled' in field_config and field_config['disabled'] is True:
+    entry = _compiled.get(field_key)
+    if entry is None or (entry[2] and not verbose):
         return None
-    # display supersedes code
-    if 'display' in field_config:
-        r_info = field_config['display']
-        if isinstance(r_info, bool):
-            return None if not r_info else str(field)
-        if isinstance(r_info, str):
-            if r_info not in _field_renderers:
-                return f'<invalid renderer: {r_info} for {field_key}>'
-            else:
-                return _field_renderers[r_info](field, fields)
-        else:
-            return r_info(field, fields)
-    if 'code' in field_config and allow_code:
-        return eval_custom_field(field_config['code'], field, fields)
-    return str(field)
+    return _render(entry, field, fields, allow_code)
 
 
 def field_ordering():
     return [_fields.keys()]
 
 
-def max_field_width(issue, verbose, allow_code):
-    width = 0
+def issue_field_rows(issue, verbose=False, allow_code=False):
+    # [(label, rendered value)] for the fields of an issue which are
+    # shown, each rendered once
+    if _compiled is None:
+        apply_field_renderers()
 
-    for field_key in _fields:
-        if field_key not in issue:
+    rows = []
+    for entry in _compiled.values():
+        if entry[2] and not verbose:
+            continue
+        field = issue.get(entry[0])
+        if not field:
             continue
-        field = issue[field_key]
-        val = render_field_data(field_key, field, issue, verbose, allow_code)
+        val = _render(entry, field, issue, allow_code)
         if not val:
             continue
-        width = max(width, len(_fields[field_key]['name']))
-    return width
+        rows.append((entry[1], val))
+    return rows
 
 
-def render_issue_fields(issue, verbose=False, allow_code=False, width=None):
-    global _fields
-
-    if not width:
-        width = max_field_width(issue, verbose, allow_code)
+def render_issue_fields(issue, verbose=False, allow_code=False, table=None):
+    # Printed here unless the caller has more rows to go with these
+    printing = table is None
+    if printing:
+        table = Table()
 
-    for field_key in _fields:
-        if field_key not in issue:
-            continue
-        field = issue[field_key]
-        val = render_field_data(field_key, field, issue, verbose, allow_code)
-        if not val:
-            continue
-        vsep_print(' ', _fields[field_key]['name'], width, val)
-        # print(_fields[field_key]['name'].ljust(width), sep, val)
+    for label, val in issue_field_rows(issue, verbose, allow_code):
+        table.add(label, val, linesplit=' ')
+    if printing:
+        table.print()
@@ -0,0 +1,329 @@
+#!/usr/bin/python3
+#
+# Just enough JQL to answer common searches from the local issue cache:
+#
+#   field (=|!=|~|!~) value, field [not] in (values), field is [not] EMPTY,
+#   AND, OR, NOT, parentheses, and ORDER BY.
+#
+# parse() turns a query into a tree of tuples; to_sql() turns that into
+# an SQL condition over the cache's issues table.  Anything else raises
+# JQLError, and the query goes to the server instead.
+
+import re
+
+from trolly.cache import fts_query
+
+
+class JQLError(ValueError):
+    pass
+
+
+_token_re = re.compile(r'''\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+   |(?P<op>!=|!~|>=|<=|=|~|>|<|\(|\)|,)
+   |(?P<word>[^\s"'(),=!~<>]+)
+)''', re.X)
+
+_keywords = ('and', 'or', 'not', 'in', 'is', 'empty', 'null', 'order', 'by', 'asc', 'desc')
+
+
+def tokenize(text):
+    # [(kind, value)], kind being 'string', 'op', 'word' or 'keyword'
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _token_re.match(text, pos)
+        if not match or match.end() == pos:
+            raise JQLError(f'Cannot parse JQL at: {text[pos:]}')
+        pos = match.end()
+        if match.group('string') is not None:
+            value = match.group('string')[1:-1]
+            tokens.append(('string', re.sub(r'\\(.)', r'\1', value)))
+        elif match.group('op') is not None:
+            tokens.append(('op', match.group('op')))
+        elif match.group('word').lower() in _keywords:
+            tokens.append(('keyword', match.group('word').lower()))
+        else:
+            tokens.append(('word', match.group('word')))
+    return tokens
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if kind is not None and token[0] != kind:
+            return None
+        if value is not None and token[1] != value:
+            return None
+        return token
+
+    def take(self, kind=None, value=None):
+        token = self.peek(kind, value)
+        if token is None:
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else 'end of query'
+            raise JQLError(f'Unexpected {found} in JQL')
+        self.pos = self.pos + 1
+        return token
+
+    def query(self):
+        tree = None
+        if not self.peek('keyword', 'order'):
+            tree = self.or_expr()
+        order = []
+        if self.peek('keyword', 'order'):
+            self.take()
+            self.take('keyword', 'by')
+            while True:
+                field = self.field()
+                direction = 'asc'
+                if self.peek('keyword', 'asc') or self.peek('keyword', 'desc'):
+                    direction = self.take()[1]
+                order.append((field, direction))
+                if not self.peek('op', ','):
+                    break
+                self.take()
+        if self.pos != len(self.tokens):
+            self.take('end')
+        return tree, order
+
+    def or_expr(self):
+        terms = [self.and_expr()]
+        while self.peek('keyword', 'or'):
+            self.take()
+            terms.append(self.and_expr())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def and_expr(self):
+        terms = [self.not_expr()]
+        while self.peek('keyword', 'and'):
+            self.take()
+            terms.append(self.not_expr())
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    def not_expr(self):
+        if self.peek('keyword', 'not'):
+            self.take()
+            return ('not', self.not_expr())
+        if self.peek('op', '('):
+            self.take()
+            tree = self.or_expr()
+            self.take('op', ')')
+            return tree
+        return self.clause()
+
+    def field(self):
+        token = self.peek()
+        if token is None or token[0] not in ('word', 'string'):
+            self.take('word')
+        self.take()
+        return token[1].lower()
+
+    def value(self):
+        token = self.peek()
+        if token is not None and token[0] == 'keyword' and token[1] in ('empty', 'null'):
+            self.take()
+            return None
+        if token is None or token[0] not in ('word', 'string'):
+            self.take('word')
+        self.take()
+        if token[0] == 'word' and self.peek('op', '('):
+            # Function call; only ones without arguments
+            self.take()
+            self.take('op', ')')
+            return ('func', token[1].lower())
+        return token[1]
+
+    def values(self):
+        self.take('op', '(')
+        ret = [self.value()]
+        while self.peek('op', ','):
+            self.take()
+            ret.append(self.value())
+        self.take('op', ')')
+        return ret
+
+    def clause(self):
+        field = self.field()
+        token = self.take()
+        if token == ('keyword', 'in'):
+            return ('clause', field, 'in', self.values())
+        if token == ('keyword', 'not'):
+            self.take('keyword', 'in')
+            return ('clause', field, 'not in', self.values())
+        if token == ('keyword', 'is'):
+            op = 'is'
+            if self.peek('keyword', 'not'):
+                self.take()
+                op = 'is not'
+            if self.value() is not None:
+                raise JQLError('Only EMPTY can follow IS')
+            return ('clause', field, op, None)
+        if token[0] == 'op' and token[1] in ('=', '!=', '~', '!~'):
+            return ('clause', field, token[1], self.value())
+        raise JQLError(f'Unsupported JQL operator: {token[1]}')
+
+
+def parse(text):
+    # -> (tree, [(field, 'asc'|'desc')]); tree is None if there's no
+    # condition at all
+    return _Parser(text).query()
+
+
+def conjuncts(tree):
+    if tree is None:
+        return []
+    if tree[0] == 'and':
+        return tree[1]
+    return [tree]
+
+
+_status = "json_extract(issues.data, '$.fields.status.id')"
+_assignee = ("lower(json_extract(issues.data, '$.fields.assignee.name'))",
+             "lower(json_extract(issues.data, '$.fields.assignee.key'))",
+             "lower(json_extract(issues.data, '$.fields.assignee.emailAddress'))")
+_labels = 'SELECT 1 FROM labels WHERE labels.project = issues.project AND labels.key = issues.key'
+
+_order_fields = {'key': 'CAST(issues.id AS INTEGER)',
+                 'issuekey': 'CAST(issues.id AS INTEGER)',
+                 'id': 'CAST(issues.id AS INTEGER)',
+                 'updated': 'issues.updated',
+                 'summary': "json_extract(issues.data, '$.fields.summary')",
+                 'status': "json_extract(issues.data, '$.fields.status.name')",
+                 'assignee': _assignee[0]}
+
+
+def _marks(values):
+    return ', '.join('?' * len(values))
+
+
+class SQLContext(object):
+    # What to_sql() needs to know about the project: its key, functions
+    # mapping a status name/id to its id (None if there's no such
+    # status) and returning the current user's name, and whether there's
+    # a full-text index.  known_user, if given, says whether a user name
+    # (key, email address) is one to accept; JIRA refuses queries naming
+    # statuses or users it doesn't have, so those raise JQLError.
+    def __init__(self, project, status_id, current_user, fts=False, known_user=None):
+        self.project = project
+        self.status_id = status_id
+        self.current_user = current_user
+        self.fts = fts
+        self.known_user = known_user
+
+
+def assignee_sql(values):
+    # Issues assigned to any of these user names, keys or email addresses
+    values = [item.lower() for item in values]
+    match = ' OR '.join(f'{expr} IN ({_marks(values)})' for expr in _assignee)
+    return f'({match})', values * len(_assignee)
+
+
+def _in_sql(op, expr, values):
+    # =, !=, in and not in, against one SQL expression
+    if not values:
+        return '0' if op in ('=', 'in') else '1', []
+    if op in ('=', 'in'):
+        return f'{expr} IN ({_marks(values)})', list(values)
+    return f'{expr} NOT IN ({_marks(values)})', list(values)
+
+
+def _clause_sql(ctx, field, op, value):
+    values = value if isinstance(value, list) else [value]
+    if op in ('is', 'is not') or (op in ('=', '!=') and value is None):
+        if field == 'assignee':
+            expr = "json_extract(issues.data, '$.fields.assignee') IS NULL"
+        elif field == 'labels':
+            expr = f'NOT EXISTS ({_labels})'
+        elif field in ('project', 'status', 'key', 'issuekey', 'summary'):
+            expr = '0'
+        else:
+            raise JQLError(f'Unsupported field: {field}')
+        if op in ('is not', '!='):
+            return f'NOT ({expr})', []
+        return expr, []
+
+    if op in ('~', '!~'):
+        if not ctx.fts or field not in ('summary', 'text') or not isinstance(value, str):
+            raise JQLError(f'Unsupported text search on {field}')
+        query = fts_query(value)
+        if field == 'summary':
+            query = f'summary : ({query})'
+        expr = 'CAST(issues.id AS INTEGER) IN (SELECT rowid FROM issue_text WHERE issue_text MATCH ?)'
+        if op == '!~':
+            expr = f'NOT ({expr})'
+        return expr, [query]
+
+    if any(isinstance(item, tuple) for item in values):
+        if field != 'assignee' or values != [('func', 'currentuser')]:
+            raise JQLError('Unsupported JQL function')
+    if None in values:
+        raise JQLError('EMPTY in a list is not supported')
+
+    if field == 'project':
+        match = any(item.upper() == ctx.project.upper() for item in values)
+        if op in ('=', 'in'):
+            return '1' if match else '0', []
+        return '0' if match else '1', []
+
+    if field == 'status':
+        ids = [ctx.status_id(item) for item in values]
+        for item, status_id in zip(values, ids):
+            if status_id is None:
+                raise JQLError(f'No such status: {item}')
+        return _in_sql(op, _status, ids)
+
+    if field in ('key', 'issuekey'):
+        return _in_sql(op, 'issues.key', [item.upper() for item in values])
+
+    if field == 'assignee':
+        if values == [('func', 'currentuser')]:
+            values = [ctx.current_user()]
+        elif ctx.known_user is not None:
+            for item in values:
+                if not ctx.known_user(item):
+                    raise JQLError(f'Unknown user: {item}')
+        match, params = assignee_sql(values)
+        if op in ('=', 'in'):
+            return match, params
+        # Like JIRA, != never matches unassigned issues
+        return f"(json_extract(issues.data, '$.fields.assignee') IS NOT NULL AND NOT {match})", params
+
+    if field == 'labels':
+        match = f'EXISTS ({_labels} AND labels.label IN ({_marks(values)}))'
+        if op in ('=', 'in'):
+            return match, list(values)
+        return f'(EXISTS ({_labels}) AND NOT {match})', list(values)
+
+    raise JQLError(f'Unsupported field: {field}')
+
+
+def to_sql(ctx, tree):
+    # -> (condition, params)
+    if tree is None:
+        return '1', []
+    if tree[0] in ('and', 'or'):
+        parts = [to_sql(ctx, item) for item in tree[1]]
+        joiner = ' AND ' if tree[0] == 'and' else ' OR '
+        return '(' + joiner.join(part[0] for part in parts) + ')', [param for part in parts for param in part[1]]
+    if tree[0] == 'not':
+        sql, params = to_sql(ctx, tree[1])
+        return f'NOT {sql}', params
+    return _clause_sql(ctx, tree[1], tree[2], tree[3])
+
+
+def order_sql(order):
+    if not order:
+        return 'CAST(issues.id AS INTEGER) DESC'
+    ret = []
+    for field, direction in order:
+        if field not in _order_fields:
+            raise JQLError(f'Unsupported ORDER BY field: {field}')
+        ret.append(f'{_order_fields[field]} {direction.upper()}')
+    return ', '.join(ret)
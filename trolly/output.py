@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+#
+# Machine-readable output (--format json|ndjson|tsv) for the listing
+# and display commands.  Records (flat dicts) are written out one at a
+# time as they're produced, without going anywhere near rich, colour
+# or terminal widths.
+#
+#   json:   one array of objects
+#   ndjson: one object per line
+#   tsv:    header line of column names, then one line per record;
+#           lists of strings are joined with ',', anything else
+#           structured is JSON, and tabs/newlines are escaped
+
+import json
+import os
+import sys
+
+
+formats = ('text', 'json', 'ndjson', 'tsv')
+
+_tsv_escapes = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def add_argument(cmd):
+    cmd.add_argument('--format', choices=formats, default='text',
+                     help='Output format; all but text are for scripts (default: text)')
+
+
+def _tsv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        value = ','.join(value)
+    elif isinstance(value, (list, dict)):
+        value = json.dumps(value)
+    elif not isinstance(value, str):
+        value = str(value)
+    return value.translate(_tsv_escapes)
+
+
+class RecordWriter(object):
+    def __init__(self, fmt, columns, file=None):
+        self.format = fmt
+        self.columns = columns
+        self.file = file if file is not None else sys.stdout
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record):
+        if self.format == 'ndjson':
+            line = json.dumps(record)
+        elif self.format == 'json':
+            line = ('[\n' if not self.count else ',\n') + json.dumps(record)
+        else:
+            line = '\t'.join(_tsv_value(record.get(column)) for column in self.columns)
+            if not self.count:
+                line = '\t'.join(self.columns) + '\n' + line
+        self.count = self.count + 1
+        self.file.write(line + ('' if self.format == 'json' else '\n'))
+
+    def close(self):
+        if self.format == 'json':
+            self.file.write('\n]\n' if self.count else '[]\n')
+        elif self.format == 'tsv' and not self.count:
+            self.file.write('\t'.join(self.columns) + '\n')
+        self.file.flush()
+
+
+def write_records(fmt, columns, records):
+    # Returns how many were written
+    out = RecordWriter(fmt, columns)
+    try:
+        for record in records:
+            out.write(record)
+        out.close()
+    except BrokenPipeError:
+        # Reader went away (e.g. | head); stop, and keep the interpreter
+        # from complaining when it flushes stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return out.count
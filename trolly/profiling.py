@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+#
+# --profile / --profile-file: run the command's handler under cProfile.
+# --profile prints to stderr how the time splits between rendering
+# output and waiting on the network, followed by the costliest
+# functions; --profile-file writes the raw stats for pstats/snakeviz.
+
+import sys
+
+from fnmatch import fnmatchcase
+
+
+# (file name, function name pattern) whose cumulative time counts
+# towards each category.  Time under several of them (e.g. print_issue
+# -> md_print) is only counted once.
+_categories = {
+    'rendering': [('jira_cli.py', 'print_*'),
+                  ('cli.py', 'print_*'),
+                  ('cli.py', 'display_*'),
+                  ('cli.py', 'action_*'),
+                  ('decor.py', 'md_print'),
+                  ('decor.py', 'vsep_print'),
+                  ('decor.py', 'print'),
+                  ('decor.py', 'hbar_*'),
+                  ('jira_fields.py', 'render_issue_fields'),
+                  ('jira_fields.py', 'issue_field_rows')],
+    # Sync requests, waiting on requests made by worker threads (not
+    # profiled themselves), and the async backend's event loop idling
+    'network': [('transport.py', 'send'),
+                ('_base.py', 'result'),
+                ('~', "<method 'poll' of 'select.epoll' objects>"),
+                ('~', "<method 'select' of 'select.kqueue' objects>")],
+}
+
+_top = 25
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action='store_true', help='Profile the command and print a summary on exit')
+    parser.add_argument('--profile-file', metavar='FILE', help='Profile the command and write the stats (pstats) to FILE')
+
+
+def wanted(ns):
+    return bool(getattr(ns, 'profile', False) or getattr(ns, 'profile_file', None))
+
+
+def call(ns, func, *args):
+    if not wanted(ns):
+        return func(*args)
+
+    import cProfile
+
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(func, *args)
+    finally:
+        report(prof, ns.profile, ns.profile_file)
+
+
+def _matches(func, patterns):
+    filename, _, name = func
+    for suffix, pattern in patterns:
+        if fnmatchcase(name, pattern) and (filename == suffix or filename.endswith('/' + suffix)):
+            return True
+    return False
+
+
+def _shares(stats, patterns):
+    # {function: share of its time spent under a matching function}
+    shares = {}
+
+    def share(func, seen):
+        if func in shares:
+            return shares[func]
+        if _matches(func, patterns):
+            shares[func] = 1.0
+            return 1.0
+        if func in seen or func not in stats.stats:
+            # Recursion, or the profiler itself
+            return 0.0
+        seen.add(func)
+        cumulative, callers = stats.stats[func][3:]
+        under = sum(caller_stats[3] * share(caller, seen) for caller, caller_stats in callers.items())
+        seen.discard(func)
+        shares[func] = min(under / cumulative, 1.0) if cumulative else 0.0
+        return shares[func]
+
+    for func in stats.stats:
+        share(func, set())
+    return shares
+
+
+def _outer(stats, func, shares):
+    # Time in func from callers which aren't already under the category
+    cumulative, callers = stats.stats[func][3:]
+    if not callers:
+        return cumulative
+    return sum(caller_stats[3] * (1.0 - shares.get(caller, 0.0)) for caller, caller_stats in callers.items())
+
+
+def split(stats):
+    # {category: seconds}, from a pstats.Stats; rendering doesn't
+    # include any network time underneath it (e.g. fetching comments)
+    shares = {category: _shares(stats, patterns) for category, patterns in _categories.items()}
+    ret = {}
+    for category, patterns in _categories.items():
+        ret[category] = sum(_outer(stats, func, shares[category]) for func in stats.stats if _matches(func, patterns))
+
+    network = shares['network']
+    rendering = shares['rendering']
+    for func in stats.stats:
+        if not _matches(func, _categories['network']):
+            continue
+        cumulative, callers = stats.stats[func][3:]
+        for caller, caller_stats in callers.items():
+            ret['rendering'] -= caller_stats[3] * (1.0 - network.get(caller, 0.0)) * rendering.get(caller, 0.0)
+    ret['rendering'] = max(ret['rendering'], 0.0)
+    return ret
+
+
+def report(prof, show=True, path=None):
+    import pstats
+
+    if path:
+        prof.dump_stats(path)
+    if not show:
+        return
+
+    stats = pstats.Stats(prof, stream=sys.stderr)
+    total = stats.total_tt
+    times = split(stats)
+    other = max(total - sum(times.values()), 0.0)
+    parts = [f'{name} {seconds * 1000:.1f} ms ({seconds / total * 100 if total else 0:.0f}%)'
+             for name, seconds in list(times.items()) + [('other', other)]]
+    sys.stderr.write(f'Profile: {total * 1000:.1f} ms; ' + ', '.join(parts) + '\n')
+    stats.sort_stats('cumulative').print_stats(_top)
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+#
+# --trace / --trace-file: every HTTP request made through the shared
+# transport (and the async backend) is recorded with its method, path,
+# status, latency (including retries), response size and retry count.
+# At exit, --trace prints a summary (costliest first) to stderr, and
+# --trace-file writes one JSON object per request.
+
+import atexit
+import json
+import sys
+import threading
+import time
+
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+
+# Not written out anywhere
+_secret_params = ('key', 'token')
+
+_calls = None
+_lock = threading.Lock()
+
+
+def add_arguments(parser):
+    parser.add_argument('--trace', action='store_true', help='Print a summary of HTTP requests made on exit')
+    parser.add_argument('--trace-file', metavar='FILE', help='Write each HTTP request made to FILE (NDJSON)')
+
+
+def setup(ns):
+    # Start tracing if asked to on the command line
+    if not getattr(ns, 'trace', False) and not getattr(ns, 'trace_file', None):
+        return False
+    start()
+    atexit.register(report, ns.trace, ns.trace_file)
+    return True
+
+
+def start():
+    global _calls
+
+    _calls = []
+
+
+def active():
+    return _calls is not None
+
+
+def record(method, url, status, seconds, nbytes, retries):
+    if _calls is None:
+        return
+    parts = urlsplit(url)
+    query = urlencode([(name, val) for name, val in parse_qsl(parts.query, keep_blank_values=True)
+                       if name not in _secret_params])
+    call = {'time': round(time.time(), 3),
+            'method': method.upper(),
+            'host': parts.netloc,
+            'path': parts.path,
+            'query': query,
+            'status': status,
+            'ms': round(seconds * 1000, 1),
+            'bytes': nbytes,
+            'retries': retries}
+    with _lock:
+        _calls.append(call)
+
+
+def calls():
+    with _lock:
+        return list(_calls or [])
+
+
+def summary():
+    # [(method, path, calls, repeats, total ms, max ms, bytes, retries)],
+    # costliest first; repeats counts identical (same query) requests
+    groups = {}
+    for call in calls():
+        group = groups.setdefault((call['method'], call['path']), {'calls': 0, 'queries': set(), 'ms': 0.0,
+                                                                   'max': 0.0, 'bytes': 0, 'retries': 0})
+        group['calls'] += 1
+        group['queries'].add(call['query'])
+        group['ms'] += call['ms']
+        group['max'] = max(group['max'], call['ms'])
+        group['bytes'] += call['bytes']
+        group['retries'] += call['retries']
+    ret = [(method, path, group['calls'], group['calls'] - len(group['queries']), group['ms'], group['max'],
+            group['bytes'], group['retries']) for (method, path), group in groups.items()]
+    ret.sort(key=lambda item: item[4], reverse=True)
+    return ret
+
+
+def print_summary(file=None):
+    if file is None:
+        file = sys.stderr
+    rows = summary()
+    total = calls()
+    errors = sum(1 for call in total if call['status'] is None or call['status'] >= 400)
+    lines = [f'HTTP requests: {len(total)}, {sum(call["ms"] for call in total):.1f} ms, '
+             f'{sum(call["bytes"] for call in total)} bytes, {sum(call["retries"] for call in total)} retries, '
+             f'{errors} errors',
+             f'{"ms":>9} {"max ms":>8} {"calls":>6} {"repeats":>7} {"retries":>7} {"bytes":>10}  request']
+    for method, path, count, repeats, total_ms, max_ms, nbytes, retries in rows:
+        lines.append(f'{total_ms:9.1f} {max_ms:8.1f} {count:6} {repeats:7} {retries:7} {nbytes:10}  {method} {path}')
+    file.write('\n'.join(lines) + '\n')
+
+
+def write_ndjson(path):
+    with open(path, 'w') as trace_file:
+        for call in calls():
+            trace_file.write(json.dumps(call) + '\n')
+
+
+def report(show=True, path=None):
+    if path:
+        write_ndjson(path)
+    if show:
+        print_summary()
@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+#
+# Shared HTTP transport: pooled keep-alive connections, retries with
+# exponential backoff (and jitter) on rate limiting and transient server
+# errors, honouring Retry-After, and a token bucket to keep us under
+# the server's rate limit in the first place.  Configured from the
+# "http" section of ~/.trolly.json.
+
+import contextlib
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from trolly import trace
+
+
+_defaults = {
+    # Connections kept open per host
+    'pool_size': 10,
+    # Retries on 429/502/503/504 and connection errors
+    'retries': 5,
+    # First backoff delay (seconds); doubles each retry, up to max_backoff
+    'backoff': 0.5,
+    'max_backoff': 30,
+    # Sustained requests per second (0 = unlimited), and how many may
+    # be sent back-to-back before that kicks in
+    'rate': 0,
+    'burst': 10,
+}
+
+_retry_status = (429, 502, 503, 504)
+
+# Requests which didn't reach the application can be retried whatever
+# the method; a 502/504 may have been processed already.
+_always_retry_status = (429, 503)
+_idempotent = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+def http_settings(config, concurrency=1):
+    settings = dict(_defaults)
+    if config and 'http' in config:
+        settings.update(config['http'])
+    # Enough connections for every concurrent request
+    settings['pool_size'] = max(int(settings['pool_size']), concurrency)
+    return settings
+
+
+def _retry_after(value):
+    # Either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0)
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Take a token; returns how long to wait before using it
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+
+class Transport(HTTPAdapter):
+    def __init__(self, settings=None):
+        if settings is None:
+            settings = http_settings(None)
+        self.settings = settings
+        self.retries = int(settings['retries'])
+        self.backoff = float(settings['backoff'])
+        self.max_backoff = float(settings['max_backoff'])
+        self.limiter = TokenBucket(settings['rate'], settings['burst'])
+        # Overrides the request timeout (seconds) while set; see quick()
+        self.timeout = None
+        # urllib3 only retries failed connections; responses are ours
+        retry = Retry(total=self.retries, connect=self.retries, read=0, status=0, redirect=5,
+                      backoff_factor=self.backoff, backoff_max=self.max_backoff, backoff_jitter=self.backoff,
+                      respect_retry_after_header=False, raise_on_status=False)
+        super().__init__(pool_connections=10, pool_maxsize=int(settings['pool_size']), max_retries=retry)
+
+    @contextlib.contextmanager
+    def quick(self, timeout):
+        # Fail fast instead of retrying: for requests we can do without,
+        # such as catching up before answering from the local cache
+        saved = (self.max_retries, self.retries, self.timeout)
+        self.max_retries = Retry(total=0, read=False, redirect=5, raise_on_status=False)
+        self.retries = 0
+        self.timeout = timeout
+        try:
+            yield
+        finally:
+            self.max_retries, self.retries, self.timeout = saved
+
+    def retry_delay(self, method, status, retry_after, attempt, connected=True):
+        # None if the response should be returned as-is, otherwise
+        # how long to wait before trying again.  status is None if there
+        # was no response (connection error or timeout); as urllib3 does
+        # for the sync side, failing to connect at all (connected=False)
+        # can be retried whatever the method.
+        if attempt >= self.retries:
+            return None
+        if status is None:
+            if connected and method.upper() not in _idempotent:
+                return None
+        elif status not in _retry_status:
+            return None
+        elif status not in _always_retry_status and method.upper() not in _idempotent:
+            return None
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        told = _retry_after(retry_after)
+        if told is not None:
+            delay = max(delay, told)
+        return delay
+
+    def send(self, request, **kwargs):
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        attempt = 0
+        start = time.monotonic()
+        while True:
+            self.limiter.acquire()
+            try:
+                resp = super().send(request, **kwargs)
+            except requests.exceptions.RequestException:
+                trace.record(request.method, request.url, None, time.monotonic() - start, 0, attempt)
+                raise
+            delay = self.retry_delay(request.method, resp.status_code, resp.headers.get('Retry-After'), attempt)
+            if delay is None:
+                if trace.active():
+                    if kwargs.get('stream'):
+                        nbytes = int(resp.headers.get('Content-Length') or 0)
+                    else:
+                        nbytes = len(resp.content)
+                    trace.record(request.method, request.url, resp.status_code, time.monotonic() - start, nbytes, attempt)
+                return resp
+            resp.close()
+            time.sleep(delay)
+            attempt = attempt + 1
+
+
+def install(session, transport):
+    session.mount('https://', transport)
+    session.mount('http://', transport)
+    return session
+
+
+def http_session(transport):
+    return install(requests.Session(), transport)
+
+
+_trello_api = 'https://trello.com/1'
+
+
+class _TrelloRequests(object):
+    # Stands in for the requests module in trollo, sending its calls
+    # somewhere other than the real Trello API
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url.rstrip('/')
+
+    def request(self, method, url, **kwargs):
+        if url.startswith(_trello_api):
+            url = self.url + url[len(_trello_api):]
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+
+def use_trello_session(session, url=None):
+    # trollo calls requests.get() etc. directly; point each of its
+    # modules at our session instead.  url replaces the Trello API's
+    # (e.g. for a proxy, or a local stand-in).
+    import trollo
+
+    if url and url.rstrip('/') != _trello_api:
+        session = _TrelloRequests(session, url)
+    for name in ('actions', 'boards', 'cards', 'checklists', 'labels', 'lists', 'members',
+                 'notifications', 'organizations', 'search', 'tokens', 'types'):
+        module = getattr(trollo, name, None)
+        if module is not None and hasattr(module, 'requests'):
+            module.requests = session